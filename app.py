@@ -1,18 +1,36 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g
 from flask_cors import CORS
 import os
-from datetime import datetime
+import time
+import atexit
+import multiprocessing
 import sqlite3
 from itsdangerous import URLSafeTimedSerializer as Serializer
 import torch
 import logging
 
+from config import Config
+
 # 配置日志
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=getattr(logging, str(Config.LOG_LEVEL).upper(), logging.INFO))
 logger = logging.getLogger(__name__)
 
-# 导入多角度投票融合模型
-from v11 import YOLOv11Ensemble
+# 导入多角度投票融合模型的注册表
+from model_registry import ModelRegistry, weights_fingerprint
+from upload_store import UploadArchiver, content_hash, image_extension
+from result_cache import ResultCache
+from detection_jobs import JobManager
+from camera_stream import CameraStreamManager
+from golden_reference import ReferenceStore
+from inference_scheduler import InferenceScheduler
+from worker_pool import InferenceWorkerPool
+from metrics import MetricsRegistry, StageTimer, NULL_TIMER, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from debug_trace import TraceStore
+from system_monitor import SystemMonitor
+from user_store import UserStore
+from history_store import HistoryStore
+from v11 import load_image
+from detection_result import summarize
 
 # 确保前端构建目录存在
 FRONTEND_BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'build')
@@ -64,23 +82,17 @@ def serve_static(path):
         logger.error(f"服务静态文件时出错: {str(e)}")
         return jsonify({'error': '无法加载静态文件'}), 500
 
-# Initialize users database
-def init_db():
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            phone TEXT UNIQUE NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
+# 以spawn方式启动的推理工作进程会重新导入本模块，这些进程中不启动模型和任何后台服务
+# （数据库迁移、存档、调度、任务线程池等），它们只在主进程中创建，工作进程中保持为None
+IS_MAIN_PROCESS = multiprocessing.parent_process() is None
+
+# 用户数据库：每个线程一个长连接，WAL模式，启动时按版本迁移表结构
+user_store = None
+if IS_MAIN_PROCESS:
+    user_store = UserStore(Config.USER_DB_PATH, busy_timeout_ms=Config.USER_DB_BUSY_TIMEOUT_MS,
+                           hash_passwords=Config.PASSWORD_HASHING, hash_method=Config.PASSWORD_HASH_METHOD,
+                           last_login_interval=Config.LAST_LOGIN_FLUSH_SECONDS)
+    atexit.register(user_store.close)
 
 # 检测系统是否有可用的GPU
 def check_gpu_status():
@@ -103,10 +115,354 @@ if gpu_status['available']:
 else:
     print("未检测到GPU, 将使用CPU进行推理")
 
-# 确保上传目录存在
-UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# 进程级模型注册表：模型只加载、预热一次，所有请求共享
+model_registry = ModelRegistry(max_models=Config.MODEL_CACHE_SIZE, export_dir=Config.MODEL_EXPORT_DIR,
+                               calibration_dir=Config.QUANT_CALIBRATION_DIR, tensor_views=Config.MODEL_TENSOR_VIEWS)
+
+def get_detector():
+    return model_registry.get(Config.MODEL_PATH, device=Config.MODEL_DEVICE,
+                              imgsz=Config.MODEL_IMGSZ, backend=Config.MODEL_BACKEND)
+
+# 多进程推理：每个工作进程常驻一个模型，检测请求分配给在途请求最少的进程
+worker_pool = None
+if Config.WORKER_POOL_ENABLED and IS_MAIN_PROCESS:
+    worker_pool = InferenceWorkerPool(Config.MODEL_PATH, num_workers=Config.WORKER_PROCESSES,
+                                      num_threads=Config.WORKER_THREADS, device=Config.MODEL_DEVICE or 'cpu',
+                                      imgsz=Config.MODEL_IMGSZ, backend=Config.MODEL_BACKEND,
+                                      export_dir=Config.MODEL_EXPORT_DIR,
+                                      calibration_dir=Config.QUANT_CALIBRATION_DIR,
+                                      tensor_views=Config.MODEL_TENSOR_VIEWS)
+    atexit.register(worker_pool.close)
+
+def inference_device():
+    """实际推理设备：MODEL_DEVICE为None时多进程推理用CPU，否则有GPU用cuda:0（与YOLOv11Ensemble一致）"""
+    if Config.MODEL_DEVICE:
+        return Config.MODEL_DEVICE
+    if worker_pool is not None or not gpu_status['available']:
+        return 'cpu'
+    return 'cuda:0'
+
+if Config.PRELOAD_MODEL and worker_pool is None and IS_MAIN_PROCESS and os.path.exists(Config.MODEL_PATH):
+    try:
+        get_detector()
+    except Exception as e:
+        logger.error(f"预加载模型失败: {str(e)}", exc_info=True)
+
+# 推理调度器：并发请求在等待窗口内合并为一次批量推理
+inference_scheduler = None
+if Config.SCHEDULER_ENABLED and worker_pool is None and IS_MAIN_PROCESS:
+    inference_scheduler = InferenceScheduler(get_detector, max_wait_ms=Config.SCHEDULER_MAX_WAIT_MS,
+                                             max_batch_size=Config.SCHEDULER_MAX_BATCH_SIZE)
+
+# 检测结果缓存：按图片内容哈希、检测参数和权重指纹缓存，best.pt变化后自动失效
+result_cache = None
+if Config.RESULT_CACHE_ENABLED and IS_MAIN_PROCESS:
+    result_cache = ResultCache(max_entries=Config.RESULT_CACHE_SIZE, disk_dir=Config.RESULT_CACHE_DIR)
+
+# 上传图片在后台按内容哈希存档，检测直接使用内存中的图片数据
+UPLOAD_FOLDER = Config.UPLOAD_FOLDER
+upload_archiver = None
+if Config.ARCHIVE_UPLOADS and IS_MAIN_PROCESS:
+    upload_archiver = UploadArchiver(UPLOAD_FOLDER, max_pending=Config.ARCHIVE_QUEUE_SIZE,
+                                     max_age_days=Config.ARCHIVE_MAX_AGE_DAYS, max_bytes=Config.ARCHIVE_MAX_BYTES,
+                                     retention_interval=Config.ARCHIVE_RETENTION_INTERVAL)
+    atexit.register(upload_archiver.close)
+
+# 检测历史：每次/api/detect的结果和缺陷明细由后台线程写入SQLite
+history_store = None
+if Config.HISTORY_ENABLED and IS_MAIN_PROCESS:
+    history_store = HistoryStore(Config.HISTORY_DB_PATH, max_pending=Config.HISTORY_QUEUE_SIZE)
+    atexit.register(history_store.close)
+
+# 金板参考图：按产品型号登记，ORB特征按型号缓存在内存中
+reference_store = None
+if IS_MAIN_PROCESS:
+    reference_store = ReferenceStore(Config.REFERENCE_FOLDER, cache_size=Config.REFERENCE_CACHE_SIZE,
+                                     align_size=Config.REFERENCE_ALIGN_SIZE, max_features=Config.REFERENCE_MAX_FEATURES,
+                                     min_matches=Config.REFERENCE_MIN_MATCHES,
+                                     diff_threshold=Config.REFERENCE_DIFF_THRESHOLD, min_area=Config.REFERENCE_MIN_AREA,
+                                     roi_padding=Config.REFERENCE_ROI_PADDING,
+                                     min_roi_size=Config.REFERENCE_MIN_ROI_SIZE or Config.MODEL_IMGSZ,
+                                     max_roi_fraction=Config.REFERENCE_MAX_ROI_FRACTION)
+
+# 调试追踪：被追踪请求的各视角框、投票分组和最终结果，只在内存中保留最近的若干条
+trace_store = TraceStore(max_traces=Config.DEBUG_TRACE_SIZE)
+
+# Prometheus指标：请求数、在途请求数、请求与各检测阶段耗时直方图、模型加载耗时
+metrics_registry = MetricsRegistry()
+request_counter = metrics_registry.counter('pcb_http_requests_total', 'HTTP requests by endpoint, method and status',
+                                           ('endpoint', 'method', 'status'))
+requests_in_flight = metrics_registry.gauge('pcb_http_requests_in_flight', 'HTTP requests currently being handled')
+request_latency = metrics_registry.histogram('pcb_http_request_duration_seconds', 'HTTP request latency',
+                                             ('endpoint',))
+stage_latency = metrics_registry.histogram('pcb_detect_stage_duration_seconds',
+                                           'Time spent in each stage of /api/detect', ('stage',))
+model_load_time = metrics_registry.gauge('pcb_model_load_seconds', 'Load and warm-up time of each resident model',
+                                         ('model', 'device', 'imgsz', 'backend'))
+scheduler_queue_depth = metrics_registry.gauge('pcb_scheduler_queue_depth', 'Images waiting for the inference scheduler')
+forward_passes = metrics_registry.gauge('pcb_model_forward_passes',
+                                        'Orientation forward passes of each resident model since it was loaded, '
+                                        'run or skipped by cascade voting', ('model', 'backend', 'result'))
+
+def collect_runtime_metrics():
+    """抓取时读取模型加载耗时和调度队列长度"""
+    model_load_time.clear()
+    for (path, device, imgsz, backend), seconds in model_registry.load_times().items():
+        model_load_time.set(seconds, model=os.path.basename(path), device=device, imgsz=imgsz, backend=backend)
+    if inference_scheduler is not None:
+        scheduler_queue_depth.set(inference_scheduler.queue_depth())
+    forward_passes.clear()
+    for (path, device, imgsz, backend), stats in model_registry.forward_stats().items():
+        forward_passes.set(stats['forward_passes'], model=os.path.basename(path), backend=backend, result='run')
+        forward_passes.set(stats['forward_passes_saved'], model=os.path.basename(path), backend=backend,
+                           result='saved')
+
+metrics_registry.add_collector(collect_runtime_metrics)
+
+def inference_queue_depth():
+    """等待推理的图片数：调度器队列长度，或多进程推理时各工作进程的在途任务数"""
+    if worker_pool is not None:
+        return sum(w['in_flight'] for w in worker_pool.stats()['workers'])
+    if inference_scheduler is not None:
+        return inference_scheduler.queue_depth()
+    return 0
+
+# 系统状态由后台线程定时采样，/api/system-status不再阻塞请求线程
+system_monitor = None
+if IS_MAIN_PROCESS:
+    system_monitor = SystemMonitor(interval=Config.SYSTEM_MONITOR_INTERVAL,
+                                   history_size=Config.SYSTEM_MONITOR_HISTORY,
+                                   queue_depth=inference_queue_depth)
+    atexit.register(system_monitor.close)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    requests_in_flight.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    # 按路由模板而不是实际路径统计，避免任务ID等参数造成标签爆炸
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_counter.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_started' in g:
+        elapsed = time.perf_counter() - g.request_started
+        request_latency.observe(elapsed, endpoint=endpoint)
+        if system_monitor is not None and endpoint.startswith('/api/detect'):
+            system_monitor.observe_latency(elapsed)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'request_started' in g:
+        requests_in_flight.dec()
+
+def get_detection_params():
+    """从请求参数中读取检测参数"""
+    return {
+        'vote_threshold': int(request.args.get('vote_threshold', 1)),  # 默认值为1
+        'orientation_count': int(request.args.get('orientation_count', 1)),  # 默认值为1
+        'iou_threshold': float(request.args.get('iou_threshold', 0.45)),  # 默认值为0.45
+        'conf_threshold': float(request.args.get('conf_threshold', 0.4)),  # 默认值为0.4
+        'imgsz': int(request.args.get('imgsz', 600)),  # 默认值为600
+        'class_aware': request.args.get('class_aware', 'false').lower() in ('1', 'true'),  # 是否按类别分组投票
+        'tile_size': int(request.args.get('tile_size', 0)),  # 分块检测的块大小，0表示不分块
+        'tile_overlap': float(request.args.get('tile_overlap', Config.TILE_OVERLAP)),  # 相邻分块的重叠比例
+        'cascade': request.args.get('cascade', str(Config.CASCADE_VOTING)).lower() in ('1', 'true'),  # 级联投票
+        'sku': request.args.get('sku') or None  # 产品型号，指定时按登记的参考图只检测差异区域
+    }
+
+def predict_kwargs(params):
+    """检测参数转换为YOLOv11Ensemble.predict的关键字参数"""
+    return {
+        'vote_threshold': params['vote_threshold'],
+        'orientation_count': params['orientation_count'],
+        'conf_thres': params['conf_threshold'],
+        'iou_thres': params['iou_threshold'],
+        'class_aware': params['class_aware'],
+        'cascade': params['cascade']
+    }
+
+def predict_tiled(image, params, timer=None, trace=None):
+    """大尺寸面板图像分块检测"""
+    if worker_pool is not None:
+        return worker_pool.predict_tiled(image, tile_size=params['tile_size'], overlap=params['tile_overlap'],
+                                         tile_batch_size=Config.TILE_BATCH_SIZE, **predict_kwargs(params))
+    return get_detector().predict_tiled(image, tile_size=params['tile_size'], overlap=params['tile_overlap'],
+                                        tile_batch_size=Config.TILE_BATCH_SIZE, timer=timer, trace=trace,
+                                        **predict_kwargs(params))
+
+def predict_image(image, params, timer=None, trace=None):
+    """整图检测：按配置分块检测、交给工作进程、经调度器合并推理或直接调用常驻模型"""
+    timer = timer or NULL_TIMER
+    if params['tile_size'] > 0:
+        return predict_tiled(image, params, timer, trace)
+    if worker_pool is not None:
+        # 图片数据原样发送给工作进程，在工作进程内解码
+        return worker_pool.predict(image, **predict_kwargs(params))
+    if inference_scheduler is not None:
+        # 在请求线程解码，再与并发请求合并推理
+        with timer.stage('decode'):
+            image = load_image(image)
+        return inference_scheduler.predict(image, timer=timer, trace=trace, **predict_kwargs(params))
+    # 从注册表获取常驻模型，阈值按请求传入predict
+    return get_detector().predict(image, timer=timer, trace=trace, **predict_kwargs(params))
+
+def predict_reference(image, params, timer=None, trace=None):
+    """
+    金板参考模式：与该型号的参考图对齐，只在差异区域上检测，返回(模型结果, 参考模式信息)
+
+    对齐失败或差异区域过大时退回整图检测，参考模式信息中fallback为True并给出原因
+    """
+    timer = timer or NULL_TIMER
+    board = reference_store.get(params['sku']) if reference_store is not None else None
+    if board is None:
+        raise ValueError(f"产品型号{params['sku']}未登记参考图")
+    with timer.stage('decode'):
+        decoded = load_image(image)
+    with timer.stage('align'):
+        reference = reference_store.regions(board, decoded)
+    reference = {'sku': board.sku, 'fallback': not reference['aligned'], **reference}
+    if trace is not None:
+        trace.record('reference', **reference)
+    if reference['fallback']:
+        logger.info(f"Reference mode falls back to the full image for {board.sku}: {reference['reason']}")
+        return predict_image(image, params, timer, trace), reference
+    if worker_pool is not None:
+        result = worker_pool.predict_regions(image, reference['regions'], region_batch_size=Config.TILE_BATCH_SIZE,
+                                             **predict_kwargs(params))
+    else:
+        result = get_detector().predict_regions(decoded, reference['regions'],
+                                                region_batch_size=Config.TILE_BATCH_SIZE, timer=timer, trace=trace,
+                                                **predict_kwargs(params))
+    return result, reference
+
+def predict_images(images, params, batch_size):
+    """批量检测已解码的图片；启用多进程推理时各批分配到不同工作进程并行执行"""
+    if not images:
+        return []
+    if worker_pool is None:
+        return get_detector().predict_batch(images, batch_size=batch_size, **predict_kwargs(params))
+    futures = [worker_pool.submit('predict_batch', images[start:start + batch_size], **predict_kwargs(params))
+               for start in range(0, len(images), batch_size)]
+    return [result for future in futures for result in future.result()]
+
+def read_upload(file):
+    """读取上传图片到内存，返回图片数据及其内容哈希，存档交给后台线程"""
+    image_bytes = file.read()
+    image_hash = content_hash(image_bytes)
+    if image_bytes and upload_archiver is not None:
+        upload_archiver.submit(image_bytes, image_extension(file.filename), digest=image_hash)
+    return image_bytes, image_hash
+
+def unknown_reference(params):
+    """请求指定了未登记参考图的产品型号时返回404响应，否则返回None"""
+    if params['sku'] and (reference_store is None or reference_store.get(params['sku']) is None):
+        return jsonify({'error': f"产品型号{params['sku']}未登记参考图"}), 404
+    return None
+
+def cache_lookup(image_hash, params):
+    """查询结果缓存，返回(缓存key, 权重指纹, 缓存结果)；未启用缓存时返回(None, None, None)"""
+    if result_cache is None:
+        return None, None, None
+    fingerprint = weights_fingerprint(Config.MODEL_PATH)
+    # 参考模式的结果随参考图变化，重新登记参考图后旧结果不再命中
+    reference = {}
+    if params['sku'] and reference_store is not None:
+        board = reference_store.get(params['sku'])
+        reference = {'reference': board.digest if board is not None else None}
+    # tensor_views和推理设备都会让框坐标略有不同，切换后不复用旧结果
+    key = ResultCache.make_key(image_hash, fingerprint, model_imgsz=Config.MODEL_IMGSZ,
+                               backend=Config.MODEL_BACKEND, tensor_views=Config.MODEL_TENSOR_VIEWS,
+                               device=inference_device(), **reference, **params)
+    return key, fingerprint, result_cache.get(key, fingerprint)
+
+def build_detection_result(result, imgsz, reference=None):
+    """把模型结果（DetectionResult）转换为/api/detect的返回格式，reference为参考模式信息"""
+    # 缺陷列表和统计信息在整个框数组上批量计算
+    defects, stats = summarize(result)
+
+    response = {
+        'status': 'success',
+        'defects': defects,
+        'statistics': stats,
+        'image_dimensions': {
+            'width': result.orig_shape[1],
+            'height': result.orig_shape[0]
+        },
+        'using_gpu': torch.cuda.is_available(),  # 添加GPU使用信息
+        'imgsz': imgsz  # 返回使用的图像尺寸
+    }
+    if reference is not None:
+        response['reference'] = reference
+    return response
+
+def build_batch_statistics(results):
+    """汇总整批图片的统计信息"""
+    succeeded = [r for r in results if r['status'] == 'success']
+    defects = [d for r in succeeded for d in r['defects']]
+    defect_types = {}
+    for r in succeeded:
+        for defect_type, count in r['statistics']['defect_types'].items():
+            defect_types[defect_type] = defect_types.get(defect_type, 0) + count
+    defective_images = sum(1 for r in succeeded if r['statistics']['total_defects'] > 0)
+
+    return {
+        'total_images': len(results),
+        'processed_images': len(succeeded),
+        'failed_images': len(results) - len(succeeded),
+        'defective_images': defective_images,
+        'pass_rate': round((len(succeeded) - defective_images) / len(succeeded) * 100, 2) if succeeded else 0,
+        'total_defects': len(defects),
+        'defect_types': defect_types,
+        'accuracy': round(sum(d['confidence'] for d in defects) / len(defects) if defects else 0, 2)
+    }
+
+def detect_image(image_bytes, image_hash, params, timer=None, trace=None):
+    """
+    检测单张图片并返回/api/detect格式的结果
+
+    timer为metrics.StageTimer时记录各阶段耗时；inference为模型部分的总耗时，
+    decode、forward、fusion等阶段包含在其中。trace为debug_trace.Trace时记录
+    各视角的框、投票分组和最终结果（多进程推理时只记录最终结果）
+    """
+    timer = timer or NULL_TIMER
+    if trace is not None:
+        trace.record('request', image_hash=image_hash, params=params)
+    # 相同图片、相同参数的结果直接从缓存返回
+    with timer.stage('cache_lookup'):
+        cache_key, fingerprint, cached = cache_lookup(image_hash, params)
+    if cached is not None:
+        if trace is not None:
+            trace.record('cache_hit', total_defects=cached['statistics']['total_defects'])
+        return cached
+
+    # 使用模型运行检测
+    reference = None
+    with timer.stage('inference'):
+        if params['sku']:
+            result, reference = predict_reference(image_bytes, params, timer, trace)
+        else:
+            result = predict_image(image_bytes, params, timer, trace)
+
+    with timer.stage('build_response'):
+        response = build_detection_result(result, params['imgsz'], reference)
+    if trace is not None:
+        trace.record('response', statistics=response['statistics'])
+    if cache_key is not None:
+        with timer.stage('cache_store'):
+            result_cache.put(cache_key, fingerprint, response)
+    return response
+
+def current_user_id():
+    """从Authorization头的登录token中取出用户ID，未登录或token无效时返回None"""
+    auth = request.headers.get('Authorization', '')
+    if not auth.startswith('Bearer '):
+        return None
+    try:
+        return Serializer(app.config['SECRET_KEY']).loads(auth[len('Bearer '):]).get('user_id')
+    except Exception:
+        return None
 
 @app.route('/api/detect', methods=['POST'])
 def detect_pcb():
@@ -117,131 +473,403 @@ def detect_pcb():
             return jsonify({'error': 'No image provided'}), 400
 
         # 获取模型参数
-        vote_threshold = int(request.args.get('vote_threshold', 1))  # 默认值为1
-        orientation_count = int(request.args.get('orientation_count', 1))  # 默认值为1
-        iou_threshold = float(request.args.get('iou_threshold', 0.45))  # 默认值为0.45
-        conf_threshold = float(request.args.get('conf_threshold', 0.4))  # 默认值为0.4
-        imgsz = int(request.args.get('imgsz', 600))  # 默认值为600
+        params = get_detection_params()
+        error = unknown_reference(params)
+        if error is not None:
+            return error
+        # timings=true时在返回结果中附带各阶段耗时（毫秒）
+        include_timings = request.args.get('timings', 'false').lower() in ('1', 'true')
+        timer = StageTimer()
+        # trace=true时记录调试追踪，返回的trace_id可在/api/debug/trace/<trace_id>查看
+        trace = None
+        if Config.DEBUG_TRACE_ALL or request.args.get('trace', 'false').lower() in ('1', 'true'):
+            trace = trace_store.start()
         
-        # 初始化模型时自动选择设备（GPU或CPU）并传入imgsz参数
-        # 修复错误：使用固定的imgsz值600
-        model = YOLOv11Ensemble('best.pt', conf_thres=conf_threshold, iou_thres=iou_threshold, imgsz=1280)
-        
-        # 保存图片
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        image_path = os.path.join(UPLOAD_FOLDER, f'pcb_{timestamp}.jpg')
-        file.save(image_path)
-
-        # 使用模型运行检测
-        result = model.predict(image_path, vote_threshold=vote_threshold, orientation_count=orientation_count)
-
-        # 处理检测结果
-        defects = []
-        for box in result.boxes:
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-            confidence = box.conf[0].item()
-            class_id = box.cls[0].item()
-            class_name = result.names[int(class_id)]
-            
-            defects.append({
-                'type': class_name,
-                'position': {
-                    'x': int((x1 + x2) / 2),
-                    'y': int((y1 + y2) / 2)
-                },
-                'bbox': {
-                    'x1': int(x1),
-                    'y1': int(y1),
-                    'x2': int(x2),
-                    'y2': int(y2)
-                },
-                'confidence': round(confidence * 100, 2),
-                'severity': 'severe' if confidence > 0.8 else 'moderate' if confidence > 0.5 else 'minor'
-            })
-
-        # 统计信息
-        stats = {
-            'total_defects': len(defects),
-            'defect_types': {},
-            'accuracy': round(sum(d['confidence'] for d in defects) / len(defects) if defects else 0, 2)
-        }
+        # 直接从内存读取图片
+        with timer.stage('read_upload'):
+            image_bytes, image_hash = read_upload(file)
+        if not image_bytes:
+            return jsonify({'error': 'No image provided'}), 400
+
+        response = detect_image(image_bytes, image_hash, params, timer, trace)
+        for stage, milliseconds in timer.stages.items():
+            stage_latency.observe(milliseconds / 1000, stage=stage)
+        if history_store is not None:
+            history_store.record(response, params, user_id=current_user_id(), image_hash=image_hash,
+                                 filename=file.filename, duration_ms=round(sum(timer.stages.values()), 3))
+        # 缓存中的结果是共享的，不能原地修改
+        if include_timings:
+            response = {**response, 'timings': timer.as_dict()}
+        if trace is not None:
+            trace.record('timings', stages=timer.as_dict())
+            response = {**response, 'trace_id': trace.id}
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/detect/batch', methods=['POST'])
+def detect_pcb_batch():
+    try:
+        # 一次请求上传多张图片，字段名为images（兼容image）
+        files = request.files.getlist('images') or request.files.getlist('image')
+        if not files:
+            return jsonify({'error': 'No image provided'}), 400
+
+        params = get_detection_params()
+        error = unknown_reference(params)
+        if error is not None:
+            return error
+        batch_size = int(request.args.get('batch_size', Config.DETECT_BATCH_SIZE))
+
+        # 先逐张查缓存并解码，单张图片损坏不影响整批
+        results = [None] * len(files)
+        images, pending = [], []
+        for i, file in enumerate(files):
+            image_bytes, image_hash = read_upload(file)
+            cache_key, fingerprint, cached = cache_lookup(image_hash, params)
+            if cached is not None:
+                results[i] = cached
+                continue
+            try:
+                images.append(load_image(image_bytes))
+                pending.append((i, cache_key, fingerprint))
+            except Exception as e:
+                results[i] = {'status': 'error', 'error': f'图片解码失败: {str(e)}'}
+
+        # 未命中缓存的图片按batch_size分批送入模型
+        if params['sku']:
+            predictions = [predict_reference(image, params) for image in images]
+        elif params['tile_size'] > 0:
+            predictions = [(predict_tiled(image, params), None) for image in images]
+        else:
+            predictions = [(result, None) for result in predict_images(images, params, batch_size)]
+        for (i, cache_key, fingerprint), (result, reference) in zip(pending, predictions):
+            results[i] = build_detection_result(result, params['imgsz'], reference)
+            if cache_key is not None:
+                result_cache.put(cache_key, fingerprint, results[i])
 
-        for defect in defects:
-            if defect['type'] not in stats['defect_types']:
-                stats['defect_types'][defect['type']] = 0
-            stats['defect_types'][defect['type']] += 1
+        results = [{**result, 'filename': file.filename} for file, result in zip(files, results)]
 
         return jsonify({
             'status': 'success',
-            'defects': defects,
-            'statistics': stats,
-            'image_dimensions': {
-                'width': result.orig_shape[1],
-                'height': result.orig_shape[0]
-            },
-            'using_gpu': torch.cuda.is_available(),  # 添加GPU使用信息
-            'imgsz': imgsz  # 返回使用的图像尺寸
+            'results': results,
+            'statistics': build_batch_statistics(results),
+            'using_gpu': torch.cuda.is_available(),
+            'imgsz': params['imgsz']
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def run_job_image(upload, filename, params):
+    """后台任务中检测一张图片，upload为read_upload返回的(图片数据, 内容哈希)"""
+    image_bytes, image_hash = upload
+    if not image_bytes:
+        return {'status': 'error', 'error': 'No image provided', 'filename': filename}
+    return {**detect_image(image_bytes, image_hash, params), 'filename': filename}
+
+# 异步检测任务：提交后立即返回任务ID，在有界线程池中执行
+job_manager = None
+if IS_MAIN_PROCESS:
+    job_manager = JobManager(run_job_image, summarize=build_batch_statistics,
+                             max_workers=Config.JOB_WORKERS, retention_seconds=Config.JOB_RETENTION_SECONDS)
+
+@app.route('/api/jobs', methods=['POST'])
+def create_detection_job():
+    files = request.files.getlist('images') or request.files.getlist('image')
+    if not files:
+        return jsonify({'error': 'No image provided'}), 400
+
+    params = get_detection_params()
+    error = unknown_reference(params)
+    if error is not None:
+        return error
+    job = job_manager.submit([(file.filename, read_upload(file)) for file in files], params)
+    return jsonify({
+        'status': 'success',
+        'job_id': job.id,
+        'total': job.total,
+        'status_url': f'/api/jobs/{job.id}',
+        'events_url': f'/api/jobs/{job.id}/events'
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_detection_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_detection_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    # 断线重连时浏览器会带上Last-Event-ID，从该事件之后继续推送
+    last_event_id = int(request.headers.get('Last-Event-ID', 0) or 0)
+    return Response(stream_with_context(job_manager.stream(job, last_event_id)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def detect_camera_frame(image_bytes, image, params):
+    """检测一帧摄像头画面：帧数据不存档、不查结果缓存、不写检测历史"""
+    if params['sku']:
+        result, reference = predict_reference(image_bytes, params)
+        return build_detection_result(result, params['imgsz'], reference)
+    if params['tile_size'] > 0:
+        result = predict_tiled(image_bytes, params)
+    elif worker_pool is not None:
+        result = worker_pool.predict(image_bytes, **predict_kwargs(params))
+    elif inference_scheduler is not None:
+        result = inference_scheduler.predict(image, **predict_kwargs(params))
+    else:
+        result = get_detector().predict(image, **predict_kwargs(params))
+    return build_detection_result(result, params['imgsz'])
+
+# 摄像头实时检测：客户端不断上传帧，检测线程只处理最新一帧，结果通过SSE推送
+camera_streams = None
+if IS_MAIN_PROCESS:
+    camera_streams = CameraStreamManager(detect_camera_frame, max_sessions=Config.CAMERA_MAX_SESSIONS,
+                                         session_timeout=Config.CAMERA_SESSION_TIMEOUT,
+                                         change_threshold=Config.CAMERA_CHANGE_THRESHOLD,
+                                         gate_width=Config.CAMERA_GATE_WIDTH, fps_window=Config.CAMERA_FPS_WINDOW)
+    atexit.register(camera_streams.close_all)
+
+@app.route('/api/camera/sessions', methods=['POST'])
+def create_camera_session():
+    params = get_detection_params()
+    error = unknown_reference(params)
+    if error is not None:
+        return error
+    change_threshold = request.args.get('change_threshold', type=float)
+    session = camera_streams.create(params, change_threshold)
+    if session is None:
+        return jsonify({'error': '实时检测会话数已达上限'}), 429
+    return jsonify({
+        'status': 'success',
+        'session_id': session.id,
+        'change_threshold': session.change_threshold,
+        'frames_url': f'/api/camera/sessions/{session.id}/frames',
+        'events_url': f'/api/camera/sessions/{session.id}/events'
+    }), 201
+
+@app.route('/api/camera/sessions/<session_id>', methods=['GET'])
+def get_camera_session(session_id):
+    session = camera_streams.get(session_id)
+    if session is None:
+        return jsonify({'error': '会话不存在或已关闭'}), 404
+    return jsonify(session.stats())
+
+@app.route('/api/camera/sessions/<session_id>', methods=['DELETE'])
+def close_camera_session(session_id):
+    session = camera_streams.close(session_id)
+    if session is None:
+        return jsonify({'error': '会话不存在或已关闭'}), 404
+    return jsonify(session.stats())
+
+@app.route('/api/camera/sessions/<session_id>/frames', methods=['POST'])
+def push_camera_frame(session_id):
+    session = camera_streams.get(session_id)
+    if session is None:
+        return jsonify({'error': '会话不存在或已关闭'}), 404
+    # 帧可以作为multipart的image字段上传，也可以直接作为请求体
+    file = request.files.get('image')
+    image_bytes = file.read() if file else request.get_data()
+    if not image_bytes:
+        return jsonify({'error': 'No image provided'}), 400
+    # 只放入会话的待检测槽位后立即返回，不等待检测结果
+    frame_id = session.offer(image_bytes)
+    if frame_id is None:
+        return jsonify({'error': '会话不存在或已关闭'}), 404
+    return jsonify({'status': 'accepted', 'frame_id': frame_id}), 202
+
+@app.route('/api/camera/sessions/<session_id>/events', methods=['GET'])
+def stream_camera_session(session_id):
+    session = camera_streams.get(session_id)
+    if session is None:
+        return jsonify({'error': '会话不存在或已关闭'}), 404
+    # 只推送最新结果，Last-Event-ID之后的中间结果不会补发
+    last_event_id = int(request.headers.get('Last-Event-ID', 0) or 0)
+    return Response(stream_with_context(camera_streams.stream(session, last_event_id)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# 金板参考图：按产品型号登记、查看、删除
+@app.route('/api/references', methods=['GET'])
+def list_references():
+    return jsonify({'status': 'success', 'skus': reference_store.skus()})
+
+@app.route('/api/references/<sku>', methods=['POST'])
+def register_reference(sku):
+    file = request.files.get('image')
+    image_bytes = file.read() if file else b''
+    if not image_bytes:
+        return jsonify({'error': 'No image provided'}), 400
+    try:
+        board = reference_store.register(sku, image_bytes, image_extension(file.filename))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # 参考图变化后，缓存key中的参考图摘要随之变化，旧结果不会再命中
+    return jsonify({'status': 'success', 'reference': board.to_dict()}), 201
+
+@app.route('/api/references/<sku>', methods=['GET'])
+def get_reference(sku):
+    board = reference_store.get(sku)
+    if board is None:
+        return jsonify({'error': f'产品型号{sku}未登记参考图'}), 404
+    return jsonify({'status': 'success', 'reference': board.to_dict()})
+
+@app.route('/api/references/<sku>', methods=['DELETE'])
+def delete_reference(sku):
+    if not reference_store.remove(sku):
+        return jsonify({'error': f'产品型号{sku}未登记参考图'}), 404
+    return jsonify({'status': 'success', 'sku': sku})
+
 @app.route('/api/system-status', methods=['GET'])
 def get_system_status():
-    import psutil
-    cpu_usage = psutil.cpu_percent(interval=1)
-    memory = psutil.virtual_memory()
-    memory_usage = memory.percent
-    uptime = psutil.boot_time()
-    import datetime
-    uptime_duration = datetime.datetime.now() - datetime.datetime.fromtimestamp(uptime)
-    hours = int(uptime_duration.total_seconds() // 3600)
-    minutes = int((uptime_duration.total_seconds() % 3600) // 60)
-    
-    # 获取GPU状态
-    gpu_info = {}
-    if torch.cuda.is_available():
-        gpu_count = torch.cuda.device_count()
-        gpu_info['count'] = gpu_count
-        gpu_info['devices'] = []
-        
-        for i in range(gpu_count):
-            try:
-                # 这部分代码需要安装nvidia-ml-py库才能获取GPU利用率
-                import pynvml
-                pynvml.nvmlInit()
-                handle = pynvml.nvmlDeviceGetHandleByIndex(i)
-                util = pynvml.nvmlDeviceGetUtilizationRates(handle)
-                gpu_info['devices'].append({
-                    'name': torch.cuda.get_device_name(i),
-                    'utilization': util.gpu
-                })
-            except ImportError:
-                gpu_info['devices'].append({
-                    'name': torch.cuda.get_device_name(i),
-                    'utilization': 'unknown (pynvml not installed)'
-                })
-            except Exception as e:
-                gpu_info['devices'].append({
-                    'name': torch.cuda.get_device_name(i),
-                    'utilization': f'error: {str(e)}'
-                })
-    
-    # 获取当前机器的IP地址
-    import socket
-    hostname = socket.gethostname()
-    local_ip = socket.gethostbyname(hostname)
-    
+    # 后台线程定时采样，这里直接返回最近一次的结果
+    return jsonify(system_monitor.snapshot())
+
+# 系统状态历史：CPU、内存、推理队列深度和检测请求延迟，seconds参数限定时间范围
+@app.route('/api/system-status/history', methods=['GET'])
+def get_system_status_history():
+    seconds = request.args.get('seconds', type=float)
     return jsonify({
-        'status': 'normal',
-        'cpu_usage': cpu_usage,
-        'memory_usage': memory_usage,
-        'uptime': f'{hours}h {minutes}m',
-        'gpu_available': torch.cuda.is_available(),
-        'gpu_info': gpu_info if torch.cuda.is_available() else None,
-        'server_ip': local_ip
+        'status': 'success',
+        'interval': system_monitor.interval,
+        'samples': system_monitor.history(seconds)
     })
 
+# Prometheus抓取端点
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics_registry.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+# 检测历史查询：按ID倒序分页，下一页传入上一页最后一条的ID作为before_id
+def _history_filters():
+    return {
+        'limit': min(request.args.get('limit', 20, type=int), 500),
+        'before_id': request.args.get('before_id', type=int),
+        'user_id': request.args.get('user_id', type=int),
+        'since': request.args.get('since', type=float),  # Unix时间戳（秒）
+        'until': request.args.get('until', type=float)
+    }
+
+def _history_page(items, limit):
+    next_before_id = items[-1]['id'] if len(items) == limit else None
+    return jsonify({'status': 'success', 'items': items, 'next_before_id': next_before_id})
+
+@app.route('/api/history/runs', methods=['GET'])
+def list_history_runs():
+    if history_store is None:
+        return jsonify({'error': '检测历史未启用'}), 404
+    filters = _history_filters()
+    return _history_page(history_store.runs(**filters), filters['limit'])
+
+@app.route('/api/history/runs/<int:run_id>', methods=['GET'])
+def get_history_run(run_id):
+    if history_store is None:
+        return jsonify({'error': '检测历史未启用'}), 404
+    run = history_store.run(run_id)
+    if run is None:
+        return jsonify({'error': '检测记录不存在'}), 404
+    return jsonify({'status': 'success', 'run': run})
+
+@app.route('/api/history/defects', methods=['GET'])
+def list_history_defects():
+    if history_store is None:
+        return jsonify({'error': '检测历史未启用'}), 404
+    filters = _history_filters()
+    items = history_store.defects(defect_type=request.args.get('type'), **filters)
+    return _history_page(items, filters['limit'])
+
+# 最近N天各类缺陷数量，由插入时维护的计数直接得出
+@app.route('/api/history/stats', methods=['GET'])
+def get_history_stats():
+    if history_store is None:
+        return jsonify({'error': '检测历史未启用'}), 404
+    days = max(1, min(request.args.get('days', 7, type=int), 3660))
+    return jsonify({'status': 'success', **history_store.defects_by_type(days), 'all_time': history_store.totals()})
+
+# 调试追踪查询
+@app.route('/api/debug/traces', methods=['GET'])
+def list_traces():
+    limit = int(request.args.get('limit', 50))
+    return jsonify({'status': 'success', 'trace_ids': trace_store.recent(limit)})
+
+@app.route('/api/debug/trace/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    trace = trace_store.get(trace_id)
+    if trace is None:
+        return jsonify({'error': '追踪不存在或已被淘汰'}), 404
+    return jsonify({'status': 'success', **trace.to_dict()})
+
+# 推理调度器状态：队列深度与批大小分布；多进程推理时为各工作进程的状态
+@app.route('/api/inference/stats', methods=['GET'])
+def get_inference_stats():
+    if worker_pool is not None:
+        return jsonify({'status': 'success', 'scheduler_enabled': False, 'worker_pool': worker_pool.stats()})
+    forward = [{'model_path': path, 'device': device, 'imgsz': imgsz, 'backend': backend, **stats}
+               for (path, device, imgsz, backend), stats in model_registry.forward_stats().items()]
+    if inference_scheduler is None:
+        return jsonify({'status': 'success', 'scheduler_enabled': False, 'forward_passes': forward})
+    return jsonify({'status': 'success', 'scheduler_enabled': True, 'forward_passes': forward,
+                    **inference_scheduler.stats()})
+
+# 上传图片存档状态：图片数、总大小与保留策略
+@app.route('/api/uploads/stats', methods=['GET'])
+def get_upload_stats():
+    if upload_archiver is None:
+        return jsonify({'status': 'success', 'archive_enabled': False})
+    return jsonify({'status': 'success', 'archive_enabled': True, **upload_archiver.stats()})
+
+# 结果缓存状态与清空
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    if result_cache is None:
+        return jsonify({'status': 'success', 'cache_enabled': False})
+    return jsonify({'status': 'success', 'cache_enabled': True, **result_cache.stats()})
+
+@app.route('/api/cache/clear', methods=['POST'])
+def clear_cache():
+    if result_cache is not None:
+        result_cache.clear()
+    return jsonify({'status': 'success'})
+
+# 模型管理：查看、重新加载、移除常驻模型
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    return jsonify({
+        'status': 'success',
+        'max_models': model_registry.max_models,
+        'models': [
+            {'model_path': path, 'device': device, 'imgsz': imgsz, 'backend': backend}
+            for path, device, imgsz, backend in model_registry.loaded_keys()
+        ]
+    })
+
+def _model_args_from_request():
+    data = request.get_json(silent=True) or {}
+    return {
+        'model_path': data.get('model_path', Config.MODEL_PATH),
+        'device': data.get('device', Config.MODEL_DEVICE),
+        'imgsz': int(data.get('imgsz', Config.MODEL_IMGSZ)),
+        'backend': data.get('backend', Config.MODEL_BACKEND)
+    }
+
+@app.route('/api/models/reload', methods=['POST'])
+def reload_model():
+    args = _model_args_from_request()
+    model_registry.reload(**args)
+    return jsonify({'status': 'success', 'model': args})
+
+@app.route('/api/models/evict', methods=['POST'])
+def evict_model():
+    args = _model_args_from_request()
+    removed = model_registry.evict(**args)
+    return jsonify({'status': 'success', 'evicted': removed, 'model': args})
+
 # User registration endpoint
 @app.route('/api/register', methods=['POST'])
 def register_user():
@@ -267,14 +895,7 @@ def register_user():
         return response, 400
     
     try:
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO users (username, password, email, phone) VALUES (?, ?, ?, ?)',
-            (username, password, email, phone)
-        )
-        conn.commit()
-        conn.close()
+        user_store.create_user(username, password, email, phone)
         
         response = jsonify({'status': 'success', 'message': '用户注册成功'})
         origin = request.headers.get('Origin')
@@ -319,21 +940,12 @@ def login_user():
     if not all([username, password]):
         return jsonify({'error': '缺少用户名或密码'}), 400
     
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT id, username, email, phone FROM users WHERE username=? AND password=?',
-        (username, password)
-    )
-    row = cursor.fetchone()
-    conn.close()
+    user_info = user_store.authenticate(username, password)
     
-    if row:
-        user_id, uname, email, phone = row
+    if user_info:
         # Generate token without TimedJSONWebSignatureSerializer
         s = Serializer(app.config['SECRET_KEY'])
-        token = s.dumps({'user_id': user_id})
-        user_info = {'id': user_id, 'username': uname, 'email': email, 'phone': phone}
+        token = s.dumps({'user_id': user_info['id']})
         
         response = jsonify({'status': 'success', 'token': token, 'user': user_info})
         
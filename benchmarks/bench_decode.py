@@ -0,0 +1,66 @@
+"""
+CPU time spent preparing the views of one request, before and after the
+decode-once pipeline. No model is needed; only image handling is timed.
+
+    python benchmarks/bench_decode.py --repeat 50 example.jpg test1.jpg
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from v11 import load_image, rotated_views  # noqa: E402
+
+
+def legacy_views(path, orientation_count):
+    """What predict did before: PIL decode, unused array copy, path re-read and a JPEG encode per rotation"""
+    original_image = Image.open(path)
+    np.array(original_image)  # orig_img, never used
+    views = [cv2.imread(path)]  # ultralytics decoding the path a second time
+    for angle in (90, 180, -90)[:orientation_count - 1]:
+        rotated = original_image.rotate(angle, expand=True)
+        with io.BytesIO() as buffer:
+            rotated.save(buffer, format='JPEG')
+        views.append(np.array(rotated))
+    return views
+
+
+def decode_once_views(data, orientation_count):
+    return rotated_views(load_image(data), orientation_count)
+
+
+def cpu_ms(fn, repeat):
+    fn()  # warm caches
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*',
+                        default=[os.path.join(ROOT, 'example.jpg'), os.path.join(ROOT, 'test1.jpg')])
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'image':<16}{'orient':>7}{'legacy ms':>12}{'decode-once ms':>16}{'saved ms':>10}")
+    for path in args.images:
+        with open(path, 'rb') as f:
+            data = f.read()
+        for orientation_count in (1, 2, 4):
+            legacy = cpu_ms(lambda: legacy_views(path, orientation_count), args.repeat)
+            new = cpu_ms(lambda: decode_once_views(data, orientation_count), args.repeat)
+            print(f"{os.path.basename(path):<16}{orientation_count:>7}{legacy:>12.2f}{new:>16.2f}{legacy - new:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
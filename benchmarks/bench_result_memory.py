@@ -0,0 +1,139 @@
+"""
+Peak Python/numpy memory of one detection request, from predict to the
+/api/detect defects and statistics, before and after the compact results.
+
+The legacy variant reproduces what predict did before DetectionResult: the
+voted boxes were put into a deep copy of the 0° ultralytics Results, which
+carries the whole decoded image, and the response was then built one box at
+a time with .item() calls. Both variants run the same model on the same
+image. A request detects --batch copies of the image through predict_batch,
+like /api/detect/batch, so every result of the batch is alive at once.
+
+Memory is measured with tracemalloc, which sees Python objects and numpy
+arrays but not torch's own allocator, so the forward pass itself is only
+partly counted. Timings come from separate, untraced runs. Random yolo11n
+weights detect next to nothing; pass trained weights with a low --conf to
+include the per-box cost:
+
+    python benchmarks/bench_result_memory.py --model best.pt --conf 0.001 --batch 4
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from detection_result import summarize  # noqa: E402
+from v11 import YOLOv11Ensemble  # noqa: E402
+
+
+class LegacyEnsemble(YOLOv11Ensemble):
+    """YOLOv11Ensemble returning its voted boxes in a deep copy of the 0° Results, as predict used to"""
+
+    def _vote(self, image, view_results, *args, **kwargs):
+        from ultralytics.engine.results import Boxes
+        voted = super()._vote(image, view_results, *args, **kwargs)
+        result = deepcopy(view_results[0])
+        result.boxes = Boxes(torch.as_tensor(voted.data, device=result.boxes.data.device), result.orig_shape)
+        return result
+
+
+def legacy_summarize(result):
+    """The per-box loop build_detection_result ran before summarize"""
+    defects = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = box.xyxy[0].tolist()
+        confidence = box.conf[0].item()
+        class_id = box.cls[0].item()
+        defects.append({
+            'type': result.names[int(class_id)],
+            'position': {'x': int((x1 + x2) / 2), 'y': int((y1 + y2) / 2)},
+            'bbox': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)},
+            'confidence': round(confidence * 100, 2),
+            'severity': 'severe' if confidence > 0.8 else 'moderate' if confidence > 0.5 else 'minor'
+        })
+    stats = {
+        'total_defects': len(defects),
+        'defect_types': {},
+        'accuracy': round(sum(d['confidence'] for d in defects) / len(defects) if defects else 0, 2)
+    }
+    for defect in defects:
+        stats['defect_types'][defect['type']] = stats['defect_types'].get(defect['type'], 0) + 1
+    return defects, stats
+
+
+def request(detector, build, images, kwargs):
+    results = detector.predict_batch(images, **kwargs)
+    return results, [build(result) for result in results]
+
+
+def traced(detector, build, images, kwargs, requests):
+    """Per request: (peak MB above the starting point, MB still held by the result and response)"""
+    samples = []
+    tracemalloc.start()
+    try:
+        for _ in range(requests):
+            gc.collect()
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            kept = request(detector, build, images, kwargs)
+            current, peak = tracemalloc.get_traced_memory()
+            samples.append(((peak - start) / 2 ** 20, (current - start) / 2 ** 20))
+            del kept
+    finally:
+        tracemalloc.stop()
+    return samples
+
+
+def timed(detector, build, images, kwargs, requests):
+    times = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        request(detector, build, images, kwargs)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='yolo11n.yaml', help='weights, or a yaml for random weights')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--image-size', type=int, nargs=2, default=[3000, 4000], metavar=('HEIGHT', 'WIDTH'))
+    parser.add_argument('--orientations', type=int, default=4)
+    parser.add_argument('--vote-threshold', type=int, default=2)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--batch', type=int, default=1, help='images per request')
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=1, help='torch intra-op threads')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    image = np.random.default_rng(0).integers(0, 256, size=(*args.image_size, 3), dtype=np.uint8)
+    images = [image] * args.batch
+    kwargs = {'orientation_count': args.orientations, 'vote_threshold': args.vote_threshold,
+              'conf_thres': args.conf}
+    print(f"image {args.image_size[1]}x{args.image_size[0]} ({image.nbytes / 2 ** 20:.1f} MB decoded), "
+          f"{args.orientations} orientations, imgsz {args.imgsz}, {args.batch} per request")
+    print(f"{'variant':<10}{'boxes':>7}{'peak MB':>10}{'held MB':>10}{'p50 ms':>10}")
+    variants = (('legacy', LegacyEnsemble, legacy_summarize), ('compact', YOLOv11Ensemble, summarize))
+    for name, cls, build in variants:
+        detector = cls(args.model, device='cpu', imgsz=args.imgsz)
+        detector.warmup()
+        boxes = sum(len(defects) for defects, _ in request(detector, build, images, kwargs)[1])
+        samples = traced(detector, build, images, kwargs, args.requests)
+        times = timed(detector, build, images, kwargs, args.requests)
+        print(f"{name:<10}{boxes:>7}{max(s[0] for s in samples):>10.1f}{max(s[1] for s in samples):>10.2f}"
+              f"{statistics.median(times):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
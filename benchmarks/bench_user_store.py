@@ -0,0 +1,145 @@
+"""
+Concurrent-login benchmark for users.db: the old connect-per-request access
+against UserStore (per-thread connections, WAL, busy timeout).
+
+Every variant gets a fresh database seeded with --users accounts and the same
+workload: --clients threads logging in as random users, with --write-ratio of
+the operations being registrations, like a shift change with some new
+operators. The old variant compares plaintext passwords in SQL. UserStore runs
+with the settings from config.py (Config.PASSWORD_HASHING, whose default keeps
+plaintext passwords). The "hashed" variant shows what turning hashing on
+would cost with Config.PASSWORD_HASH_METHOD (werkzeug's scrypt by default),
+over --hashed-operations operations because every check takes ~100+ ms of CPU.
+
+    python benchmarks/bench_user_store.py --clients 32 --operations 4000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config  # noqa: E402
+from user_store import UserStore  # noqa: E402
+
+
+class LegacyUsers:
+    """The access pattern app.py used before UserStore: a new connection per call, default journal mode"""
+
+    def __init__(self, path):
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                phone TEXT UNIQUE NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def create_user(self, username, password, email, phone):
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute('INSERT INTO users (username, password, email, phone) VALUES (?, ?, ?, ?)',
+                         (username, password, email, phone))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def authenticate(self, username, password):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute('SELECT id, username, email, phone FROM users WHERE username=? AND password=?',
+                                (username, password)).fetchone()
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+
+def run(store, users, operations, clients, write_ratio, seed):
+    counter = iter(range(users, users + operations))
+    counter_lock = threading.Lock()
+    latencies = {'login': [], 'register': []}
+    errors = []
+
+    def one(i):
+        rng = random.Random(seed + i)
+        if rng.random() < write_ratio:
+            with counter_lock:
+                n = next(counter)
+            kind, call = 'register', lambda: store.create_user(f'user{n}', 'secret', f'user{n}@pcb', f'1{n:010d}')
+        else:
+            n = rng.randrange(users)
+            kind, call = 'login', lambda: store.authenticate(f'user{n}', 'secret')
+        start = time.perf_counter()
+        try:
+            call()
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+            return
+        latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(one, range(operations)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='accounts seeded before the run')
+    parser.add_argument('--operations', type=int, default=4000)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent request threads')
+    parser.add_argument('--write-ratio', type=float, default=0.05, help='fraction of operations that register')
+    parser.add_argument('--hashed-operations', type=int, default=200,
+                        help='operations of the hashed variant (0 skips it)')
+    parser.add_argument('--hash-method', default=Config.PASSWORD_HASH_METHOD,
+                        help='werkzeug hash method of the hashed variant (default: the production setting)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'variant':<12}{'ops/s':>9}{'login p50':>12}{'p95':>11}{'max':>11}{'register p95':>14}{'errors':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        variants = [('connect', args.operations, lambda path: LegacyUsers(path)),
+                    ('user_store', args.operations,
+                     lambda path: UserStore(path, hash_passwords=Config.PASSWORD_HASHING,
+                                            hash_method=Config.PASSWORD_HASH_METHOD))]
+        if args.hashed_operations:
+            variants.append(('hashed', args.hashed_operations,
+                             lambda path: UserStore(path, hash_passwords=True, hash_method=args.hash_method or None)))
+        for name, operations, factory in variants:
+            store = factory(os.path.join(tmp, f'{name}.db'))
+            for n in range(args.users):
+                store.create_user(f'user{n}', 'secret', f'user{n}@pcb', f'1{n:010d}')
+            seconds, latencies, errors = run(store, args.users, operations, args.clients,
+                                             args.write_ratio, args.seed)
+            store.close()
+            logins = latencies['login']
+            print(f"{name:<12}{operations / seconds:>9.0f}{statistics.median(logins):>10.2f}ms"
+                  f"{percentile(logins, 0.95):>9.2f}ms{max(logins):>9.1f}ms"
+                  f"{percentile(latencies['register'], 0.95):>12.2f}ms{len(errors):>8}")
+            for message in sorted(set(errors)):
+                print(f"    {errors.count(message)} x {message}")
+
+
+if __name__ == '__main__':
+    main()
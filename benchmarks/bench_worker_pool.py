@@ -0,0 +1,67 @@
+"""
+CPU inference throughput of the multi-process worker pool for different
+worker counts. Every configuration splits the same number of cores between
+its workers (threads per worker = cores // workers) and is fed by enough
+concurrent clients to keep every worker busy.
+
+    python benchmarks/bench_worker_pool.py --weights best.pt --workers 1 2 4 --requests 64
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from worker_pool import InferenceWorkerPool  # noqa: E402
+
+
+def run(pool, payloads, requests, clients, predict_kwargs):
+    def one(i):
+        pool.predict(payloads[i % len(payloads)], **predict_kwargs)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(one, range(requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*',
+                        default=[os.path.join(ROOT, 'example.jpg'), os.path.join(ROOT, 'test1.jpg')])
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'best.pt'))
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--cores', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--orientations', type=int, default=4)
+    args = parser.parse_args()
+
+    payloads = []
+    for path in args.images:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    predict_kwargs = {'orientation_count': args.orientations, 'vote_threshold': args.orientations}
+
+    print(f"{'workers':>8}{'threads':>9}{'seconds':>10}{'img/s':>9}{'speed-up':>10}")
+    baseline = None
+    for num_workers in args.workers:
+        threads = max(1, args.cores // num_workers)
+        pool = InferenceWorkerPool(args.weights, num_workers=num_workers, num_threads=threads,
+                                   device='cpu', imgsz=args.imgsz)
+        try:
+            pool.wait_ready()
+            run(pool, payloads, num_workers, num_workers, predict_kwargs)  # 每个进程先跑一次
+            seconds = run(pool, payloads, args.requests, num_workers * 2, predict_kwargs)
+        finally:
+            pool.close()
+        throughput = args.requests / seconds
+        baseline = baseline or throughput
+        print(f"{num_workers:>8}{threads:>9}{seconds:>10.2f}{throughput:>9.2f}{throughput / baseline:>10.2f}x")
+
+
+if __name__ == '__main__':
+    main()
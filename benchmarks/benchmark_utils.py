@@ -0,0 +1,36 @@
+"""
+Helpers shared by the benchmark and parity scripts in this folder.
+
+The scripts put the repository root on sys.path themselves; this module is
+imported from the script's own folder.
+"""
+import statistics
+import time
+
+import numpy as np
+
+
+def boxes_of(result):
+    """[x1, y1, x2, y2, conf, cls] boxes of a detection result as an (N,6) float64 array"""
+    if not hasattr(result, 'boxes') or len(result.boxes) == 0:
+        return np.zeros((0, 6))
+    return result.boxes.data.cpu().numpy().astype(np.float64)
+
+
+def time_ms(fn, repeat, warmup=1):
+    """Wall-clock milliseconds of `repeat` calls of fn, after `warmup` untimed calls"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def timed_predict(model, image, repeat, predict_kwargs):
+    """(result, median ms) of model.predict on `image`; the untimed warm-up call gives the result"""
+    result = model.predict(image, **predict_kwargs)
+    times = time_ms(lambda: model.predict(image, **predict_kwargs), repeat, warmup=0)
+    return result, statistics.median(times)
@@ -0,0 +1,77 @@
+"""
+Parity and latency of the exported backends against the torch backend.
+
+Every image is run through the full multi-orientation predict on each backend.
+A box counts as matched when the torch result has a box of the same class with
+IoU >= --match-iou. The script exits non-zero when any backend matches less
+than --min-agreement of the boxes on either side.
+
+    python benchmarks/compare_backends.py --weights best.pt --backends onnx openvino
+"""
+import argparse
+import os
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark_utils import boxes_of, timed_predict  # noqa: E402
+from box_fusion import match_boxes  # noqa: E402
+from v11 import YOLOv11Ensemble, load_image  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'best.pt'))
+    parser.add_argument('--backends', nargs='+', default=['onnx', 'openvino'])
+    parser.add_argument('--imgsz', type=int, default=1280)
+    parser.add_argument('--images', nargs='+',
+                        default=[os.path.join(ROOT, 'example.jpg'), os.path.join(ROOT, 'test1.jpg')])
+    parser.add_argument('--conf', type=float, default=0.4)
+    parser.add_argument('--orientations', type=int, default=4)
+    parser.add_argument('--vote', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--match-iou', type=float, default=0.9)
+    parser.add_argument('--min-agreement', type=float, default=0.95)
+    args = parser.parse_args()
+
+    predict_kwargs = {'orientation_count': args.orientations, 'vote_threshold': args.vote}
+    images = [(os.path.basename(path), load_image(path)) for path in args.images]
+    models = {backend: YOLOv11Ensemble(args.weights, conf_thres=args.conf, device='cpu', imgsz=args.imgsz,
+                                       backend=backend)
+              for backend in ['torch'] + [b for b in args.backends if b != 'torch']}
+
+    reference = {}
+    latencies = {backend: [] for backend in models}
+    for name, image in images:
+        result, ms = timed_predict(models['torch'], image, args.repeat, predict_kwargs)
+        reference[name] = boxes_of(result)
+        latencies['torch'].append(ms)
+
+    failures = 0
+    print(f"{'backend':<10}{'image':<16}{'torch':>7}{'boxes':>7}{'matched':>9}{'ms':>10}{'torch ms':>10}")
+    for backend, model in models.items():
+        if backend == 'torch':
+            continue
+        for (name, image), torch_ms in zip(images, latencies['torch']):
+            result, ms = timed_predict(model, image, args.repeat, predict_kwargs)
+            latencies[backend].append(ms)
+            boxes = boxes_of(result)
+            matched = len(match_boxes(reference[name], boxes, args.match_iou))
+            total = max(len(reference[name]), len(boxes))
+            agreement = matched / total if total else 1.0
+            failures += agreement < args.min_agreement
+            print(f"{backend:<10}{name:<16}{len(reference[name]):>7}{len(boxes):>7}{matched:>9}"
+                  f"{ms:>10.1f}{torch_ms:>10.1f}")
+
+    print()
+    torch_ms = statistics.mean(latencies['torch'])
+    for backend, values in latencies.items():
+        ms = statistics.mean(values)
+        print(f"{backend:<10} mean {ms:8.1f} ms  speed-up {torch_ms / ms:5.2f}x")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Check the multi-orientation predict against the baseline implementation.
+
+BaselineEnsemble below is the predict that shipped before the batched
+forward pass (minus its prints): the 0° view is read from the path by
+ultralytics, the rotated views are PIL rotations of the RGB image, every
+view is its own model call, and the boxes are mapped back and voted in
+Python lists. The current predict is checked against it with batched=True
+and with batched=False (one model call per view, which shares the new
+decoding and unrotate_boxes with the batched path).
+
+The baseline mapped 270° boxes back with the image width where the height
+belongs. On square images (example.jpg) the outputs must match as they are;
+on non-square images (test1.jpg) they are compared with a baseline whose
+270° back-transform is corrected, and the raw baseline is reported as an
+expected difference.
+
+    python benchmarks/parity_batched_orientations.py --weights best.pt
+"""
+import argparse
+import os
+import sys
+from copy import deepcopy
+
+import numpy as np
+import torch
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark_utils import boxes_of  # noqa: E402
+from v11 import YOLOv11Ensemble  # noqa: E402
+
+
+def iou(box1, box2):
+    x1_min, y1_min, x1_max, y1_max = box1[:4]
+    x2_min, y2_min, x2_max, y2_max = box2[:4]
+    inter_area = max(0, min(x1_max, x2_max) - max(x1_min, x2_min)) * max(0, min(y1_max, y2_max) - max(y1_min, y2_min))
+    union_area = (x1_max - x1_min) * (y1_max - y1_min) + (x2_max - x2_min) * (y2_max - y2_min) - inter_area
+    return 0 if union_area == 0 else inter_area / union_area
+
+
+def aggregate_boxes(predictions, iou_threshold=0.5):
+    predictions_copy = deepcopy(predictions)
+    aggregated_boxes = []
+    while predictions_copy:
+        base_box = predictions_copy.pop(0)
+        similar_boxes = [base_box]
+        i = 0
+        while i < len(predictions_copy):
+            if iou(base_box, predictions_copy[i]) > iou_threshold:
+                similar_boxes.append(predictions_copy.pop(i))
+            else:
+                i += 1
+        aggregated_boxes.append(similar_boxes)
+    return aggregated_boxes
+
+
+def voting_mechanism(aggregated_boxes, vote_threshold=3):
+    final_boxes = []
+    for group in aggregated_boxes:
+        if len(group) >= vote_threshold:
+            avg_box = [sum(box[i] for box in group) / len(group) for i in range(4)]
+            avg_conf = sum(box[4] for box in group) / len(group)
+            final_boxes.append(avg_box + [avg_conf, group[0][5]])
+    return final_boxes
+
+
+class BaselineEnsemble(YOLOv11Ensemble):
+    """The baseline predict; fixed_270=True uses the image height in the 270° back-transform"""
+
+    fixed_270 = False
+
+    def _call(self, source):
+        result = self.model(source, conf=self.conf_thres, iou=self.iou_thres, device=self.device,
+                            imgsz=self.imgsz, verbose=False)[0]
+        return result, boxes_of(result).tolist()
+
+    def predict(self, image_path, vote_threshold=3, orientation_count=4):
+        if orientation_count == 2 and vote_threshold > 2:
+            vote_threshold = 1
+        original_image = Image.open(image_path)
+        width, height = original_image.size
+        original_result, pred0 = self._call(image_path)
+        if orientation_count == 1:
+            return original_result
+
+        all_predictions = list(pred0)
+        _, pred90 = self._call(np.array(original_image.rotate(90, expand=True)))
+        all_predictions.extend([width - b[3], b[0], width - b[1], b[2], b[4], b[5]] for b in pred90)
+        if orientation_count == 4:
+            _, pred180 = self._call(np.array(original_image.rotate(180, expand=True)))
+            all_predictions.extend([width - b[2], height - b[3], width - b[0], height - b[1], b[4], b[5]]
+                                   for b in pred180)
+            _, pred270 = self._call(np.array(original_image.rotate(-90, expand=True)))
+            h = height if self.fixed_270 else width
+            all_predictions.extend([b[1], h - b[2], b[3], h - b[0], b[4], b[5]] for b in pred270)
+
+        final_boxes = voting_mechanism(aggregate_boxes(all_predictions, iou_threshold=self.iou_thres),
+                                       vote_threshold=vote_threshold)
+        final_result = deepcopy(original_result)
+        if final_boxes:
+            from ultralytics.engine.results import Boxes
+            final_result.boxes = Boxes(torch.tensor(final_boxes, dtype=torch.float32), final_result.orig_shape)
+        return final_result
+
+
+def same_boxes(a, b, atol):
+    return a.shape == b.shape and np.allclose(a, b, atol=atol)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'best.pt'))
+    parser.add_argument('--imgsz', type=int, default=1280)
+    parser.add_argument('--images', nargs='+',
+                        default=[os.path.join(ROOT, 'example.jpg'), os.path.join(ROOT, 'test1.jpg')])
+    parser.add_argument('--conf', type=float, default=0.4)
+    parser.add_argument('--atol', type=float, default=1e-2, help='absolute tolerance on coordinates and confidence')
+    args = parser.parse_args()
+
+    model = YOLOv11Ensemble(args.weights, conf_thres=args.conf, imgsz=args.imgsz)
+    baseline = BaselineEnsemble(args.weights, conf_thres=args.conf, imgsz=args.imgsz)
+    failures = 0
+    for image in args.images:
+        width, height = Image.open(image).size
+        for orientation_count, vote_threshold in ((1, 1), (2, 1), (4, 2), (4, 3)):
+            kwargs = {'vote_threshold': vote_threshold, 'orientation_count': orientation_count}
+            baseline.fixed_270 = False
+            raw = boxes_of(baseline.predict(image, **kwargs))
+            baseline.fixed_270 = True
+            reference = boxes_of(baseline.predict(image, **kwargs))
+            line = f"{os.path.basename(image)} orientations={orientation_count} vote={vote_threshold}:"
+            for batched in (False, True):
+                boxes = boxes_of(model.predict(image, batched=batched, **kwargs))
+                same = same_boxes(reference, boxes, args.atol)
+                failures += not same
+                line += f" batched={batched} {len(boxes)}/{len(reference)} boxes {'OK' if same else 'MISMATCH'};"
+            if not same_boxes(raw, reference, args.atol):
+                # 只有非正方形图片的270°视角会不同，其他情况说明基线被改动过
+                expected = width != height and orientation_count == 4
+                failures += not expected
+                line += f" raw baseline differs ({'expected: 270° fix' if expected else 'UNEXPECTED'})"
+            print(line)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare cascade voting (predict(..., cascade=True)) with exhaustive voting.
+
+Cascade voting skips the last orientation of an image when its other views
+found nothing, and only with class_aware grouping, vote_threshold >= 2 and
+without tensor_views (see YOLOv11Ensemble._cascade_exact); any other call
+runs every view. Its results must match exhaustive voting, and every
+difference is reported as a MISMATCH and makes the script exit with 1.
+
+Two checks:
+  * synthetic view results fed to the voting code directly, covering the
+    cases that broke the earlier exit rules (the skipped views keep to what
+    ultralytics NMS guarantees: no two boxes of one class above iou_thres);
+  * the real model over --images at several confidence thresholds, with and
+    without class_aware, where every output must match within --atol.
+
+    python benchmarks/parity_cascade.py --weights best.pt --images uploads --conf 0.001 0.25
+"""
+import argparse
+import itertools
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark_utils import boxes_of  # noqa: E402
+from detection_result import DetectionResult  # noqa: E402
+from model_export import calibration_images  # noqa: E402
+from v11 import YOLOv11Ensemble  # noqa: E402
+
+A = [10, 10, 30, 30, 0.9, 0]
+A_SHIFTED = [11, 10, 31, 30, 0.7, 0]
+A_OTHER_CLASS = [10, 10, 30, 30, 0.7, 1]
+B = [200, 200, 240, 240, 0.8, 2]
+
+# 与A同类，和A的IoU都大于0.45但彼此不大于0.45
+A_LEFT = [2, 10, 24, 30, 0.8, 0]
+A_RIGHT = [16, 10, 38, 30, 0.8, 0]
+
+# (name, boxes per view in original coordinates, vote_threshold, class_aware)
+CASES = (
+    ('empty board', [[], [], [], []], 3, False),
+    ('empty board, class_aware', [[], [], [], []], 3, True),
+    ('review repro: 0° box, stacked classes at 270°', [[A], [], [], [A, A_OTHER_CLASS]], 3, False),
+    ('0° box confirmed late', [[A], [], [A_SHIFTED], [A]], 3, False),
+    ('box only at 90°', [[], [B], [], []], 3, False),
+    ('box only at 180°', [[], [], [B], []], 2, False),
+    ('box only at 270°, class_aware', [[], [], [], [B]], 2, True),
+    ('stacked classes only at 270°', [[], [], [], [A, A_OTHER_CLASS, [10, 11, 30, 31, 0.6, 2]]], 3, False),
+    ('stacked classes only at 270°, class_aware', [[], [], [], [A, A_OTHER_CLASS, [10, 11, 30, 31, 0.6, 2]]],
+     2, True),
+    ('180° box joined by two 270° boxes, class_aware', [[], [], [A], [A_LEFT, A_RIGHT]], 3, True),
+)
+
+
+class CannedViews(YOLOv11Ensemble):
+    """YOLOv11Ensemble whose views return fixed boxes, given per image and orientation in original coordinates"""
+
+    canned = {}
+
+    def _prepare_views(self, images, orientation_count):
+        return [[(id(image), k) for k in range(orientation_count)] for image in images]
+
+    def _run_views(self, views, conf_thres, iou_thres, batched=True):
+        return [self.canned[view] for view in views]
+
+    def _view_boxes(self, image, k, result):
+        return result.data.astype(np.float64)
+
+
+def synthetic_failures(detector, atol):
+    failures = 0
+    for name, view_boxes, vote_threshold, class_aware in CASES:
+        image = np.zeros((256, 256, 3), dtype=np.uint8)
+        detector.canned = {(id(image), k): DetectionResult(boxes, detector.model.names, image.shape[:2])
+                           for k, boxes in enumerate(view_boxes)}
+        kwargs = {'vote_threshold': vote_threshold, 'orientation_count': 4, 'class_aware': class_aware}
+        exhaustive = detector.predict(image, **kwargs).data
+        cascade = detector.predict(image, cascade=True, **kwargs).data
+        same = exhaustive.shape == cascade.shape and np.allclose(exhaustive, cascade, atol=atol)
+        failures += not same
+        print(f"  {name:<48} {len(exhaustive)} vs {len(cascade)} boxes -> {'OK' if same else 'MISMATCH'}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'best.pt'))
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--images', nargs='+',
+                        default=[os.path.join(ROOT, 'example.jpg'), os.path.join(ROOT, 'test1.jpg')],
+                        help='image files or folders')
+    parser.add_argument('--max-images', type=int, default=20, help='images taken from each folder')
+    parser.add_argument('--conf', type=float, nargs='+', default=[0.001, 0.25, 0.4])
+    parser.add_argument('--atol', type=float, default=1e-3, help='absolute tolerance on coordinates and confidence')
+    args = parser.parse_args()
+
+    print('synthetic views:')
+    failures = synthetic_failures(CannedViews('yolo11n.yaml', device='cpu', imgsz=64), args.atol)
+
+    if not os.path.exists(args.weights):
+        sys.exit(f"{args.weights} not found; only the synthetic check ran")
+    detector = YOLOv11Ensemble(args.weights, device='cpu', imgsz=args.imgsz)
+    paths = [p for path in args.images
+             for p in (calibration_images(path, args.max_images) if os.path.isdir(path) else [path])]
+    print(f"\n{len(paths)} images:")
+    for conf in args.conf:
+        for (orientation_count, vote_threshold), class_aware in itertools.product(((2, 2), (4, 2), (4, 3)),
+                                                                                   (False, True)):
+            kwargs = {'vote_threshold': vote_threshold, 'orientation_count': orientation_count, 'conf_thres': conf,
+                      'class_aware': class_aware}
+            before = detector.forward_stats()['forward_passes_saved']
+            mismatches = 0
+            for path in paths:
+                exhaustive = boxes_of(detector.predict(path, **kwargs))
+                cascade = boxes_of(detector.predict(path, cascade=True, **kwargs))
+                mismatches += not (exhaustive.shape == cascade.shape and np.allclose(exhaustive, cascade,
+                                                                                     atol=args.atol))
+            saved = detector.forward_stats()['forward_passes_saved'] - before
+            failures += mismatches
+            print(f"  conf={conf} orientations={orientation_count} vote={vote_threshold} "
+                  f"class_aware={class_aware}: "
+                  f"{mismatches} mismatches, {saved} forward passes skipped")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Accuracy-versus-speed report for the INT8 (onnx-int8) backend.
+
+Runs the fp32 reference backend and the INT8 backend over a labeled sample set
+in YOLO format (images/... mirrored by labels/... with one "cls cx cy w h" line per box)
+and prints, per class: ground-truth boxes, recall of each model, and how many
+boxes the two models agree on (same class, IoU >= --match-iou). The latency of
+the full multi-orientation predict is compared at the end. Images without a
+label file are still used for agreement and latency.
+
+    python benchmarks/quantization_report.py --weights best.pt --images samples/images --calibration-dir uploads
+"""
+import argparse
+import os
+import statistics
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark_utils import boxes_of, timed_predict  # noqa: E402
+from box_fusion import match_boxes  # noqa: E402
+from model_export import calibration_images  # noqa: E402
+from v11 import YOLOv11Ensemble, load_image  # noqa: E402
+
+
+def label_path(image_path, labels_dir):
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    if labels_dir is None:
+        # YOLO约定：.../images/train/xxx.jpg 对应 .../labels/train/xxx.txt
+        parts = os.path.dirname(os.path.abspath(image_path)).split(os.sep)
+        if 'images' in parts:
+            parts[len(parts) - 1 - parts[::-1].index('images')] = 'labels'
+        labels_dir = os.sep.join(parts)
+    return os.path.join(labels_dir, f'{stem}.txt')
+
+
+def load_labels(path, width, height):
+    """Ground-truth boxes as an (N,6) [x1, y1, x2, y2, 1, cls] array, or None without a label file"""
+    if not os.path.exists(path):
+        return None
+    rows = np.loadtxt(path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros((0, 6))
+    cls, cx, cy, w, h = rows[:, 0], rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    return np.column_stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2, np.ones(len(rows)), cls])
+
+
+def per_class_matches(reference, candidate, match_iou):
+    counts = defaultdict(int)
+    for i, _ in match_boxes(reference, candidate, match_iou):
+        counts[int(reference[i, 5])] += 1
+    return counts
+
+
+def per_class_counts(boxes):
+    classes, counts = np.unique(boxes[:, 5].astype(int), return_counts=True)
+    return dict(zip(classes.tolist(), counts.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'best.pt'))
+    parser.add_argument('--images', required=True, help='folder with the labeled sample images')
+    parser.add_argument('--labels', default=None, help='label folder (default: the images path with images/ replaced by labels/)')
+    parser.add_argument('--calibration-dir', default=os.path.join(ROOT, 'uploads'))
+    parser.add_argument('--reference', default='torch', help='fp32 backend to compare against')
+    parser.add_argument('--imgsz', type=int, default=1280)
+    parser.add_argument('--conf', type=float, default=0.4)
+    parser.add_argument('--orientations', type=int, default=4)
+    parser.add_argument('--vote', type=int, default=2)
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per image (median is used)')
+    parser.add_argument('--max-images', type=int, default=200)
+    args = parser.parse_args()
+
+    predict_kwargs = {'orientation_count': args.orientations, 'vote_threshold': args.vote}
+    reference = YOLOv11Ensemble(args.weights, conf_thres=args.conf, device='cpu', imgsz=args.imgsz,
+                                backend=args.reference)
+    quantized = YOLOv11Ensemble(args.weights, conf_thres=args.conf, device='cpu', imgsz=args.imgsz,
+                                backend='onnx-int8', calibration_dir=args.calibration_dir)
+    names = reference.model.names
+
+    totals = {key: defaultdict(int) for key in
+              ('gt', 'fp32', 'int8', 'fp32_tp', 'int8_tp', 'agree')}
+    latencies = {'fp32': [], 'int8': []}
+    paths = calibration_images(args.images, args.max_images)
+    if not paths:
+        sys.exit(f"No images found in {args.images}")
+    labeled = 0
+    for path in paths:
+        image = load_image(path)
+        fp32_result, fp32_ms = timed_predict(reference, image, args.repeat, predict_kwargs)
+        int8_result, int8_ms = timed_predict(quantized, image, args.repeat, predict_kwargs)
+        fp32_boxes, int8_boxes = boxes_of(fp32_result), boxes_of(int8_result)
+        latencies['fp32'].append(fp32_ms)
+        latencies['int8'].append(int8_ms)
+
+        for cls, count in per_class_counts(fp32_boxes).items():
+            totals['fp32'][cls] += count
+        for cls, count in per_class_counts(int8_boxes).items():
+            totals['int8'][cls] += count
+        for cls, count in per_class_matches(fp32_boxes, int8_boxes, args.match_iou).items():
+            totals['agree'][cls] += count
+
+        gt = load_labels(label_path(path, args.labels), image.shape[1], image.shape[0])
+        if gt is None:
+            continue
+        labeled += 1
+        for cls, count in per_class_counts(gt).items():
+            totals['gt'][cls] += count
+        for key, boxes in (('fp32_tp', fp32_boxes), ('int8_tp', int8_boxes)):
+            for cls, count in per_class_matches(gt, boxes, args.match_iou).items():
+                totals[key][cls] += count
+
+    print(f"{len(paths)} images, {labeled} with labels, IoU >= {args.match_iou}\n")
+    print(f"{'class':<18}{'gt':>6}{'fp32 recall':>13}{'int8 recall':>13}{'fp32':>7}{'int8':>7}{'agreement':>11}")
+    classes = sorted(set().union(*(totals[key].keys() for key in totals)))
+    for cls in classes:
+        gt = totals['gt'][cls]
+        fp32, int8, agree = totals['fp32'][cls], totals['int8'][cls], totals['agree'][cls]
+        fp32_recall = f"{totals['fp32_tp'][cls] / gt * 100:.1f}%" if gt else '-'
+        int8_recall = f"{totals['int8_tp'][cls] / gt * 100:.1f}%" if gt else '-'
+        agreement = f"{agree / max(fp32, int8) * 100:.1f}%" if max(fp32, int8) else '-'
+        print(f"{names.get(cls, str(cls)):<18}{gt:>6}{fp32_recall:>13}{int8_recall:>13}{fp32:>7}{int8:>7}{agreement:>11}")
+
+    fp32_ms, int8_ms = statistics.mean(latencies['fp32']), statistics.mean(latencies['int8'])
+    print(f"\nlatency ({args.orientations} orientations, imgsz {args.imgsz}): "
+          f"{args.reference} {fp32_ms:.1f} ms, onnx-int8 {int8_ms:.1f} ms, speed-up {fp32_ms / int8_ms:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
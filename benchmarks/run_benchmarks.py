@@ -0,0 +1,187 @@
+"""
+Micro-benchmarks for the detection hot path, with regression checking.
+
+Times YOLOv11Ensemble.predict for every orientation_count in {1, 2, 4} (with and
+without cascade voting, run with class_aware since it skips nothing otherwise), several imgsz values and several box densities, and times aggregate_boxes and
+voting_mechanism on their own over synthetic box sets. Everything runs on CPU
+with a tiny randomly initialised yolo11n built from its yaml config, so
+best.pt is not needed. The network's own detections are replaced by a fixed
+number of synthetic boxes per view, so the fusion work does not depend on
+what random weights happen to detect.
+
+Results are written as JSON (benchmarks/benchmark_results.json by default,
+which git ignores). With --baseline, every case is compared to the
+stored median and the script exits with status 1 when one is slower than
+baseline * (1 + --tolerance).
+
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark_utils import time_ms  # noqa: E402
+from box_fusion import aggregate_boxes, voting_mechanism  # noqa: E402
+from v11 import YOLOv11Ensemble  # noqa: E402
+
+CLASS_COUNT = 5
+
+
+def synthetic_boxes(rng, count, width, height):
+    """`count` random [x1, y1, x2, y2, conf, cls] boxes inside a width x height image"""
+    size = rng.uniform(8, 80, size=(count, 2))
+    x1 = rng.uniform(0, width - size[:, 0])
+    y1 = rng.uniform(0, height - size[:, 1])
+    return np.column_stack([x1, y1, x1 + size[:, 0], y1 + size[:, 1],
+                            rng.uniform(0.4, 1.0, count), rng.integers(0, CLASS_COUNT, count)])
+
+
+def synthetic_views(rng, objects, views=4, jitter=3.0, false_positives=0.1, width=1280, height=1280):
+    """Boxes as the orientation views would report them: each object once per view with jitter, plus noise"""
+    base = synthetic_boxes(rng, objects, width, height)
+    per_view = []
+    for _ in range(views):
+        boxes = base.copy()
+        boxes[:, :4] += rng.normal(0, jitter, size=(objects, 4))
+        boxes[:, 4] = np.clip(boxes[:, 4] + rng.normal(0, 0.05, objects), 0, 1)
+        per_view.append(boxes)
+        per_view.append(synthetic_boxes(rng, int(objects * false_positives), width, height))
+    return np.concatenate(per_view)
+
+
+class DensityStub:
+    """Runs the wrapped model, then replaces each result's boxes with `boxes_per_view` synthetic ones"""
+
+    def __init__(self, model, boxes_per_view, seed=0):
+        self.model = model
+        self.names = model.names
+        self.boxes_per_view = boxes_per_view
+        self.seed = seed
+
+    def __call__(self, source, **kwargs):
+        results = self.model(source, **kwargs)
+        rng = np.random.default_rng(self.seed)
+        for result in results:
+            height, width = result.orig_shape
+            boxes = synthetic_boxes(rng, self.boxes_per_view, width, height)
+            result.update(boxes=torch.as_tensor(boxes, dtype=torch.float32))
+        return results
+
+
+def measure(fn, repeat, warmup=1):
+    times = time_ms(fn, repeat, warmup)
+    return {'median_ms': round(statistics.median(times), 3), 'min_ms': round(min(times), 3), 'runs': repeat}
+
+
+def bench_predict(imgsz_values, densities, orientation_counts, repeat, image_shape):
+    cases = {}
+    image = np.random.default_rng(0).integers(0, 256, size=image_shape, dtype=np.uint8)
+    for imgsz in imgsz_values:
+        detector = YOLOv11Ensemble('yolo11n.yaml', device='cpu', imgsz=imgsz)
+        network = detector.model
+        for boxes_per_view in densities:
+            detector.model = DensityStub(network, boxes_per_view)
+            for orientation_count in orientation_counts:
+                for cascade in (False, True) if orientation_count > 1 else (False,):
+                    name = f'predict/imgsz={imgsz}/boxes={boxes_per_view}/orientations={orientation_count}'
+                    name += '/cascade' if cascade else ''
+
+                    def run():
+                        detector.predict(image, vote_threshold=min(2, orientation_count),
+                                         orientation_count=orientation_count, class_aware=cascade,
+                                         cascade=cascade)
+
+                    cases[name] = measure(run, repeat, warmup=2)
+                    print(f"{name:<64}{cases[name]['median_ms']:>10.2f} ms")
+    return cases
+
+
+def bench_fusion(object_counts, repeat):
+    cases = {}
+    for objects in object_counts:
+        boxes = synthetic_views(np.random.default_rng(objects), objects)
+        groups = aggregate_boxes(boxes, iou_threshold=0.45)
+        for name, fn in ((f'fusion/aggregate_boxes/boxes={len(boxes)}',
+                          lambda: aggregate_boxes(boxes, iou_threshold=0.45)),
+                         (f'fusion/voting_mechanism/boxes={len(boxes)}',
+                          lambda: voting_mechanism(groups, vote_threshold=3))):
+            cases[name] = measure(fn, repeat)
+            print(f"{name:<64}{cases[name]['median_ms']:>10.3f} ms")
+    return cases
+
+
+def compare(cases, baseline, tolerance):
+    """Names of the cases slower than the baseline by more than `tolerance`"""
+    regressions = []
+    print(f"\n{'case':<64}{'baseline':>10}{'now':>10}{'change':>9}")
+    for name, result in cases.items():
+        reference = baseline.get('cases', {}).get(name)
+        if reference is None:
+            continue
+        change = result['median_ms'] / reference['median_ms'] - 1 if reference['median_ms'] else 0
+        regressed = change > tolerance
+        regressions.extend([name] if regressed else [])
+        print(f"{name:<64}{reference['median_ms']:>10.2f}{result['median_ms']:>10.2f}"
+              f"{change * 100:>8.1f}%{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'benchmark_results.json'))
+    parser.add_argument('--baseline', help='JSON from an earlier run to compare against')
+    parser.add_argument('--save-baseline', help='also write the results to this path')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before failing (0.2 = 20%%)')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[320, 640])
+    parser.add_argument('--densities', type=int, nargs='+', default=[0, 10, 100], help='synthetic boxes per view')
+    parser.add_argument('--orientations', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--fusion-objects', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--image-size', type=int, nargs=2, default=[960, 1280], metavar=('HEIGHT', 'WIDTH'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=1, help='torch intra-op threads, fixed for stable timings')
+    parser.add_argument('--skip-predict', action='store_true')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    cases = {}
+    if not args.skip_predict:
+        cases.update(bench_predict(args.imgsz, args.densities, args.orientations, args.repeat,
+                                   (*args.image_size, 3)))
+    cases.update(bench_fusion(args.fusion_objects, args.repeat * 4))
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'threads': args.threads
+        },
+        'cases': cases
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(cases, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.tolerance * 100:.0f}%")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import numpy as np
+
+
+def as_box_array(boxes):
+    """Convert a list of [x1, y1, x2, y2, conf, cls], an ndarray or a torch tensor to an (N,6) float array"""
+    if hasattr(boxes, 'detach'):
+        boxes = boxes.detach().cpu().numpy()
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 6)
+
+
+def iou(box1, box2):
+    """Calculate IoU between two boxes"""
+    return float(iou_matrix(np.asarray(box1[:4])[None], np.asarray(box2[:4])[None])[0, 0])
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between (N,>=4) and (M,>=4) boxes, returned as an (N,M) array"""
+    a = np.asarray(boxes_a, dtype=np.float64)[:, :4]
+    b = np.asarray(boxes_b, dtype=np.float64)[:, :4]
+
+    inter_min = np.maximum(a[:, None, :2], b[None, :, :2])
+    inter_max = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter_wh = np.clip(inter_max - inter_min, 0, None)
+    inter_area = inter_wh[..., 0] * inter_wh[..., 1]
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union_area = area_a[:, None] + area_b[None, :] - inter_area
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(union_area == 0, 0.0, inter_area / union_area)
+
+
+def group_indices(boxes, iou_threshold=0.5, class_aware=False):
+    """
+    Greedily group overlapping boxes
+
+    Boxes are visited in order; each box that is not yet grouped becomes the base
+    of a new group and takes every later ungrouped box whose IoU with it exceeds
+    `iou_threshold`. With `class_aware=True` only boxes of the same class can join
+    a group. Returns one index array per group, base box first.
+    """
+    boxes = as_box_array(boxes)
+    n = len(boxes)
+    if n == 0:
+        return []
+
+    overlaps = iou_matrix(boxes, boxes) > iou_threshold
+    if class_aware:
+        overlaps &= boxes[:, 5][:, None] == boxes[None, :, 5]
+
+    ungrouped = np.ones(n, dtype=bool)
+    groups = []
+    for i in range(n):
+        if not ungrouped[i]:
+            continue
+        ungrouped[i] = False
+        members = np.flatnonzero(overlaps[i] & ungrouped)
+        ungrouped[members] = False
+        groups.append(np.concatenate(([i], members)))
+    return groups
+
+
+def vote_groups(boxes, groups, vote_threshold=3):
+    """
+    Keep groups with at least `vote_threshold` boxes and average their coordinates
+    and confidence; the class comes from the group's base box. Returns an (M,6) array.
+    """
+    boxes = as_box_array(boxes)
+    if not groups:
+        return np.zeros((0, 6))
+
+    labels = np.empty(len(boxes), dtype=np.int64)
+    for label, members in enumerate(groups):
+        labels[members] = label
+    counts = np.bincount(labels, minlength=len(groups))
+    sums = np.zeros((len(groups), 5))
+    np.add.at(sums, labels, boxes[:, :5])
+
+    keep = counts >= vote_threshold
+    bases = np.array([members[0] for members in groups])
+    return np.column_stack([sums[keep] / counts[keep, None], boxes[bases[keep], 5]])
+
+
+def fuse_boxes(boxes, iou_threshold=0.5, vote_threshold=3, class_aware=False):
+    """Group overlapping boxes and vote in one step, returning an (M,6) array"""
+    boxes = as_box_array(boxes)
+    return vote_groups(boxes, group_indices(boxes, iou_threshold, class_aware), vote_threshold)
+
+
+def match_boxes(reference, candidate, iou_threshold=0.5, class_aware=True):
+    """
+    Greedy one-to-one matching of two box sets, highest IoU first
+
+    Returns (i, j) index pairs into `reference` and `candidate` whose IoU is at
+    least `iou_threshold`; with `class_aware=True` only same-class boxes match.
+    """
+    reference, candidate = as_box_array(reference), as_box_array(candidate)
+    if len(reference) == 0 or len(candidate) == 0:
+        return []
+    overlaps = iou_matrix(reference, candidate)
+    if class_aware:
+        overlaps[reference[:, 5][:, None] != candidate[:, 5][None, :]] = 0
+    pairs = []
+    while True:
+        i, j = np.unravel_index(np.argmax(overlaps), overlaps.shape)
+        if overlaps[i, j] < iou_threshold or overlaps[i, j] == 0:
+            return pairs
+        pairs.append((int(i), int(j)))
+        overlaps[i, :] = 0
+        overlaps[:, j] = 0
+
+
+def aggregate_boxes(predictions, iou_threshold=0.5, class_aware=False):
+    """Group similar boxes together, returning one (k,6) array per group"""
+    boxes = as_box_array(predictions)
+    return [boxes[members] for members in group_indices(boxes, iou_threshold, class_aware)]
+
+
+def voting_mechanism(aggregated_boxes, vote_threshold=3):
+    """Apply voting to grouped boxes, returning an (M,6) array"""
+    if not aggregated_boxes:
+        return np.zeros((0, 6))
+    groups = [as_box_array(group) for group in aggregated_boxes]
+    sizes = [len(group) for group in groups]
+    offsets = np.cumsum([0] + sizes[:-1])
+    members = [np.arange(offset, offset + size) for offset, size in zip(offsets, sizes)]
+    return vote_groups(np.concatenate(groups), members, vote_threshold)
@@ -0,0 +1,253 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+import cv2
+
+from detection_jobs import format_sse
+from v11 import load_image
+
+logger = logging.getLogger(__name__)
+
+
+def frame_signature(image, width=64):
+    """Small grayscale copy of a BGR frame, `width` pixels wide, used to compare frames cheaply"""
+    height, image_width = image.shape[:2]
+    size = (width, max(1, round(height * width / image_width)))
+    small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+
+def frame_difference(signature, other):
+    """Mean absolute difference of two frame signatures in [0, 1]; 1 when either is missing or the sizes differ"""
+    if signature is None or other is None or signature.shape != other.shape:
+        return 1.0
+    return float(cv2.absdiff(signature, other).mean()) / 255
+
+
+class CameraSession:
+    """
+    Continuous detection of camera frames with a single pending-frame slot
+
+    `offer` puts a frame in the slot, replacing (and counting as dropped) a
+    frame the detection thread has not picked up yet, so a slow model never
+    works through a backlog of stale frames. Before detecting, a frame is
+    compared with the last frame that was actually detected on a small
+    grayscale thumbnail; when the mean difference is below
+    `change_threshold` the previous result is published again instead.
+    Only the latest result is kept: subscribers that fall behind skip
+    straight to it.
+    """
+
+    def __init__(self, detect_frame, params, change_threshold=0.02, gate_width=64, fps_window=5):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.change_threshold = change_threshold
+        self.gate_width = gate_width
+        self.fps_window = fps_window
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+        self.detected = 0
+        self.reused = 0
+        self.failed = 0
+        self._detect_frame = detect_frame
+        self._frame = None  # (frame_id, image_bytes, received_at)
+        self._frame_id = 0
+        self._event = None
+        self._event_id = 0
+        self._published = deque()  # 时间窗口内发布结果的时间
+        self._detected_at = deque()  # 时间窗口内实际检测完成的时间
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f'camera-{self.id[:8]}', daemon=True)
+        self._thread.start()
+
+    def offer(self, image_bytes):
+        """Hand over the newest frame and return its id, or None when the session is closed"""
+        with self._condition:
+            if self.closed:
+                return None
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame_id += 1
+            self.received += 1
+            self.last_active = time.time()
+            self._frame = (self._frame_id, image_bytes, self.last_active)
+            self._condition.notify_all()
+            return self._frame_id
+
+    def wait_event(self, after_id, timeout):
+        """The latest event if its id is above `after_id`, waiting up to `timeout` seconds for one"""
+        with self._condition:
+            if (self._event is None or self._event['id'] <= after_id) and not self.closed:
+                self._condition.wait(timeout)
+            event = self._event if self._event is not None and self._event['id'] > after_id else None
+            return event, self.closed
+
+    def close(self):
+        with self._condition:
+            if self.closed:
+                return
+            self._publish('closed', self._stats())
+            self.closed = True
+            self._frame = None
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return self._stats()
+
+    def _stats(self):
+        now = time.time()
+        # 会话开始不足一个窗口时按实际经过的时间计算
+        span = max(min(self.fps_window, now - self.created_at), 1e-3)
+        for times in (self._published, self._detected_at):
+            while times and times[0] < now - self.fps_window:
+                times.popleft()
+        return {
+            'session_id': self.id,
+            'received': self.received,
+            'dropped': self.dropped,
+            'detected': self.detected,
+            'reused': self.reused,
+            'failed': self.failed,
+            'fps': round(len(self._published) / span, 2),
+            'detect_fps': round(len(self._detected_at) / span, 2),
+            'change_threshold': self.change_threshold,
+            'params': self.params
+        }
+
+    def _publish(self, event, data):
+        # 调用方持有self._condition
+        self._event_id += 1
+        self._event = {'id': self._event_id, 'event': event, 'data': data}
+        self._condition.notify_all()
+
+    def _run(self):
+        signature = None
+        response = None
+        while True:
+            with self._condition:
+                while self._frame is None and not self.closed:
+                    self._condition.wait()
+                if self.closed:
+                    return
+                frame_id, image_bytes, received_at = self._frame
+                self._frame = None
+
+            try:
+                image = load_image(image_bytes)
+                current = frame_signature(image, self.gate_width)
+                difference = frame_difference(signature, current)
+                reused = response is not None and difference < self.change_threshold
+                if not reused:
+                    response = self._detect_frame(image_bytes, image, self.params)
+                    # 只和上次实际检测的帧比较，缓慢的变化累积到阈值后也会重新检测
+                    signature = current
+                error = None
+            except Exception as e:
+                logger.error(f"Camera session {self.id} failed on frame {frame_id}: {str(e)}", exc_info=True)
+                error = str(e)
+
+            with self._condition:
+                if self.closed:
+                    return
+                now = time.time()
+                if error is not None:
+                    self.failed += 1
+                    self._publish('frame_error', {'frame_id': frame_id, 'error': error, 'stats': self._stats()})
+                    continue
+                if reused:
+                    self.reused += 1
+                else:
+                    self.detected += 1
+                    self._detected_at.append(now)
+                self._published.append(now)
+                self._publish('result', {
+                    'frame_id': frame_id,
+                    'reused': reused,
+                    'difference': round(difference, 4),
+                    'latency_ms': round((now - received_at) * 1000, 2),
+                    'result': response,
+                    'stats': self._stats()
+                })
+
+
+class CameraStreamManager:
+    """
+    Camera inspection sessions, each with its own detection thread
+
+    `detect_frame(image_bytes, image, params)` detects one frame, given both
+    the encoded bytes and the decoded BGR array, and returns its /api/detect
+    result dict. At most `max_sessions` sessions run at once; a session that
+    has not received a frame for `session_timeout` seconds is closed the next
+    time the manager is used.
+    """
+
+    def __init__(self, detect_frame, max_sessions=4, session_timeout=60, change_threshold=0.02, gate_width=64,
+                 fps_window=5):
+        self._detect_frame = detect_frame
+        self.max_sessions = max_sessions
+        self.session_timeout = session_timeout
+        self.change_threshold = change_threshold
+        self.gate_width = gate_width
+        self.fps_window = fps_window
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, params, change_threshold=None):
+        """Start a session, or return None when `max_sessions` are already running"""
+        self._close_idle()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            session = CameraSession(self._detect_frame, params,
+                                    self.change_threshold if change_threshold is None else change_threshold,
+                                    self.gate_width, self.fps_window)
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        self._close_idle()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def close_all(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+    def stream(self, session, last_event_id=0, heartbeat=15):
+        """Yield the session's results as Server-Sent Events until it is closed"""
+        position = last_event_id
+        while True:
+            event, closed = session.wait_event(position, heartbeat)
+            if event is None:
+                if closed:
+                    return
+                # 心跳注释行，防止代理断开空闲连接
+                yield ': keep-alive\n\n'
+                continue
+            yield format_sse(event)
+            position = event['id']
+
+    def _close_idle(self):
+        cutoff = time.time() - self.session_timeout
+        with self._lock:
+            idle = [session_id for session_id, session in self._sessions.items() if session.last_active < cutoff]
+            sessions = [self._sessions.pop(session_id) for session_id in idle]
+        for session in sessions:
+            logger.info(f"Closing idle camera session {session.id}")
+            session.close()
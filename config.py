@@ -9,4 +9,95 @@ class Config:
     
     # JWT配置
     JWT_SECRET_KEY = 'your-secret-key'  # 请修改为随机的安全密钥
-    JWT_ACCESS_TOKEN_EXPIRES = 24 * 3600  # token有效期24小时 
\ No newline at end of file
+    JWT_ACCESS_TOKEN_EXPIRES = 24 * 3600  # token有效期24小时 
+    # 检测模型配置
+    MODEL_PATH = 'best.pt'
+    MODEL_IMGSZ = 1280  # 推理使用的图像尺寸
+    MODEL_DEVICE = None  # None表示自动选择GPU或CPU
+    MODEL_BACKEND = 'torch'  # torch、onnx、openvino或onnx-int8；onnx/openvino在CPU上更快，首次使用时按MODEL_IMGSZ导出
+    MODEL_EXPORT_DIR = None  # 导出模型的缓存目录，None表示权重文件旁的exports目录
+    QUANT_CALIBRATION_DIR = 'uploads'  # onnx-int8量化校准使用的图片目录，启用前先用quantization_report评估精度
+    MODEL_TENSOR_VIEWS = False  # 每张图只letterbox一次，旋转视角由torch.rot90在设备上生成；多视角推理时预处理约减为1/4
+    MODEL_CACHE_SIZE = 2  # 常驻内存的模型变体数量上限
+    PRELOAD_MODEL = True  # 启动时加载并预热模型
+
+    # 上传图片存档配置
+    UPLOAD_FOLDER = 'uploads'  # 按内容哈希分两级子目录存放（uploads/ab/cd/abcd...jpg），index.db记录元数据
+    ARCHIVE_UPLOADS = True  # 对延迟敏感的产线可关闭，上传图片将不落盘
+    ARCHIVE_QUEUE_SIZE = 256  # 后台写盘队列长度，队列满时跳过存档而不阻塞检测
+    ARCHIVE_MAX_AGE_DAYS = None  # 超过该天数未再出现的图片被删除，None表示不按时间清理（uploads也是INT8校准集）
+    ARCHIVE_MAX_BYTES = 20 * 1024 ** 3  # 存档总大小上限，超出时删除最久未出现的图片；None表示不限
+    ARCHIVE_RETENTION_INTERVAL = 3600  # 清理任务的执行间隔（秒）
+
+    # 批量检测配置
+    DETECT_BATCH_SIZE = 4  # 每次送入模型的图片数（每张图片包含其所有旋转视角）
+
+    # 推理调度配置：合并并发请求为一次批量推理
+    SCHEDULER_ENABLED = True
+    SCHEDULER_MAX_WAIT_MS = 10  # 收集同批请求的最长等待时间
+    SCHEDULER_MAX_BATCH_SIZE = 8  # 每批最多合并的图片数
+
+    # 多进程CPU推理配置：每个工作进程常驻一个模型，按线程数划分CPU核心，启用后代替推理调度器
+    WORKER_POOL_ENABLED = False
+    WORKER_PROCESSES = None  # 工作进程数，None表示CPU核数/每进程线程数
+    WORKER_THREADS = None  # 每个进程的torch线程数，None表示平均分配CPU核心
+
+    # 级联投票：先推理除最后一个外的视角，都没有检出框时跳过最后一个视角（请求参数cascade可覆盖）
+    # 只在class_aware、投票阈值>=2且未启用tensor_views时跳过，此时由NMS保证结果与全部视角投票一致，见benchmarks/parity_cascade.py
+    # 实测（CPU，imgsz=320，4个视角）：无缺陷板198ms->150ms；每个视角10个框时210ms->206ms，2个视角时94ms->107ms（多一次模型调用）
+    CASCADE_VOTING = False
+
+    # 检测结果缓存配置
+    RESULT_CACHE_ENABLED = True
+    RESULT_CACHE_SIZE = 256  # 内存中缓存的结果数
+    RESULT_CACHE_DIR = None  # 磁盘缓存目录，如'cache/results'；None表示只用内存缓存
+
+    # 大尺寸面板分块检测配置（请求参数tile_size>0时启用）
+    TILE_OVERLAP = 0.2  # 相邻分块的重叠比例
+    TILE_BATCH_SIZE = 4  # 每次送入模型的分块数
+
+    # 异步检测任务配置
+    JOB_WORKERS = 2  # 同时执行的任务数
+    JOB_RETENTION_SECONDS = 3600  # 已完成任务结果的保留时间
+
+    # 金板参考模式（请求参数sku）：按产品型号登记无缺陷的参考图，只在与参考图不同的区域上检测
+    REFERENCE_FOLDER = 'references'  # 参考图保存目录（<sku>.<扩展名>）
+    REFERENCE_CACHE_SIZE = 32  # 内存中保留参考图及其ORB特征的型号数
+    REFERENCE_ALIGN_SIZE = 1024  # 提取ORB特征时图像长边缩小到的尺寸
+    REFERENCE_MAX_FEATURES = 4000  # 每张图最多提取的ORB特征点数
+    REFERENCE_MIN_MATCHES = 20  # RANSAC内点少于该值时视为对齐失败，退回整图检测
+    REFERENCE_DIFF_THRESHOLD = 40  # 对齐后灰度差超过该值（0-255）的像素视为差异
+    REFERENCE_MIN_AREA = 64  # 忽略面积小于该值（像素）的差异区域
+    REFERENCE_ROI_PADDING = 32  # 差异区域四周外扩的像素数
+    REFERENCE_MIN_ROI_SIZE = None  # 检测区域的最小边长，None表示MODEL_IMGSZ（区域按原分辨率检测，不被放大）
+    REFERENCE_MAX_ROI_FRACTION = 0.6  # 检测区域超过图像面积的该比例时退回整图检测
+
+    # 摄像头实时检测配置：每个会话只保留最新一帧，检测跟不上时丢弃旧帧
+    CAMERA_MAX_SESSIONS = 4  # 同时进行的实时检测会话数（每个会话一个检测线程）
+    CAMERA_SESSION_TIMEOUT = 60  # 超过该时间（秒）没有收到新帧的会话自动关闭
+    CAMERA_CHANGE_THRESHOLD = 0.02  # 与上次检测帧的平均灰度差（0-1）低于该值时复用上次结果，0表示每帧都检测（请求参数change_threshold可覆盖）
+    CAMERA_GATE_WIDTH = 64  # 比较帧差时缩小到的宽度（像素）
+    CAMERA_FPS_WINDOW = 5  # 统计实际帧率的时间窗口（秒）
+
+    # 用户数据库配置（SQLite，WAL模式）
+    USER_DB_PATH = 'users.db'
+    USER_DB_BUSY_TIMEOUT_MS = 5000  # 写锁被占用时的最长等待时间，超时才报database is locked
+    # 新注册用户是否保存密码哈希；默认scrypt每次登录约165ms CPU，开启前先评估登录高峰
+    # 已有用户的明文密码需显式转换：python user_store.py --hash-passwords
+    PASSWORD_HASHING = False
+    PASSWORD_HASH_METHOD = None  # werkzeug密码哈希方法，None表示默认（scrypt）
+    LAST_LOGIN_FLUSH_SECONDS = 60  # 最近登录时间在内存中汇总，按该间隔批量写入
+
+    # 检测历史配置（SQLite，按时间、用户、缺陷类型建索引）
+    HISTORY_ENABLED = True
+    HISTORY_DB_PATH = 'detections.db'
+    HISTORY_QUEUE_SIZE = 1024  # 后台写入队列长度，队列满时丢弃记录而不阻塞检测
+
+    # 系统状态采样配置
+    SYSTEM_MONITOR_INTERVAL = 2  # 后台采样间隔（秒）
+    SYSTEM_MONITOR_HISTORY = 900  # 保留的历史采样数，默认约30分钟
+
+    # 日志与调试追踪配置
+    LOG_LEVEL = 'INFO'  # DEBUG级别会输出第三方库的大量日志，仅排查问题时使用
+    DEBUG_TRACE_ALL = False  # 追踪每个检测请求；否则仅追踪带trace=true参数的请求
+    DEBUG_TRACE_SIZE = 256  # 内存中保留的最近追踪数
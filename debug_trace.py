@@ -0,0 +1,95 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+
+class Trace:
+    """Diagnostic events of one request, capped at `max_events` events of at most `max_boxes` boxes each"""
+
+    enabled = True
+
+    def __init__(self, trace_id, max_events=200, max_boxes=500):
+        self.id = trace_id
+        self.created_at = time.time()
+        self.max_events = max_events
+        self.max_boxes = max_boxes
+        self.events = []
+        self.dropped_events = 0
+        self._lock = threading.Lock()
+
+    def record(self, event, **data):
+        """Append an event; ndarray box sets are stored as rounded [x1, y1, x2, y2, conf, cls] lists"""
+        for key, value in data.items():
+            if isinstance(value, np.ndarray):
+                data[key] = self._boxes(value)
+        with self._lock:
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                return
+            self.events.append({'event': event, 'time': round(time.time() - self.created_at, 6), **data})
+
+    def _boxes(self, boxes):
+        rows = np.round(np.asarray(boxes, dtype=np.float64)[:self.max_boxes], 3).tolist()
+        if len(boxes) > self.max_boxes:
+            rows.append({'truncated': len(boxes) - self.max_boxes})
+        return rows
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'trace_id': self.id,
+                'created_at': self.created_at,
+                'events': list(self.events),
+                'dropped_events': self.dropped_events
+            }
+
+
+class _NullTrace:
+    """Trace that records nothing; callers check `enabled` before building event data"""
+
+    enabled = False
+    id = None
+
+    def record(self, event, **data):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class TraceStore:
+    """
+    Bounded ring buffer of request traces, keyed by request id
+
+    Only the most recent `max_traces` traces are kept; starting a new one drops
+    the oldest. Requests that are not traced get NULL_TRACE and cost nothing
+    beyond an `enabled` check at each trace point.
+    """
+
+    def __init__(self, max_traces=256, max_events=200, max_boxes=500):
+        self.max_traces = max_traces
+        self.max_events = max_events
+        self.max_boxes = max_boxes
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, trace_id=None):
+        trace = Trace(trace_id or uuid.uuid4().hex, self.max_events, self.max_boxes)
+        with self._lock:
+            self._traces[trace.id] = trace
+            self._traces.move_to_end(trace.id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        return trace
+
+    def get(self, trace_id):
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit=50):
+        """Ids of the most recent traces, newest first"""
+        with self._lock:
+            return list(reversed(self._traces.keys()))[:limit]
@@ -0,0 +1,160 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionJob:
+    """One or more images detected in the background, with a progress event log"""
+
+    def __init__(self, images, params):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.total = len(images)
+        self.completed = 0
+        self.results = [None] * len(images)
+        self.filenames = [filename for filename, _ in images]
+        self.error = None
+        self.statistics = None
+        self.events = []
+        self._images = images
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self, include_results=True):
+        with self._condition:
+            data = {
+                'job_id': self.id,
+                'status': self.status,
+                'total': self.total,
+                'completed': self.completed,
+                'progress': round(self.completed / self.total * 100, 2) if self.total else 100,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+                'error': self.error,
+                'statistics': self.statistics
+            }
+            if include_results:
+                data['results'] = [r for r in self.results if r is not None]
+            return data
+
+    def wait_events(self, start, timeout):
+        """Events from index `start` on, waiting up to `timeout` seconds for new ones"""
+        with self._condition:
+            if len(self.events) <= start and not self.finished:
+                self._condition.wait(timeout)
+            return self.events[start:], self.finished
+
+    def _emit(self, event, data):
+        with self._condition:
+            self.events.append({'id': len(self.events) + 1, 'event': event, 'data': data})
+            self._condition.notify_all()
+
+    def _finish(self, status, error=None, statistics=None):
+        # 状态与最终事件在同一把锁内更新，订阅方不会错过最后一条事件
+        with self._condition:
+            self.status = status
+            self.error = error
+            self.statistics = statistics
+            self.finished_at = time.time()
+            self._emit(status, self.to_dict(include_results=False))
+
+
+class JobManager:
+    """
+    Runs detection jobs on a bounded thread pool
+
+    `detect_image(image, filename, params)` does the work for one image
+    and returns its result dict; `summarize(results)` builds the job-wide
+    statistics once all images are done. Finished jobs are kept for
+    `retention_seconds` and then dropped the next time the manager is used.
+    """
+
+    def __init__(self, detect_image, summarize=None, max_workers=2, retention_seconds=3600):
+        self._detect_image = detect_image
+        self._summarize = summarize
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detect-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, images, params):
+        """Queue a job for a list of (filename, image) pairs and return it"""
+        self._purge_expired()
+        job = DetectionJob(images, params)
+        with self._lock:
+            self._jobs[job.id] = job
+        job._emit('queued', {'job_id': job.id, 'total': job.total})
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        self._purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stream(self, job, last_event_id=0, heartbeat=15):
+        """Yield Server-Sent Events for the job until it finishes"""
+        position = last_event_id
+        while True:
+            events, finished = job.wait_events(position, heartbeat)
+            if not events and not finished:
+                # 心跳注释行，防止代理断开空闲连接
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                yield format_sse(event)
+            position += len(events)
+            if finished and position >= len(job.events):
+                return
+
+    def _run(self, job):
+        with job._condition:
+            job.status = 'running'
+        job._emit('started', {'job_id': job.id})
+        try:
+            for i, (filename, image) in enumerate(job._images):
+                try:
+                    result = self._detect_image(image, filename, job.params)
+                except Exception as e:
+                    logger.error(f"Job {job.id} failed on {filename}: {str(e)}", exc_info=True)
+                    result = {'status': 'error', 'error': str(e), 'filename': filename}
+                with job._condition:
+                    job.results[i] = result
+                    job.completed += 1
+                    job._images[i] = (filename, None)  # 处理完即释放图片数据
+                job._emit('progress', {
+                    'job_id': job.id,
+                    'index': i,
+                    'completed': job.completed,
+                    'total': job.total,
+                    'result': result
+                })
+            statistics = self._summarize(job.results) if self._summarize is not None else None
+            job._finish('done', statistics=statistics)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+            job._finish('failed', error=str(e))
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+def format_sse(event):
+    """Encode one event dict as a Server-Sent Events message"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
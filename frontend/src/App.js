@@ -17,6 +17,9 @@ const API_BASE_URL = `${window.location.protocol}//${window.location.host}`;
 axios.defaults.baseURL = API_BASE_URL;
 axios.defaults.withCredentials = true; // 允许跨域请求携带凭证
 
+// 实时检测的采帧间隔（毫秒）；检测跟不上时后端只保留最新一帧
+const CAMERA_FRAME_INTERVAL = 200;
+
 // 添加一个函数来更新API基础URL
 
 
@@ -74,6 +77,11 @@ function App() {
       const videoRef = useRef(null);
       const [isCapturing, setIsCapturing] = useState(false);
       const [captureInterval, setCaptureInterval] = useState(null);
+      // 实时检测会话：帧上传到frames_url，检测结果通过events_url（SSE）推送
+      const cameraSessionRef = useRef(null);
+      const cameraEventsRef = useRef(null);
+      const frameUploadingRef = useRef(false);
+      const [cameraFps, setCameraFps] = useState(0);
 
       const [currentRunTime, setCurrentRunTime] = useState('0秒');
       const [runTimeInterval, setRunTimeInterval] = useState(null);
@@ -161,6 +169,9 @@ function App() {
                   if (captureInterval) {
                         clearInterval(captureInterval);
                   }
+                  if (cameraEventsRef.current) {
+                        cameraEventsRef.current.close();
+                  }
             };
       }, []);
 
@@ -195,6 +206,7 @@ function App() {
                                     clearInterval(captureInterval);
                                     setCaptureInterval(null);
                               }
+                              stopCameraSession();
                         }
 
                         // 重置检测进度
@@ -391,7 +403,59 @@ function App() {
                   }, 'image/jpeg', 0.95); // 高质量JPEG
             });
       };
-      // 开始或暂停实时检测
+      // 创建实时检测会话并订阅检测结果
+      const startCameraSession = async () => {
+            const response = await axios.post('/api/camera/sessions', null, { params: getDetectParams() });
+            const session = response.data;
+            cameraSessionRef.current = session;
+
+            const events = new EventSource(`${API_BASE_URL}${session.events_url}`);
+            events.addEventListener('result', (event) => {
+                  const data = JSON.parse(event.data);
+                  setCameraFps(data.stats.fps);
+                  // 画面变化小于阈值时后端复用上次结果，界面无需刷新
+                  if (data.reused) {
+                        return;
+                  }
+                  setProcessedResults([]);
+                  setDetectionResults(data.result);
+                  setDetectionProgress(100);
+            });
+            events.addEventListener('frame_error', (event) => {
+                  console.error('实时检测错误:', JSON.parse(event.data).error);
+            });
+            cameraEventsRef.current = events;
+            return session;
+      };
+
+      // 关闭实时检测会话及其结果推送
+      const stopCameraSession = () => {
+            if (cameraEventsRef.current) {
+                  cameraEventsRef.current.close();
+                  cameraEventsRef.current = null;
+            }
+            const session = cameraSessionRef.current;
+            cameraSessionRef.current = null;
+            frameUploadingRef.current = false;
+            setCameraFps(0);
+            if (session) {
+                  axios.delete(`/api/camera/sessions/${session.session_id}`).catch(err => {
+                        console.warn('关闭实时检测会话失败:', err);
+                  });
+            }
+      };
+
+      // 上传一帧到实时检测会话，后端放入待检测槽位后立即返回，不等待检测结果
+      const pushCameraFrame = async (file) => {
+            const session = cameraSessionRef.current;
+            if (!session) {
+                  return;
+            }
+            const formData = new FormData();
+            formData.append('image', file);
+            await axios.post(session.frames_url, formData);
+      };
+
       // 开始或暂停实时检测
       const toggleContinuousCapture = async () => {
             // Reset runtime variables at the start of continuous capture
@@ -405,6 +469,7 @@ function App() {
                         clearInterval(captureInterval);
                         setCaptureInterval(null);
                   }
+                  stopCameraSession();
 
                   // 停止运行时长计时
                   if (runTimeInterval) {
@@ -464,6 +529,15 @@ function App() {
                   return;
             }
 
+            // 创建实时检测会话
+            try {
+                  await startCameraSession();
+            } catch (err) {
+                  console.error('无法创建实时检测会话:', err);
+                  message.error('无法开始实时检测: ' + (err.response?.data?.error || err.message));
+                  return;
+            }
+
             // 设置开始时间
             const start = Date.now();
             setStartTime(start);
@@ -503,6 +577,7 @@ function App() {
 
                               setIsCapturing(false);
                               setCaptureInterval(null);
+                              stopCameraSession();
                               message.warning('摄像头已断开，实时检测停止');
                               return;
                         }
@@ -525,44 +600,33 @@ function App() {
 
                                     setIsCapturing(false);
                                     setCaptureInterval(null);
+                                    stopCameraSession();
                                     return;
                               }
                         }
 
-                        // 捕获视频帧
-                        const capturedFrame = await captureVideoFrame();
-                        if (capturedFrame) {
-                              console.log('成功捕获视频帧', new Date().toLocaleTimeString());
-                              setDetectionProgress(20);
-
-                              // 处理捕获的帧并检测缺陷
-                              const result = await processImage(capturedFrame);
-                              console.log('检测结果:', result.defects.length > 0 ? `发现${result.defects.length}个缺陷` : '未发现缺陷');
-
-                              // 确保在摄像头活动且视频元素存在时更新结果
-                              if (isCameraActive && videoRef.current) {
-                                    // 确认视频仍在播放
-                                    if (videoRef.current.paused) {
-                                          console.log('检测期间视频暂停，尝试恢复');
-                                          videoRef.current.play().catch(e => console.error('无法恢复视频:', e));
-                                    }
-
-                                    // 更新检测结果之前先清除之前的结果
-                                    setProcessedResults([]);
+                        // 上一帧还在捕获或上传时跳过本帧
+                        if (frameUploadingRef.current) {
+                              return;
+                        }
 
-                                    // 更新检测结果
-                                    setDetectionResults(result);
+                        // 捕获视频帧并上传，检测结果由startCameraSession订阅的事件流更新
+                        frameUploadingRef.current = true;
+                        try {
+                              const capturedFrame = await captureVideoFrame();
+                              if (capturedFrame) {
+                                    await pushCameraFrame(capturedFrame);
+                              } else {
+                                    console.warn('未能捕获视频帧');
                               }
-
-                              setDetectionProgress(100);
-                        } else {
-                              console.warn('未能捕获视频帧');
+                        } finally {
+                              frameUploadingRef.current = false;
                         }
                   } catch (error) {
                         console.error('实时检测错误:', error);
                         message.error('实时检测出错: ' + error.message);
                   }
-            }, 2000); // 每2秒捕获一次
+            }, CAMERA_FRAME_INTERVAL);
 
             setCaptureInterval(interval);
       };
@@ -611,6 +675,7 @@ function App() {
                   clearInterval(captureInterval);
                   setCaptureInterval(null);
             }
+            stopCameraSession();
 
             // 重置其他状态
             setImageList([]);
@@ -1045,27 +1110,30 @@ function App() {
       const [confThreshold, setConfThreshold] = useState(0.4); // 默认值为 0.4
 
       // 修改单个图片检测逻辑，传递 iou_threshold 和 conf_threshold 参数
+      // 当前模型设置对应的检测参数
+      const getDetectParams = () => {
+            const params = {
+                  vote_threshold: selectedModel === 'yolov11-vote2' ? 1 : selectedModel === 'yolov11-vote4' ? 2 : 1,
+                  orientation_count: selectedModel === 'yolov11-vote2' ? 2 : selectedModel === 'yolov11-vote4' ? 4 : 1,
+                  iou_threshold: iouThreshold,
+                  conf_threshold: confThreshold,
+            };
+
+            // 如果有图像尺寸信息，也传递给后端
+            if (imageDimensions) {
+                  params.img_width = imageDimensions.width;
+                  params.img_height = imageDimensions.height;
+            }
+            return params;
+      };
+
       const processImage = async (file) => {
             try {
                   const formData = new FormData();
                   formData.append('image', file);
 
-                  // 添加图像尺寸信息到请求参数中
-                  const params = {
-                        vote_threshold: selectedModel === 'yolov11-vote2' ? 1 : selectedModel === 'yolov11-vote4' ? 2 : 1,
-                        orientation_count: selectedModel === 'yolov11-vote2' ? 2 : selectedModel === 'yolov11-vote4' ? 4 : 1,
-                        iou_threshold: iouThreshold,
-                        conf_threshold: confThreshold,
-                  };
-
-                  // 如果有图像尺寸信息，也传递给后端
-                  if (imageDimensions) {
-                        params.img_width = imageDimensions.width;
-                        params.img_height = imageDimensions.height;
-                  }
-
                   const detectResponse = await axios.post('/api/detect', formData, {
-                        params: params,
+                        params: getDetectParams(),
                   });
 
                   return detectResponse.data;
@@ -2046,6 +2114,17 @@ function App() {
                                                                   {isBatchProcessing || isCapturing ? currentRunTime : (endTime && startTime ? calculateUptime() : '0秒')}
                                                             </span>
                                                       </div>
+                                                      {isCapturing && (
+                                                            <div style={{
+                                                                  display: 'flex',
+                                                                  justifyContent: 'center',
+                                                                  marginTop: '5px',
+                                                                  fontSize: '12px',
+                                                                  color: '#faad14'
+                                                            }}>
+                                                                  实际帧率 {cameraFps} fps
+                                                            </div>
+                                                      )}
                                                 </div>
                                           </div>
                                     </div>
@@ -5,7 +5,7 @@ const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api';
 // 获取系统状态信息
 export const fetchSystemStatus = async () => {
       try {
-            const response = await axios.get(`${API_URL}/system/status`);
+            const response = await axios.get(`${API_URL}/system-status`);
             return response.data;
       } catch (error) {
             console.error('获取系统状态失败:', error);
@@ -13,4 +13,17 @@ export const fetchSystemStatus = async () => {
       }
 };
 
+// 获取系统状态历史采样（CPU、内存、推理队列深度、检测延迟）
+export const fetchSystemStatusHistory = async (seconds) => {
+      try {
+            const response = await axios.get(`${API_URL}/system-status/history`, {
+                  params: seconds ? { seconds } : {}
+            });
+            return response.data;
+      } catch (error) {
+            console.error('获取系统状态历史失败:', error);
+            throw error;
+      }
+};
+
 // 其他API函数可以添加在这里 
\ No newline at end of file
@@ -1,20 +1,34 @@
 import React, { useState, useEffect } from 'react';
 import { Card, Progress, Statistic } from 'antd';
-import { fetchSystemStatus } from '../api';
+import ReactECharts from 'echarts-for-react';
+import { fetchSystemStatus, fetchSystemStatusHistory } from '../api';
 import './SystemStatus.css';
 
+// 图表显示的时间范围（秒）
+const HISTORY_SECONDS = 600;
+
 const SystemStatus = () => {
       const [status, setStatus] = useState({
             cpu: 0,
             memory: 0,
-            uptime: 0
+            uptime: '0h 0m'
       });
+      const [history, setHistory] = useState([]);
 
       useEffect(() => {
             const getSystemStatus = async () => {
                   try {
-                        const data = await fetchSystemStatus();
-                        setStatus(data);
+                        // 后端由后台线程采样，两个接口都立即返回
+                        const [data, historyData] = await Promise.all([
+                              fetchSystemStatus(),
+                              fetchSystemStatusHistory(HISTORY_SECONDS)
+                        ]);
+                        setStatus({
+                              cpu: data.cpu_usage,
+                              memory: data.memory_usage,
+                              uptime: data.uptime
+                        });
+                        setHistory(historyData.samples || []);
                   } catch (error) {
                         console.error('Failed to fetch system status:', error);
                   }
@@ -26,14 +40,41 @@ const SystemStatus = () => {
             return () => clearInterval(interval);
       }, []);
 
-      // 将秒数转换为可读的时间格式
-      const formatUptime = (seconds) => {
-            const days = Math.floor(seconds / (3600 * 24));
-            const hours = Math.floor((seconds % (3600 * 24)) / 3600);
-            const minutes = Math.floor((seconds % 3600) / 60);
-            const remainingSeconds = Math.floor(seconds % 60);
-
-            return `${days}天 ${hours}小时 ${minutes}分钟 ${remainingSeconds}秒`;
+      const getHistoryOption = () => {
+            const times = history.map(s => new Date(s.time * 1000).toLocaleTimeString());
+            return {
+                  tooltip: { trigger: 'axis' },
+                  legend: {
+                        bottom: 0,
+                        data: ['CPU', '内存', '队列深度', '检测延迟P95']
+                  },
+                  grid: { left: 45, right: 55, top: 30, bottom: 50 },
+                  xAxis: { type: 'category', boundaryGap: false, data: times },
+                  yAxis: [
+                        { type: 'value', name: '%', min: 0, max: 100 },
+                        { type: 'value', name: '张 / ms', min: 0, splitLine: { show: false } }
+                  ],
+                  series: [
+                        { name: 'CPU', type: 'line', showSymbol: false, data: history.map(s => s.cpu_usage) },
+                        { name: '内存', type: 'line', showSymbol: false, data: history.map(s => s.memory_usage) },
+                        {
+                              name: '队列深度',
+                              type: 'line',
+                              step: 'end',
+                              showSymbol: false,
+                              yAxisIndex: 1,
+                              data: history.map(s => s.queue_depth)
+                        },
+                        {
+                              name: '检测延迟P95',
+                              type: 'line',
+                              showSymbol: false,
+                              connectNulls: false,
+                              yAxisIndex: 1,
+                              data: history.map(s => s.latency_p95_ms)
+                        }
+                  ]
+            };
       };
 
       return (
@@ -41,7 +82,7 @@ const SystemStatus = () => {
                   <Card title="系统状态" className="system-status-card">
                         <div className="status-content">
                               <div className="status-item">
-                                    <Statistic title="运行时间" value={formatUptime(status.uptime)} />
+                                    <Statistic title="运行时间" value={status.uptime} />
                               </div>
                               <div className="status-item">
                                     <div className="status-label">CPU 使用率</div>
@@ -73,10 +114,14 @@ const SystemStatus = () => {
                                           className="status-progress"
                                     />
                               </div>
+                              <div className="status-item">
+                                    <div className="status-label">最近{HISTORY_SECONDS / 60}分钟</div>
+                                    <ReactECharts option={getHistoryOption()} className="status-history-chart" />
+                              </div>
                         </div>
                   </Card>
             </div>
       );
 };
 
-export default SystemStatus; 
\ No newline at end of file
+export default SystemStatus;
@@ -0,0 +1,232 @@
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from upload_store import IMAGE_EXTENSIONS, content_hash
+from v11 import load_image
+
+logger = logging.getLogger(__name__)
+
+SKU_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+
+def orb_features(image, align_size=1024, max_features=4000):
+    """
+    ORB keypoints of a BGR image, computed on a copy whose longer side is at most `align_size`
+
+    Returns (points, descriptors): keypoint positions as an (N,2) float32
+    array in full-resolution coordinates, and the (N,32) uint8 descriptors
+    (None when no keypoint was found).
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = min(1.0, align_size / max(gray.shape[:2]))
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    keypoints, descriptors = cv2.ORB_create(nfeatures=max_features).detectAndCompute(gray, None)
+    points = np.float32([keypoint.pt for keypoint in keypoints]).reshape(-1, 2) / scale
+    return points, descriptors
+
+
+def merge_windows(windows):
+    """Merge overlapping (x1, y1, x2, y2) windows into their bounding windows until none overlap"""
+    windows = [list(window) for window in windows]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(windows)):
+            for j in range(i + 1, len(windows)):
+                a, b = windows[i], windows[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    windows[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del windows[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(window) for window in sorted(windows, key=lambda w: (w[1], w[0]))]
+
+
+def expand_window(x1, y1, x2, y2, padding, min_size, width, height):
+    """Pad a window, grow it to at least min_size per side around its centre and keep it inside the image"""
+    x1, y1, x2, y2 = x1 - padding, y1 - padding, x2 + padding, y2 + padding
+    for low, high, limit in ((0, 2, width), (1, 3, height)):
+        window = [x1, y1, x2, y2]
+        size = min(max(window[high] - window[low], min_size), limit)
+        centre = (window[low] + window[high]) / 2
+        start = int(min(max(centre - size / 2, 0), limit - size))
+        if low == 0:
+            x1, x2 = start, start + size
+        else:
+            y1, y2 = start, start + size
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+class GoldenBoard:
+    """A registered known-good image of one SKU with its ORB features, computed once"""
+
+    def __init__(self, sku, image, digest, align_size=1024, max_features=4000):
+        self.sku = sku
+        self.image = image
+        self.digest = digest
+        self.gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.points, self.descriptors = orb_features(image, align_size, max_features)
+
+    def to_dict(self):
+        return {
+            'sku': self.sku,
+            'digest': self.digest,
+            'width': self.image.shape[1],
+            'height': self.image.shape[0],
+            'features': len(self.points)
+        }
+
+
+class ReferenceStore:
+    """
+    Golden images per SKU, and the regions where a board differs from its golden image
+
+    Golden images are kept as files under `folder` (`<sku><ext>`); the
+    decoded image and its ORB features of the last `cache_size` SKUs used are
+    kept in memory, so aligning a board only computes the board's own
+    features. `regions` aligns a board to the golden image with a RANSAC
+    homography over matched ORB features, warps the golden image onto the
+    board, and returns windows around the pixels whose blurred grayscale
+    difference exceeds `diff_threshold`. Each window is padded, grown to at
+    least `min_roi_size` per side so the detector sees it at full resolution
+    instead of upscaled, and overlapping windows are merged.
+    """
+
+    def __init__(self, folder='references', cache_size=32, align_size=1024, max_features=4000, min_matches=20,
+                 diff_threshold=40, min_area=64, roi_padding=32, min_roi_size=640, max_roi_fraction=0.6):
+        self.folder = folder
+        self.cache_size = cache_size
+        self.align_size = align_size
+        self.max_features = max_features
+        self.min_matches = min_matches
+        self.diff_threshold = diff_threshold
+        self.min_area = min_area
+        self.roi_padding = roi_padding
+        self.min_roi_size = min_roi_size
+        self.max_roi_fraction = max_roi_fraction
+        self._boards = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def register(self, sku, image_bytes, ext='.jpg'):
+        """Store `image_bytes` as the golden image of `sku`, replacing any earlier one"""
+        if not SKU_PATTERN.match(sku or ''):
+            raise ValueError("sku must be 1-64 letters, digits, '_', '.' or '-'")
+        board = GoldenBoard(sku, load_image(image_bytes), content_hash(image_bytes), self.align_size,
+                            self.max_features)
+        if len(board.points) < self.min_matches:
+            raise ValueError(f"golden image has only {len(board.points)} features, at least {self.min_matches} needed")
+        with self._lock:
+            for path in self._files(sku):
+                os.remove(path)
+            with open(os.path.join(self.folder, sku + ext), 'wb') as f:
+                f.write(image_bytes)
+            self._cache(board)
+        return board
+
+    def get(self, sku):
+        """The GoldenBoard of `sku`, loaded from disk on first use, or None when none is registered"""
+        with self._lock:
+            board = self._boards.get(sku)
+            if board is not None:
+                self._boards.move_to_end(sku)
+                return board
+            files = self._files(sku) if SKU_PATTERN.match(sku or '') else []
+            if not files:
+                return None
+            with open(files[0], 'rb') as f:
+                image_bytes = f.read()
+            board = GoldenBoard(sku, load_image(image_bytes), content_hash(image_bytes), self.align_size,
+                                self.max_features)
+            self._cache(board)
+            return board
+
+    def remove(self, sku):
+        """Delete the golden image of `sku`; returns False when none was registered"""
+        with self._lock:
+            self._boards.pop(sku, None)
+            files = self._files(sku) if SKU_PATTERN.match(sku or '') else []
+            for path in files:
+                os.remove(path)
+            return bool(files)
+
+    def skus(self):
+        return sorted({os.path.splitext(name)[0] for name in os.listdir(self.folder)
+                       if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS})
+
+    def regions(self, board, image):
+        """
+        Windows where `image` differs from the golden board
+
+        Returns a dict with 'aligned' and, when alignment succeeded, 'regions'
+        as (x1, y1, x2, y2) windows in image coordinates, 'coverage' (their
+        share of the image area) and 'inliers'. When the board cannot be
+        aligned, or the windows cover more than `max_roi_fraction` of the
+        image, 'aligned' or 'fallback' tells the caller to detect on the full
+        image instead, with the reason in 'reason'.
+        """
+        points, descriptors = orb_features(image, self.align_size, self.max_features)
+        if descriptors is None or board.descriptors is None or len(points) < self.min_matches:
+            return {'aligned': False, 'reason': 'too few features'}
+
+        # Lowe比值检验筛掉有歧义的匹配
+        pairs = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(board.descriptors, descriptors, k=2)
+        matches = [pair[0] for pair in pairs if len(pair) == 2 and pair[0].distance < 0.75 * pair[1].distance]
+        if len(matches) < self.min_matches:
+            return {'aligned': False, 'reason': 'too few matches', 'matches': len(matches)}
+        source = board.points[[m.queryIdx for m in matches]]
+        target = points[[m.trainIdx for m in matches]]
+        reprojection = 3.0 * max(image.shape[:2]) / min(self.align_size, max(image.shape[:2]))
+        homography, inlier_mask = cv2.findHomography(source, target, cv2.RANSAC, reprojection)
+        inliers = int(inlier_mask.sum()) if inlier_mask is not None else 0
+        # 内点太少或变换明显不是同一块板（缩放、翻转过大）时视为对齐失败
+        if homography is None or inliers < self.min_matches or not 0.25 < np.linalg.det(homography[:2, :2]) < 4:
+            return {'aligned': False, 'reason': 'no consistent homography', 'matches': len(matches),
+                    'inliers': inliers}
+
+        height, width = image.shape[:2]
+        warped = cv2.warpPerspective(board.gray, homography, (width, height))
+        valid = cv2.warpPerspective(np.full(board.gray.shape, 255, dtype=np.uint8), homography, (width, height))
+        # 去掉边缘几个像素，插值产生的边界不算差异
+        valid = cv2.erode(valid, np.ones((7, 7), dtype=np.uint8))
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0).astype(np.float32)
+        warped = cv2.GaussianBlur(warped, (5, 5), 0).astype(np.float32)
+        # 按有效区域的平均亮度做增益校正，整体光照变化不算差异
+        inside = valid > 0
+        gain = gray[inside].mean() / max(warped[inside].mean(), 1.0) if inside.any() else 1.0
+        diff = np.abs(gray - warped * gain)
+        mask = ((diff > self.diff_threshold) & inside).astype(np.uint8)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), dtype=np.uint8))
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        windows = [
+            expand_window(x, y, x + w, y + h, self.roi_padding, self.min_roi_size, width, height)
+            for x, y, w, h, area in stats[1:count].tolist() if area >= self.min_area
+        ]
+        windows = merge_windows(windows)
+        coverage = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in windows) / (width * height)
+        result = {'aligned': True, 'regions': windows, 'coverage': round(coverage, 4), 'inliers': inliers}
+        if coverage > self.max_roi_fraction:
+            result.update(fallback=True, reason='regions cover too much of the image')
+        return result
+
+    def _files(self, sku):
+        return [os.path.join(self.folder, sku + ext) for ext in sorted(IMAGE_EXTENSIONS)
+                if os.path.exists(os.path.join(self.folder, sku + ext))]
+
+    def _cache(self, board):
+        # 调用方持有self._lock
+        self._boards[board.sku] = board
+        self._boards.move_to_end(board.sku)
+        while len(self._boards) > self.cache_size:
+            self._boards.popitem(last=False)
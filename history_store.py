@@ -0,0 +1,256 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+from sqlite_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+def _create_history(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL NOT NULL,
+            day TEXT NOT NULL,
+            user_id INTEGER,
+            image_hash TEXT,
+            filename TEXT,
+            params TEXT,
+            total_defects INTEGER NOT NULL,
+            accuracy REAL,
+            duration_ms REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS defects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+            created_at REAL NOT NULL,
+            user_id INTEGER,
+            type TEXT NOT NULL,
+            confidence REAL,
+            severity TEXT,
+            x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_runs_created ON runs(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_runs_user ON runs(user_id, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_run ON defects(run_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_created ON defects(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_user ON defects(user_id, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_type ON defects(type, id)')
+    # 按插入增量维护的计数，聚合查询不扫描明细表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_counts (
+            day TEXT PRIMARY KEY,
+            runs INTEGER NOT NULL,
+            defects INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_type_counts (
+            day TEXT NOT NULL,
+            type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS type_counts (
+            type TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+# 第i个迁移把PRAGMA user_version从i升到i+1；只能在末尾追加
+MIGRATIONS = (_create_history,)
+
+INSERT_RUN = ('INSERT INTO runs (created_at, day, user_id, image_hash, filename, params, total_defects, '
+              'accuracy, duration_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+INSERT_DEFECT = ('INSERT INTO defects (run_id, created_at, user_id, type, confidence, severity, x1, y1, x2, y2) '
+                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+UPSERT_DAILY = ('INSERT INTO daily_counts (day, runs, defects) VALUES (?, 1, ?) '
+                'ON CONFLICT(day) DO UPDATE SET runs = runs + 1, defects = defects + excluded.defects')
+UPSERT_DAILY_TYPE = ('INSERT INTO daily_type_counts (day, type, count) VALUES (?, ?, ?) '
+                     'ON CONFLICT(day, type) DO UPDATE SET count = count + excluded.count')
+UPSERT_TYPE = ('INSERT INTO type_counts (type, count) VALUES (?, ?) '
+               'ON CONFLICT(type) DO UPDATE SET count = count + excluded.count')
+
+RUN_COLUMNS = ('id', 'created_at', 'day', 'user_id', 'image_hash', 'filename', 'params', 'total_defects',
+               'accuracy', 'duration_ms')
+DEFECT_COLUMNS = ('id', 'run_id', 'created_at', 'user_id', 'type', 'confidence', 'severity',
+                  'x1', 'y1', 'x2', 'y2')
+
+
+def _day(timestamp):
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+class HistoryStore:
+    """
+    Detection history in SQLite: one row per run, one row per defect
+
+    Runs and defects are indexed by time, user and defect type, and listed
+    newest first with keyset pagination (pass the last id of a page as
+    `before_id` for the next), so deep pages cost the same as the first.
+    Every insert also bumps per-day, per-day-and-type and per-type counters
+    with UPSERTs in the same transaction, so aggregates over the last N days
+    read at most N rows per type no matter how many defects are stored.
+    Records are written by a background thread, several per transaction, so
+    detection requests never wait on the disk; when the queue is full a
+    record is dropped with a warning.
+    """
+
+    def __init__(self, path='detections.db', max_pending=1024, busy_timeout_ms=5000):
+        self.path = path
+        self._pool = ConnectionPool(path, busy_timeout_ms)
+        self._pool.migrate(MIGRATIONS)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, response, params=None, user_id=None, image_hash=None, filename=None, duration_ms=None):
+        """Queue an /api/detect response for storage"""
+        try:
+            self._queue.put_nowait((time.time(), response, params, user_id, image_hash, filename, duration_ms))
+        except queue.Full:
+            logger.warning(f"Detection history queue full, dropping run of {image_hash}")
+
+    def flush(self):
+        """Block until every queued run has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the background thread"""
+        self._queue.put(None)
+        self._thread.join()
+        self._pool.close()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # 一次事务写入当前排队的所有记录
+            while items[-1] is not None:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            runs = [item for item in items if item is not None]
+            try:
+                if runs:
+                    self._write(runs)
+            except Exception as e:
+                logger.error(f"Failed to store detection history: {str(e)}", exc_info=True)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if items[-1] is None:
+                return
+
+    def _write(self, runs):
+        conn = self._pool.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for created_at, response, params, user_id, image_hash, filename, duration_ms in runs:
+                day = _day(created_at)
+                defects = response.get('defects', [])
+                statistics = response.get('statistics', {})
+                run_id = conn.execute(INSERT_RUN, (
+                    created_at, day, user_id, image_hash, filename,
+                    json.dumps(params, sort_keys=True) if params is not None else None,
+                    len(defects), statistics.get('accuracy'), duration_ms)).lastrowid
+                conn.executemany(INSERT_DEFECT, [
+                    (run_id, created_at, user_id, d['type'], d.get('confidence'), d.get('severity'),
+                     d['bbox']['x1'], d['bbox']['y1'], d['bbox']['x2'], d['bbox']['y2'])
+                    for d in defects
+                ])
+                type_counts = {}
+                for d in defects:
+                    type_counts[d['type']] = type_counts.get(d['type'], 0) + 1
+                conn.execute(UPSERT_DAILY, (day, len(defects)))
+                conn.executemany(UPSERT_DAILY_TYPE, [(day, t, n) for t, n in type_counts.items()])
+                conn.executemany(UPSERT_TYPE, list(type_counts.items()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def runs(self, limit=20, before_id=None, user_id=None, since=None, until=None):
+        """Runs newest first, at most `limit`, optionally filtered by user and created_at range"""
+        where, args = self._filters(before_id, user_id, since, until)
+        rows = self._pool.connection().execute(
+            f"SELECT {', '.join(RUN_COLUMNS)} FROM runs{where} ORDER BY id DESC LIMIT ?", (*args, limit)
+        ).fetchall()
+        runs = [dict(zip(RUN_COLUMNS, row)) for row in rows]
+        for run in runs:
+            run['params'] = json.loads(run['params']) if run['params'] else None
+        return runs
+
+    def run(self, run_id):
+        """One run with its defects, or None"""
+        conn = self._pool.connection()
+        row = conn.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(zip(RUN_COLUMNS, row))
+        run['params'] = json.loads(run['params']) if run['params'] else None
+        rows = conn.execute(f"SELECT {', '.join(DEFECT_COLUMNS)} FROM defects WHERE run_id = ? ORDER BY id",
+                            (run_id,)).fetchall()
+        run['defects'] = [dict(zip(DEFECT_COLUMNS, r)) for r in rows]
+        return run
+
+    def defects(self, limit=50, before_id=None, user_id=None, defect_type=None, since=None, until=None):
+        """Defects newest first, at most `limit`, optionally filtered by user, type and created_at range"""
+        where, args = self._filters(before_id, user_id, since, until)
+        if defect_type is not None:
+            where += ' AND type = ?' if where else ' WHERE type = ?'
+            args.append(defect_type)
+        rows = self._pool.connection().execute(
+            f"SELECT {', '.join(DEFECT_COLUMNS)} FROM defects{where} ORDER BY id DESC LIMIT ?", (*args, limit)
+        ).fetchall()
+        return [dict(zip(DEFECT_COLUMNS, row)) for row in rows]
+
+    @staticmethod
+    def _filters(before_id, user_id, since, until):
+        clauses, args = [], []
+        for clause, value in (('id < ?', before_id), ('user_id = ?', user_id),
+                              ('created_at >= ?', since), ('created_at < ?', until)):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), args
+
+    def defects_by_type(self, days=7):
+        """
+        Defect counts of the last `days` calendar days (today included) from the counters
+
+        Returns the totals per type plus, per day, the number of runs, defects
+        and defects per type.
+        """
+        first_day = _day(time.time() - (days - 1) * 86400)
+        conn = self._pool.connection()
+        by_day = {day: {'day': day, 'runs': runs, 'defects': defects, 'defect_types': {}}
+                  for day, runs, defects in conn.execute(
+                      'SELECT day, runs, defects FROM daily_counts WHERE day >= ? ORDER BY day', (first_day,))}
+        by_type = {}
+        for day, defect_type, count in conn.execute(
+                'SELECT day, type, count FROM daily_type_counts WHERE day >= ?', (first_day,)):
+            by_type[defect_type] = by_type.get(defect_type, 0) + count
+            if day in by_day:
+                by_day[day]['defect_types'][defect_type] = count
+        return {
+            'days': days,
+            'since': first_day,
+            'runs': sum(d['runs'] for d in by_day.values()),
+            'total_defects': sum(by_type.values()),
+            'defect_types': by_type,
+            'by_day': list(by_day.values())
+        }
+
+    def totals(self):
+        """All-time defect counts per type from the counters"""
+        return dict(self._pool.connection().execute('SELECT type, count FROM type_counts').fetchall())
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from metrics import NULL_TIMER, StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ('image', 'kwargs', 'future', 'timer', 'trace', 'submitted_at')
+
+    def __init__(self, image, kwargs, timer, trace):
+        self.image = image
+        self.kwargs = kwargs
+        self.future = Future()
+        self.timer = timer or NULL_TIMER
+        self.trace = trace
+        self.submitted_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """
+    Dynamic micro-batching in front of YOLOv11Ensemble.predict_batch
+
+    Request threads submit decoded images to a queue. A single worker thread takes
+    the first waiting request, keeps collecting requests for up to `max_wait_ms`
+    or until `max_batch_size` images are waiting, and runs them through the model
+    in one batched call per distinct set of predict arguments. Each request gets
+    its own result back through a Future. A request's optional StageTimer gets
+    its time in the queue ('queue_wait') plus the stages of the batch it ran in;
+    its optional debug trace gets the events of its own image only.
+    """
+
+    def __init__(self, get_model, max_wait_ms=10, max_batch_size=8):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self._get_model = get_model
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, image, timer=None, trace=None, **predict_kwargs):
+        """Queue one decoded image; returns a Future resolving to its predict result"""
+        request = _Request(image, predict_kwargs, timer, trace)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, image, timeout=None, timer=None, trace=None, **predict_kwargs):
+        """Blocking shortcut for submit(...).result()"""
+        return self.submit(image, timer=timer, trace=trace, **predict_kwargs).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Queue depth and how many images each batched model call carried"""
+        with self._stats_lock:
+            histogram = {str(size): count for size, count in sorted(self._batch_sizes.items())}
+            return {
+                'queue_depth': self.queue_depth(),
+                'requests': self._requests,
+                'batches': self._batches,
+                'mean_batch_size': round(self._requests / self._batches, 2) if self._batches else 0,
+                'batch_size_histogram': histogram,
+                'max_wait_ms': self.max_wait_ms,
+                'max_batch_size': self.max_batch_size
+            }
+
+    def close(self):
+        """Finish the requests already queued and stop the worker"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = [first]
+
+            # 在等待窗口内继续收集请求，凑满一批或超时即执行
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                pending.append(request)
+
+            self._dispatch(pending)
+
+    def _dispatch(self, pending):
+        # 被调用方取消的请求直接丢弃
+        pending = [r for r in pending if r.future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        # 同一次模型调用中的图片必须使用相同的predict参数
+        groups = {}
+        for request in pending:
+            key = tuple(sorted(request.kwargs.items()))
+            groups.setdefault(key, []).append(request)
+
+        try:
+            model = self._get_model()
+        except Exception as e:
+            for request in pending:
+                request.future.set_exception(e)
+            return
+
+        for requests in groups.values():
+            with self._stats_lock:
+                self._batch_sizes[len(requests)] += 1
+                self._batches += 1
+                self._requests += len(requests)
+            started = time.perf_counter()
+            for request in requests:
+                request.timer.add('queue_wait', (started - request.submitted_at) * 1000)
+            batch_timer = StageTimer() if any(r.timer.enabled for r in requests) else None
+            try:
+                results = model.predict_batch([r.image for r in requests], timer=batch_timer,
+                                              trace=[r.trace for r in requests], **requests[0].kwargs)
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}", exc_info=True)
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+            for request, result in zip(requests, results):
+                if batch_timer is not None:
+                    request.timer.merge(batch_timer)
+                request.future.set_result(result)
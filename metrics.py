@@ -0,0 +1,204 @@
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# 秒；覆盖从单个阶段的几毫秒到整张大图的十几秒
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class StageTimer:
+    """
+    Wall-clock milliseconds per named stage of one request
+
+    Stages with the same name add up, e.g. 'decode' over several batch chunks.
+    Timers are filled by one thread at a time and read once the work is done.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, milliseconds):
+        self.stages[name] = self.stages.get(name, 0.0) + milliseconds
+
+    def merge(self, other):
+        for name, milliseconds in other.stages.items():
+            self.add(name, milliseconds)
+
+    def as_dict(self):
+        return {name: round(milliseconds, 3) for name, milliseconds in self.stages.items()}
+
+
+class _NullTimer:
+    """Timer that records nothing, used when the caller does not ask for timings"""
+
+    enabled = False
+    stages = {}
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, name, milliseconds):
+        pass
+
+    def merge(self, other):
+        pass
+
+    def as_dict(self):
+        return {}
+
+
+NULL_TIMER = _NullTimer()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(list(zip(self.labelnames, key)), value))
+        return '\n'.join(lines)
+
+    def _samples(self, labels, value):
+        return [f'{self.name}{_format_labels(labels)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, labels, state):
+        # 桶计数按上界累加输出，符合Prometheus的le语义
+        counts, total, count = state[0], state[1], state[2]
+        samples, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            bucket_labels = labels + [('le', _format_value(bound))]
+            samples.append(f'{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+        samples.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+        samples.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text-format exposition (no prometheus_client dependency)
+
+    Metrics are created through the registry and rendered together by render().
+    Collectors registered with add_collector run right before rendering, for
+    values that are cheaper to read at scrape time than to keep updated.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
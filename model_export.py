@@ -0,0 +1,226 @@
+import glob
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+
+from upload_store import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BACKENDS = ('torch', 'onnx', 'openvino', 'onnx-int8')
+
+# 后端名 -> ultralytics导出格式
+EXPORT_FORMATS = {'onnx': 'onnx', 'openvino': 'openvino'}
+
+# INT8后端 -> 量化前的浮点后端
+QUANTIZED_BACKENDS = {'onnx-int8': 'onnx'}
+
+_fingerprints = {}
+_fingerprint_lock = threading.Lock()
+_export_lock = threading.Lock()
+
+
+def weights_fingerprint(model_path):
+    """
+    SHA-256 of a weights file, recomputed only when its size or mtime changes
+
+    Used to notice that best.pt was replaced so models and cached results built
+    from the old weights are not reused.
+    """
+    path = os.path.abspath(model_path)
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _fingerprint_lock:
+        cached = _fingerprints.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()
+    with _fingerprint_lock:
+        _fingerprints[path] = (signature, fingerprint)
+    return fingerprint
+
+
+def _artifact_name(stem, fingerprint, imgsz, backend):
+    name = f'{stem}-{fingerprint}-{int(imgsz)}'
+    if backend == 'onnx':
+        return f'{name}.onnx'
+    if backend == 'onnx-int8':
+        return f'{name}-int8.onnx'
+    return f'{name}_openvino_model'
+
+
+def export_path(model_path, backend, imgsz, export_dir=None):
+    """Where the export of these weights for `backend` at `imgsz` is cached"""
+    model_path = os.path.abspath(model_path)
+    export_dir = export_dir or os.path.join(os.path.dirname(model_path), 'exports')
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    fingerprint = weights_fingerprint(model_path)[:16]
+    return os.path.join(export_dir, _artifact_name(stem, fingerprint, imgsz, backend))
+
+
+def export_model(model_path, backend='torch', imgsz=600, export_dir=None, calibration_dir=None):
+    """
+    Weights to load for a backend, exporting best.pt on first use
+
+    The torch backend uses the weights as they are. For onnx and openvino the
+    model is exported once at a fixed imgsz (with a dynamic batch axis so the
+    orientation views still go through in one call) and cached under
+    `export_dir`, named by the weights fingerprint. The export runs on a private
+    copy of the weights and is renamed into place, so concurrent processes never
+    load a half-written artifact. Exports of replaced weights are removed.
+    Quantized backends are built by quantize_model from `calibration_dir`.
+    """
+    if backend == 'torch':
+        return model_path
+    if backend in QUANTIZED_BACKENDS:
+        return quantize_model(model_path, imgsz, export_dir, calibration_dir)
+    if backend not in EXPORT_FORMATS:
+        raise ValueError(f"backend must be one of {SUPPORTED_BACKENDS}, got {backend!r}")
+
+    target = export_path(model_path, backend, imgsz, export_dir)
+    if os.path.exists(target):
+        return target
+
+    from ultralytics import YOLO
+
+    with _export_lock:
+        if os.path.exists(target):
+            return target
+        cache_dir = os.path.dirname(target)
+        os.makedirs(cache_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix='.export-', dir=cache_dir)
+        try:
+            weights = os.path.join(work_dir, os.path.basename(model_path))
+            shutil.copy2(model_path, weights)
+            logger.info(f"Exporting {model_path} to {backend} (imgsz={imgsz}), this happens once per weights file")
+            exported = YOLO(weights).export(format=EXPORT_FORMATS[backend], imgsz=int(imgsz), dynamic=True,
+                                            device='cpu')
+            try:
+                os.replace(exported, target)
+            except OSError:
+                # 其他进程已先完成导出
+                if not os.path.exists(target):
+                    raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    _remove_stale_exports(target, model_path, backend, imgsz)
+    return target
+
+
+def _remove_stale_exports(target, model_path, backend, imgsz):
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    pattern = os.path.join(os.path.dirname(target), _artifact_name(glob.escape(stem), '*', imgsz, backend))
+    for path in glob.glob(pattern):
+        if path == target:
+            continue
+        logger.info(f"Removing export of replaced weights {path}")
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def calibration_images(folder, max_images=200):
+    """Image files under `folder` (searched recursively), sorted, at most `max_images`"""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, name) for name in files
+                      if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    return sorted(paths)[:max_images]
+
+
+class _CalibrationReader:
+    """onnxruntime calibration data reader feeding images preprocessed like ultralytics does at inference"""
+
+    def __init__(self, paths, imgsz, input_name):
+        self._paths = iter(paths)
+        self._imgsz = int(imgsz)
+        self._input_name = input_name
+
+    def get_next(self):
+        from ultralytics.data.augment import LetterBox
+        from v11 import load_image
+
+        for path in self._paths:
+            try:
+                image = load_image(path)
+            except ValueError:
+                logger.warning(f"Skipping undecodable calibration image {path}")
+                continue
+            image = LetterBox((self._imgsz, self._imgsz), auto=False)(image=image)
+            tensor = np.ascontiguousarray(image[..., ::-1].transpose(2, 0, 1), dtype=np.float32) / 255
+            return {self._input_name: tensor[None]}
+        return None
+
+
+def _head_postprocess_nodes(onnx_path):
+    """
+    Nodes of the Detect head that decode boxes (DFL, anchors, sigmoid, concat)
+
+    Quantizing them costs box precision for almost no speed, so only the
+    convolutions of the head are quantized.
+    """
+    import onnx
+
+    nodes = onnx.load(onnx_path, load_external_data=False).graph.node
+    indices = [int(node.name.split('/')[1].split('.')[1]) for node in nodes
+               if node.name.startswith('/model.') and node.name.split('/')[1].split('.')[1].isdigit()]
+    if not indices:
+        return []
+    head = f'/model.{max(indices)}/'
+    return [node.name for node in nodes
+            if node.name.startswith(head) and (node.op_type != 'Conv' or '/dfl/' in node.name)]
+
+
+def quantize_model(model_path, imgsz=600, export_dir=None, calibration_dir=None, max_images=200):
+    """
+    Static INT8 ONNX model calibrated on local images, built once and cached
+
+    The weights are first exported to fp32 ONNX, then quantized per channel in
+    QDQ format with activation ranges collected from up to `max_images` images
+    under `calibration_dir` (e.g. the uploads archive). The box-decoding part of
+    the Detect head stays in fp32. Delete the cached *-int8.onnx file to
+    recalibrate on newer images.
+    """
+    target = export_path(model_path, 'onnx-int8', imgsz, export_dir)
+    if os.path.exists(target):
+        return target
+
+    fp32_path = export_model(model_path, QUANTIZED_BACKENDS['onnx-int8'], imgsz, export_dir)
+    paths = calibration_images(calibration_dir, max_images) if calibration_dir else []
+    if not paths:
+        raise ValueError(f"INT8 calibration needs images, none found in {calibration_dir!r}")
+
+    import onnxruntime
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    with _export_lock:
+        if os.path.exists(target):
+            return target
+        input_name = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        tmp_path = f'{target}.{uuid.uuid4().hex}.tmp'
+        logger.info(f"Quantizing {model_path} to INT8 with {len(paths)} calibration images from {calibration_dir}")
+        try:
+            quantize_static(fp32_path, tmp_path, _CalibrationReader(paths, imgsz, input_name),
+                            quant_format=QuantFormat.QDQ, per_channel=True,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                            nodes_to_exclude=_head_postprocess_nodes(fp32_path))
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    _remove_stale_exports(target, model_path, 'onnx-int8', imgsz)
+    return target
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+from model_export import SUPPORTED_BACKENDS, weights_fingerprint
+from v11 import YOLOv11Ensemble
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_device(device=None):
+    """Pick the inference device the same way YOLOv11Ensemble does"""
+    if device is None:
+        return 'cuda:0' if torch.cuda.is_available() else 'cpu'
+    return device
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded YOLOv11Ensemble detectors
+
+    Models are keyed by (weights path, device, imgsz, backend), loaded and warmed
+    up once, and shared by all request threads. At most `max_models` variants stay
+    resident; the least recently used one is dropped when the bound is exceeded.
+    A model whose weights file changed on disk is reloaded on the next get.
+    Exported backends (onnx, openvino, onnx-int8) are cached under `export_dir`;
+    the INT8 backend is calibrated on the images in `calibration_dir`.
+    `tensor_views` is passed on to every YOLOv11Ensemble.
+    """
+
+    def __init__(self, max_models=2, warmup=True, export_dir=None, calibration_dir=None, tensor_views=False):
+        if max_models < 1:
+            raise ValueError("max_models must be at least 1")
+        self.max_models = max_models
+        self.warmup = warmup
+        self.export_dir = export_dir
+        self.calibration_dir = calibration_dir
+        self.tensor_views = tensor_views
+        self._models = OrderedDict()
+        self._fingerprints = {}
+        self._load_seconds = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_path, device=None, imgsz=600, backend='torch'):
+        """Normalize the lookup key so equivalent arguments share one model"""
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"backend must be one of {SUPPORTED_BACKENDS}, got {backend!r}")
+        return (os.path.abspath(model_path), resolve_device(device), int(imgsz), backend)
+
+    def get(self, model_path, device=None, imgsz=600, backend='torch'):
+        """Return the resident model for the key, loading it on first use"""
+        key = self.make_key(model_path, device, imgsz, backend)
+        fingerprint = weights_fingerprint(key[0])
+        with self._lock:
+            model = self._lookup(key, fingerprint)
+            if model is not None:
+                return model
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 按key加锁加载，同一模型只加载一次，不同模型的加载互不阻塞
+        with key_lock:
+            with self._lock:
+                model = self._lookup(key, fingerprint)
+                if model is not None:
+                    return model
+            model = self._load(key)
+            with self._lock:
+                self._store(key, model, fingerprint)
+            return model
+
+    def reload(self, model_path, device=None, imgsz=600, backend='torch'):
+        """Load a fresh copy of the model (e.g. after best.pt was replaced) and swap it in"""
+        key = self.make_key(model_path, device, imgsz, backend)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            fingerprint = weights_fingerprint(key[0])
+            model = self._load(key)
+            with self._lock:
+                self._store(key, model, fingerprint)
+            return model
+
+    def evict(self, model_path, device=None, imgsz=600, backend='torch'):
+        """Drop a resident model; returns True if it was loaded"""
+        key = self.make_key(model_path, device, imgsz, backend)
+        with self._lock:
+            removed = self._models.pop(key, None) is not None
+            self._fingerprints.pop(key, None)
+        if removed:
+            logger.info(f"Evicted model {key}")
+            self._release_memory()
+        return removed
+
+    def clear(self):
+        """Drop every resident model"""
+        with self._lock:
+            self._models.clear()
+            self._fingerprints.clear()
+        self._release_memory()
+
+    def loaded_keys(self):
+        """Keys of the resident models, least recently used first"""
+        with self._lock:
+            return list(self._models.keys())
+
+    def load_times(self):
+        """Seconds each resident model took to load and warm up, by key"""
+        with self._lock:
+            return {key: self._load_seconds[key] for key in self._models if key in self._load_seconds}
+
+    def forward_stats(self):
+        """Forward passes run and skipped by cascade voting of each resident model, by key"""
+        with self._lock:
+            models = list(self._models.items())
+        return {key: model.forward_stats() for key, model in models}
+
+    def _lookup(self, key, fingerprint):
+        model = self._models.get(key)
+        if model is None:
+            return None
+        if self._fingerprints.get(key) != fingerprint:
+            logger.info(f"Weights changed on disk, reloading {key}")
+            return None
+        self._models.move_to_end(key)
+        return model
+
+    def _store(self, key, model, fingerprint):
+        self._models[key] = model
+        self._fingerprints[key] = fingerprint
+        self._models.move_to_end(key)
+        while len(self._models) > self.max_models:
+            old_key, _ = self._models.popitem(last=False)
+            self._fingerprints.pop(old_key, None)
+            logger.info(f"Model cache full ({self.max_models}), evicted {old_key}")
+
+    def _load(self, key):
+        model_path, device, imgsz, backend = key
+        logger.info(f"Loading model {model_path} (device={device}, imgsz={imgsz}, backend={backend})")
+        started = time.perf_counter()
+        model = YOLOv11Ensemble(model_path, device=device, imgsz=imgsz, backend=backend,
+                                export_dir=self.export_dir, calibration_dir=self.calibration_dir,
+                                tensor_views=self.tensor_views)
+        if self.warmup:
+            model.warmup()
+        with self._lock:
+            self._load_seconds[key] = time.perf_counter() - started
+        return model
+
+    @staticmethod
+    def _release_memory():
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
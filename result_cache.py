@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    LRU cache of detection results keyed by image content and detection parameters
+
+    Values must be JSON-serializable and are treated as read-only by callers.
+    The in-memory tier holds up to `max_entries` results. When `disk_dir` is set,
+    results are also written there as JSON and survive restarts. Every key
+    includes the weights fingerprint; when a lookup sees a new fingerprint the
+    memory tier is cleared and the disk entries of older weights are removed.
+    """
+
+    def __init__(self, max_entries=256, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_hash, weights_fingerprint, **params):
+        """Stable key from the image hash, the weights fingerprint and the detection parameters"""
+        payload = json.dumps({'image': image_hash, 'weights': weights_fingerprint, 'params': params},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key, weights_fingerprint):
+        """Cached value for the key, or None on a miss"""
+        self._check_weights(weights_fingerprint)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = self._read_disk(key, weights_fingerprint)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key, weights_fingerprint, value):
+        self._check_weights(weights_fingerprint)
+        with self._lock:
+            self._store(key, value)
+        self._write_disk(key, weights_fingerprint, value)
+
+    def clear(self):
+        """Drop every cached result, including the disk tier"""
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                shutil.rmtree(os.path.join(self.disk_dir, name), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0,
+                'disk_enabled': bool(self.disk_dir),
+                'weights_fingerprint': self._fingerprint
+            }
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _check_weights(self, weights_fingerprint):
+        with self._lock:
+            if weights_fingerprint == self._fingerprint:
+                return
+            changed = self._fingerprint is not None
+            self._fingerprint = weights_fingerprint
+            self._entries.clear()
+        if changed:
+            logger.info("Model weights changed, result cache invalidated")
+        # 删除其他权重版本的磁盘缓存
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name != weights_fingerprint:
+                    shutil.rmtree(os.path.join(self.disk_dir, name), ignore_errors=True)
+
+    def _disk_path(self, key, weights_fingerprint):
+        return os.path.join(self.disk_dir, weights_fingerprint, key[:2], f'{key}.json')
+
+    def _read_disk(self, key, weights_fingerprint):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key, weights_fingerprint), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key, weights_fingerprint, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key, weights_fingerprint)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {str(e)}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,74 @@
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    One long-lived SQLite connection per thread
+
+    Connections are in autocommit mode (callers open transactions explicitly
+    with BEGIN IMMEDIATE when several statements must commit together), wait up
+    to `busy_timeout_ms` for a lock instead of failing with "database is
+    locked", and use synchronous=NORMAL, which is safe in WAL mode. sqlite3
+    caches the prepared statements of each connection by SQL text, so queries
+    kept as fixed strings are only parsed once per thread.
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """A new connection with the pool's settings, owned by the caller"""
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def connection(self):
+        """The calling thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def migrate(self, migrations, *args):
+        """
+        Put the database in WAL mode and apply the migrations newer than its PRAGMA user_version
+
+        Migration i is called as migration(conn, *args) and moves user_version
+        from i to i + 1; all pending migrations commit together.
+        """
+        conn = self.connect()
+        try:
+            # journal_mode=WAL记录在数据库文件中，对之后的所有连接生效
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                for i, migration in enumerate(migrations[version:], start=version):
+                    logger.info(f"Migrating {self.path} to schema version {i + 1} ({migration.__name__})")
+                    migration(conn, *args)
+                    conn.execute(f'PRAGMA user_version = {i + 1}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
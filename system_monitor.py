@@ -0,0 +1,147 @@
+import datetime
+import logging
+import socket
+import threading
+import time
+from collections import deque
+
+import psutil
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+class SystemMonitor:
+    """
+    Samples host status on a background thread so the status endpoints never block
+
+    Every `interval` seconds the thread reads CPU and memory usage (CPU percent
+    without psutil's blocking interval, i.e. usage since the previous sample),
+    GPU utilization and the inference queue depth, and replaces the cached
+    snapshot. Each sample is also appended to a ring buffer of the last
+    `history_size` samples together with the latency of the requests observed
+    since the previous sample. Things that do not change while the process runs
+    (server IP, boot time, NVML handles) are looked up once.
+    """
+
+    def __init__(self, interval=2.0, history_size=900, queue_depth=None):
+        self.interval = interval
+        self._queue_depth = queue_depth
+        self._history = deque(maxlen=history_size)
+        self._latencies = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._boot_time = psutil.boot_time()
+        self._server_ip = self._lookup_ip()
+        self._gpu_handles = self._init_nvml()
+        psutil.cpu_percent(interval=None)  # 第一次调用只建立基准
+        self._snapshot = self._sample()
+        self._thread = threading.Thread(target=self._run, name='system-monitor', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _lookup_ip():
+        try:
+            return socket.gethostbyname(socket.gethostname())
+        except OSError:
+            return '127.0.0.1'
+
+    @staticmethod
+    def _init_nvml():
+        """NVML handle per CUDA device, or None per device when pynvml is unavailable"""
+        if not torch.cuda.is_available():
+            return []
+        count = torch.cuda.device_count()
+        try:
+            # 这部分代码需要安装nvidia-ml-py库才能获取GPU利用率
+            import pynvml
+            pynvml.nvmlInit()
+            return [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(count)]
+        except ImportError:
+            return [None] * count
+        except Exception as e:
+            logger.warning(f"NVML initialization failed: {str(e)}")
+            return [None] * count
+
+    def _gpu_info(self):
+        if not self._gpu_handles:
+            return None
+        devices = []
+        for i, handle in enumerate(self._gpu_handles):
+            if handle is None:
+                utilization = 'unknown (pynvml not installed)'
+            else:
+                try:
+                    import pynvml
+                    utilization = pynvml.nvmlDeviceGetUtilizationRates(handle).gpu
+                except Exception as e:
+                    utilization = f'error: {str(e)}'
+            devices.append({'name': torch.cuda.get_device_name(i), 'utilization': utilization})
+        return {'count': len(devices), 'devices': devices}
+
+    def observe_latency(self, seconds):
+        """Record one request latency; it is summarized into the next sample"""
+        with self._lock:
+            self._latencies.append(seconds * 1000)
+
+    def _sample(self):
+        now = time.time()
+        uptime = now - self._boot_time
+        with self._lock:
+            latencies, self._latencies = sorted(self._latencies), []
+        try:
+            queue_depth = self._queue_depth() if self._queue_depth is not None else 0
+        except Exception:
+            queue_depth = None
+        gpu_info = self._gpu_info()
+        snapshot = {
+            'status': 'normal',
+            'cpu_usage': psutil.cpu_percent(interval=None),
+            'memory_usage': psutil.virtual_memory().percent,
+            'uptime': f'{int(uptime // 3600)}h {int(uptime % 3600 // 60)}m',
+            'gpu_available': gpu_info is not None,
+            'gpu_info': gpu_info,
+            'server_ip': self._server_ip,
+            'queue_depth': queue_depth,
+            'sampled_at': datetime.datetime.fromtimestamp(now).isoformat(timespec='seconds')
+        }
+        with self._lock:
+            self._history.append({
+                'time': round(now, 3),
+                'cpu_usage': snapshot['cpu_usage'],
+                'memory_usage': snapshot['memory_usage'],
+                'queue_depth': queue_depth,
+                'requests': len(latencies),
+                'latency_mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                'latency_p95_ms': round(_percentile(latencies, 0.95), 3) if latencies else None,
+                'latency_max_ms': round(latencies[-1], 3) if latencies else None
+            })
+        return snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._snapshot = self._sample()
+            except Exception as e:
+                logger.error(f"System status sampling failed: {str(e)}", exc_info=True)
+
+    def snapshot(self):
+        """The most recent sample, without waiting"""
+        return self._snapshot
+
+    def history(self, seconds=None):
+        """Samples of the last `seconds` seconds (the whole ring buffer when None), oldest first"""
+        with self._lock:
+            samples = list(self._history)
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            samples = [s for s in samples if s['time'] >= cutoff]
+        return samples
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
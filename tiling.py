@@ -0,0 +1,28 @@
+def tile_starts(length, tile_size, overlap):
+    """Start offsets along one axis so tiles of `tile_size` cover `length` with the given overlap"""
+    if length <= tile_size:
+        return [0]
+    step = max(1, int(tile_size * (1 - overlap)))
+    starts = list(range(0, length - tile_size, step))
+    # 最后一块贴齐边缘，保证整幅图像都被覆盖
+    starts.append(length - tile_size)
+    return starts
+
+
+def tile_windows(width, height, tile_size=1280, overlap=0.2):
+    """
+    Split a width x height panel into overlapping square tiles
+
+    Returns (x1, y1, x2, y2) windows in panel coordinates, row by row. Tiles at
+    the right and bottom edges are shifted inwards rather than padded, so every
+    tile is full size unless the panel itself is smaller than a tile.
+    """
+    if tile_size <= 0:
+        raise ValueError("tile_size must be positive")
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap must be in [0, 1)")
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in tile_starts(height, tile_size, overlap)
+        for x in tile_starts(width, tile_size, overlap)
+    ]
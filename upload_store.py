@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from sqlite_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def content_hash(data):
+    """SHA-256 hex digest of the raw image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def image_extension(filename, default='.jpg'):
+    """File extension to archive an upload under, taken from the client filename when it is an image type"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if ext in IMAGE_EXTENSIONS else default
+
+
+def _create_index(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS uploads (
+            digest TEXT PRIMARY KEY,
+            ext TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            hits INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_last_seen ON uploads(last_seen)')
+
+
+# 第i个迁移把PRAGMA user_version从i升到i+1；只能在末尾追加
+INDEX_MIGRATIONS = (_create_index,)
+
+SELECT_UPLOAD = 'SELECT ext, size, first_seen, last_seen, hits FROM uploads WHERE digest = ?'
+INSERT_UPLOAD = 'INSERT INTO uploads (digest, ext, size, first_seen, last_seen, hits) VALUES (?, ?, ?, ?, ?, ?)'
+TOUCH_UPLOAD = 'UPDATE uploads SET last_seen = MAX(last_seen, ?), hits = hits + ? WHERE digest = ?'
+DELETE_UPLOAD = 'DELETE FROM uploads WHERE digest = ?'
+
+
+class UploadArchiver:
+    """
+    Content-addressed store of uploaded images, written on a background thread
+
+    Files are named by the SHA-256 of their content and sharded into two levels
+    of subdirectories by its first four hex digits (ab/cd/abcd....jpg), so
+    identical boards are stored once and no directory grows beyond a few
+    hundred entries even with millions of images. Each file is written to a
+    temporary name and renamed into place, so readers never see a partial
+    image. A SQLite index (index.db in the folder) records size, first seen,
+    last seen and hit count per image.
+
+    Inference never waits on the disk: when the queue is full the upload is
+    skipped with a warning. The same thread periodically evicts images not
+    seen for `max_age_days` and then the least recently seen ones until the
+    store fits in `max_bytes` (None disables either rule). Images left in the
+    folder root by older versions stay where they are until import_flat_files
+    is run explicitly (`python upload_store.py --import-flat-files`).
+    """
+
+    def __init__(self, folder, max_pending=256, max_age_days=None, max_bytes=None, retention_interval=3600):
+        self.folder = folder
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.retention_interval = retention_interval
+        os.makedirs(folder, exist_ok=True)
+        self._pool = ConnectionPool(os.path.join(folder, 'index.db'))
+        self._pool.migrate(INDEX_MIGRATIONS)
+        conn = self._pool.connection()
+        self._total_bytes, self._files = conn.execute('SELECT COALESCE(SUM(size), 0), COUNT(*) FROM uploads').fetchone()
+        self._next_retention = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='upload-archiver', daemon=True)
+        self._thread.start()
+
+    def path_for(self, digest, ext='.jpg'):
+        return os.path.join(self.folder, digest[:2], digest[2:4], f'{digest}{ext}')
+
+    def submit(self, data, ext='.jpg', digest=None):
+        """Queue raw image bytes for archiving and return their content hash"""
+        digest = digest or content_hash(data)
+        try:
+            self._queue.put_nowait((digest, data, ext, time.time()))
+        except queue.Full:
+            logger.warning(f"Upload archive queue full, skipping {digest}{ext}")
+        return digest
+
+    def lookup(self, digest):
+        """Index entry of an archived image (path, size, first_seen, last_seen, hits), or None"""
+        row = self._pool.connection().execute(SELECT_UPLOAD, (digest,)).fetchone()
+        if row is None:
+            return None
+        ext, size, first_seen, last_seen, hits = row
+        return {'path': self.path_for(digest, ext), 'size': size, 'first_seen': first_seen,
+                'last_seen': last_seen, 'hits': hits}
+
+    def stats(self):
+        return {
+            'files': self._files,
+            'total_bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'max_age_days': self.max_age_days,
+            'pending': self._queue.qsize()
+        }
+
+    def flush(self):
+        """Block until every queued upload has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the background thread"""
+        self._queue.put(None)
+        self._thread.join()
+        self._pool.close()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=max(self._next_retention - time.time(), 0.01))
+            except queue.Empty:
+                self._run_retention()
+                continue
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                logger.error(f"Failed to archive upload: {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+            if time.time() >= self._next_retention:
+                self._run_retention()
+
+    def _write(self, digest, data, ext, seen_at):
+        conn = self._pool.connection()
+        if conn.execute(TOUCH_UPLOAD, (seen_at, 1, digest)).rowcount:
+            return
+        path = self.path_for(digest, ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self._add(conn, digest, ext, len(data), seen_at, seen_at, 1)
+
+    def _add(self, conn, digest, ext, size, first_seen, last_seen, hits):
+        conn.execute(INSERT_UPLOAD, (digest, ext, size, first_seen, last_seen, hits))
+        self._total_bytes += size
+        self._files += 1
+
+    def import_flat_files(self):
+        """
+        Move images stored directly in the folder (the old flat layout) into the shards
+
+        A one-off step, meant to run while the app is stopped. Files whose
+        content is already archived are removed. Imported images count as
+        seen now (first_seen keeps the file's mtime), so age-based retention
+        does not delete them on its next pass. Returns the number of files.
+        """
+        conn = self._pool.connection()
+        with os.scandir(self.folder) as entries:
+            flat = [entry for entry in entries
+                    if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS]
+        for entry in flat:
+            with open(entry.path, 'rb') as f:
+                digest = content_hash(f.read())
+            ext = image_extension(entry.name)
+            modified_at, imported_at = entry.stat().st_mtime, time.time()
+            if conn.execute(TOUCH_UPLOAD, (imported_at, 1, digest)).rowcount:
+                os.remove(entry.path)
+                continue
+            path = self.path_for(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(entry.path, path)
+            self._add(conn, digest, ext, os.path.getsize(path), modified_at, imported_at, 1)
+        if flat:
+            logger.info(f"Moved {len(flat)} uploads from {self.folder} into the content-addressed store")
+        return len(flat)
+
+    def _run_retention(self):
+        self._next_retention = time.time() + self.retention_interval
+        try:
+            conn = self._pool.connection()
+            expired = []
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                expired = conn.execute('SELECT digest, ext, size FROM uploads WHERE last_seen < ?',
+                                       (cutoff,)).fetchall()
+            evicted = self._evict(conn, expired)
+            if self.max_bytes is not None and self._total_bytes > self.max_bytes:
+                # 按最近出现时间从旧到新淘汰，直到总大小回到预算内
+                over_budget, excess = [], self._total_bytes - self.max_bytes
+                for digest, ext, size in conn.execute('SELECT digest, ext, size FROM uploads ORDER BY last_seen'):
+                    over_budget.append((digest, ext, size))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                evicted += self._evict(conn, over_budget)
+            if evicted:
+                logger.info(f"Upload retention removed {evicted} images, {self._total_bytes} bytes kept")
+        except Exception as e:
+            logger.error(f"Upload retention failed: {str(e)}", exc_info=True)
+
+    def _evict(self, conn, rows):
+        if not rows:
+            return 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(DELETE_UPLOAD, [(digest,) for digest, _, _ in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        # 索引先删除再删文件：中途失败最多留下未被引用的文件，不会有指向不存在文件的记录
+        for digest, ext, size in rows:
+            try:
+                os.remove(self.path_for(digest, ext))
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
+            self._files -= 1
+        return len(rows)
+
+
+if __name__ == '__main__':
+    # 一次性操作：python upload_store.py --import-flat-files（先停止应用）
+    parser = argparse.ArgumentParser(description='Upload archive maintenance')
+    parser.add_argument('--folder', default='uploads')
+    parser.add_argument('--import-flat-files', action='store_true',
+                        help='move images from the folder root into the content-addressed shards')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    archiver = UploadArchiver(args.folder)
+    try:
+        if args.import_flat_files:
+            print(f"Imported {archiver.import_flat_files()} images")
+    finally:
+        archiver.close()
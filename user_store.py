@@ -0,0 +1,175 @@
+import argparse
+import hmac
+import logging
+import threading
+import time
+from datetime import datetime
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from sqlite_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# 固定的SQL文本：sqlite3按文本缓存每个连接上预编译的语句，长连接上重复执行不再重新解析
+INSERT_USER = ('INSERT INTO users (username, password, password_hash, email, phone, created_at) '
+               'VALUES (?, ?, ?, ?, ?, ?)')
+SELECT_LOGIN = 'SELECT id, username, email, phone, password, password_hash FROM users WHERE username = ?'
+UPDATE_LAST_LOGIN = 'UPDATE users SET last_login = ? WHERE id = ?'
+
+
+def _create_users(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT UNIQUE NOT NULL
+        )
+    ''')
+
+
+def _add_model_columns(conn):
+    # 与models.User对齐：password_hash、created_at、last_login
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+    for name in ('password_hash', 'created_at', 'last_login'):
+        if name not in columns:
+            conn.execute(f'ALTER TABLE users ADD COLUMN {name} TEXT')
+    conn.execute('UPDATE users SET created_at = ? WHERE created_at IS NULL', (_now(),))
+
+
+# 第i个迁移把PRAGMA user_version从i升到i+1；只能在末尾追加
+# 明文密码改为哈希不可逆，不作为启动时的自动迁移，由hash_plaintext_passwords显式执行
+MIGRATIONS = (_create_users, _add_model_columns)
+
+
+def _now():
+    return datetime.utcnow().isoformat(timespec='seconds')
+
+
+def _hash(password, hash_method):
+    if hash_method:
+        return generate_password_hash(password, method=hash_method)
+    return generate_password_hash(password)
+
+
+class UserStore:
+    """
+    Access to users.db through a sqlite_pool.ConnectionPool (one connection per thread)
+
+    The database runs in WAL mode, so logins keep reading while a registration
+    writes, and writers wait for the lock instead of failing at once with
+    "database is locked". Every write is a single autocommit statement, so no
+    transaction is held open between statements. The schema is versioned with
+    PRAGMA user_version and migrated on startup.
+
+    Passwords are kept as they were (plaintext) unless `hash_passwords` is
+    set; then new accounts get werkzeug hashes (`hash_method`, None for the
+    werkzeug default, scrypt, whose check dominates a login's CPU time).
+    Logins accept both kinds of row, so existing accounts are converted
+    separately and explicitly with hash_plaintext_passwords. A login does not
+    write: last_login times are collected in memory and written in one
+    statement at most every `last_login_interval` seconds, and on close.
+    """
+
+    def __init__(self, path='users.db', busy_timeout_ms=5000, hash_passwords=False, hash_method=None,
+                 last_login_interval=60):
+        self.path = path
+        self.hash_passwords = hash_passwords
+        self.hash_method = hash_method
+        self.last_login_interval = last_login_interval
+        self._pool = ConnectionPool(path, busy_timeout_ms)
+        self._last_logins = {}
+        self._last_login_lock = threading.Lock()
+        self._last_login_flushed = time.monotonic()
+        self.migrate()
+
+    def migrate(self):
+        """Apply the migrations newer than the database's user_version"""
+        self._pool.migrate(MIGRATIONS)
+
+    def create_user(self, username, password, email, phone):
+        """Insert a user; raises sqlite3.IntegrityError when the username, email or phone is taken"""
+        if self.hash_passwords:
+            # password列是NOT NULL，保存哈希时明文列为空字符串
+            password, password_hash = '', _hash(password, self.hash_method)
+        else:
+            password_hash = None
+        cursor = self._pool.connection().execute(INSERT_USER,
+                                                 (username, password, password_hash, email, phone, _now()))
+        return cursor.lastrowid
+
+    def authenticate(self, username, password):
+        """User info dict (id, username, email, phone) for valid credentials, else None"""
+        row = self._pool.connection().execute(SELECT_LOGIN, (username,)).fetchone()
+        if row is None:
+            return None
+        stored_password, password_hash = row[4], row[5]
+        if password_hash:
+            valid = check_password_hash(password_hash, password)
+        else:
+            valid = bool(stored_password) and hmac.compare_digest(stored_password.encode(), password.encode())
+        if not valid:
+            return None
+        self._record_login(row[0])
+        return {'id': row[0], 'username': row[1], 'email': row[2], 'phone': row[3]}
+
+    def hash_plaintext_passwords(self):
+        """Replace every plaintext password with a werkzeug hash (irreversible); returns the number of users"""
+        conn = self._pool.connect()
+        try:
+            rows = conn.execute("SELECT id, password FROM users "
+                                "WHERE password_hash IS NULL AND password != ''").fetchall()
+            # 先在事务外计算哈希（每个约一百多毫秒），再在一个事务中写入，不长时间占用写锁
+            hashes = [(_hash(password, self.hash_method), user_id) for user_id, password in rows]
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany("UPDATE users SET password_hash = ?, password = '' "
+                                 "WHERE id = ? AND password_hash IS NULL", hashes)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        if rows:
+            logger.info(f"Hashed {len(rows)} plaintext passwords in {self.path}")
+        return len(rows)
+
+    def flush_last_logins(self):
+        """Write the last_login times collected since the previous flush"""
+        with self._last_login_lock:
+            pending, self._last_logins = self._last_logins, {}
+            self._last_login_flushed = time.monotonic()
+        if pending:
+            self._pool.connection().executemany(UPDATE_LAST_LOGIN,
+                                                [(at, user_id) for user_id, at in pending.items()])
+
+    def close(self):
+        self.flush_last_logins()
+        self._pool.close()
+
+    def _record_login(self, user_id):
+        with self._last_login_lock:
+            self._last_logins[user_id] = _now()
+            due = time.monotonic() - self._last_login_flushed >= self.last_login_interval
+        if due:
+            self.flush_last_logins()
+
+
+if __name__ == '__main__':
+    # 一次性操作：python user_store.py --hash-passwords
+    parser = argparse.ArgumentParser(description='users.db maintenance')
+    parser.add_argument('--db', default='users.db')
+    parser.add_argument('--hash-passwords', action='store_true',
+                        help='replace plaintext passwords with werkzeug hashes (irreversible)')
+    parser.add_argument('--hash-method', default=None, help='werkzeug hash method (default: werkzeug default)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    store = UserStore(args.db, hash_method=args.hash_method)
+    try:
+        if args.hash_passwords:
+            print(f"Hashed {store.hash_plaintext_passwords()} plaintext passwords")
+    finally:
+        store.close()
@@ -1,275 +1,520 @@
+import math
 import numpy as np
-from PIL import Image
 import cv2
-import io
 from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+from ultralytics.utils.ops import scale_boxes
 import torch
-from copy import deepcopy
+import logging
+import threading
 
-def iou(box1, box2):
-    """Calculate IoU between two boxes"""
-    x1_min, y1_min, x1_max, y1_max = box1[:4]
-    x2_min, y2_min, x2_max, y2_max = box2[:4]
+from box_fusion import as_box_array, group_indices, vote_groups
+from debug_trace import NULL_TRACE
+from detection_result import DetectionResult
+from metrics import NULL_TIMER
+from model_export import export_model
+from tiling import tile_windows
 
-    inter_xmin = max(x1_min, x2_min)
-    inter_ymin = max(y1_min, y2_min)
-    inter_xmax = min(x1_max, x2_max)
-    inter_ymax = min(y1_max, y2_max)
+logger = logging.getLogger(__name__)
 
-    inter_width = max(0, inter_xmax - inter_xmin)
-    inter_height = max(0, inter_ymax - inter_ymin)
-    inter_area = inter_width * inter_height
+# (np.rot90 k, counter-clockwise angle) for every orientation, in voting order
+ORIENTATIONS = ((0, 0), (1, 90), (2, 180), (3, 270))
 
-    box1_area = (x1_max - x1_min) * (y1_max - y1_min)
-    box2_area = (x2_max - x2_min) * (y2_max - y2_min)
+ORIENTATION_LABELS = {
+    0: "Original Orientation (0°)",
+    1: "90° Counter-Clockwise Rotation (transformed to original)",
+    2: "180° Rotation (transformed to original)",
+    3: "270° Rotation (90° Clockwise) (transformed to original)",
+}
 
-    union_area = box1_area + box2_area - inter_area
 
-    if union_area == 0:
-        return 0
+def load_image(source):
+    """
+    Decode an image exactly once into a BGR uint8 array (the layout ultralytics uses)
 
-    return inter_area / union_area
+    Args:
+        source: Path to the image, raw encoded bytes (e.g. an upload), or an
+            already decoded BGR ndarray which is returned unchanged
+    """
+    if isinstance(source, np.ndarray):
+        image = source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR)
+    else:
+        # np.fromfile + imdecode也能处理非ASCII路径
+        image = cv2.imdecode(np.fromfile(str(source), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image")
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
 
 
-def aggregate_boxes(predictions, iou_threshold=0.5):
-    """Group similar boxes together"""
-    # Create a deep copy to avoid modifying the original list
-    predictions_copy = deepcopy(predictions)
-    aggregated_boxes = []
-    
-    while predictions_copy:
-        base_box = predictions_copy.pop(0)
-        similar_boxes = [base_box]
+def rotated_views(image, orientation_count):
+    """
+    Views of a BGR image for each orientation, as np.rot90 views without copies
 
-        i = 0
-        while i < len(predictions_copy):
-            if iou(base_box, predictions_copy[i]) > iou_threshold:
-                similar_boxes.append(predictions_copy[i])
-                predictions_copy.pop(i)
-            else:
-                i += 1
+    The rotated views have always been fed to the model in RGB channel order
+    (they used to come from PIL), so they are kept that way to leave the voted
+    boxes unchanged.
+    """
+    views = [image]
+    rgb = image[..., ::-1]
+    for k, _ in ORIENTATIONS[1:orientation_count]:
+        views.append(np.rot90(rgb, k))
+    return views
+
+
+def letterbox_size(imgsz, stride=32):
+    """Side of the square letterbox for `imgsz`, rounded up to a multiple of the model stride"""
+    return int(math.ceil(imgsz / stride) * stride)
 
-        aggregated_boxes.append(similar_boxes)
 
-    return aggregated_boxes
+def letterboxed_views(image, size, orientation_count, device='cpu'):
+    """
+    Orientation views of a BGR image as (3, size, size) uint8 tensors on `device`
 
+    The image is letterboxed once on the host (resize and centre padding, like
+    ultralytics' LetterBox with auto=False) and uploaded once; the rotated
+    views are torch.rot90 of that tensor, made on the device. As in
+    rotated_views, the 0° view is RGB and the rotated views keep BGR order,
+    which is what the model has always seen for them.
+    """
+    boxed = LetterBox((size, size), auto=False)(image=image)
+    bgr = torch.from_numpy(np.ascontiguousarray(boxed)).to(device).permute(2, 0, 1)
+    views = [bgr.flip(0)]
+    for k, _ in ORIENTATIONS[1:orientation_count]:
+        views.append(torch.rot90(bgr, k, dims=(1, 2)))
+    return views
 
-def voting_mechanism(aggregated_boxes, vote_threshold=3):
-    """Apply voting to grouped boxes"""
-    final_boxes = []
-    for group in aggregated_boxes:
-        if len(group) >= vote_threshold:
-            # Average the box coordinates and confidence
-            avg_box = [sum(box[i] for box in group) / len(group) for i in range(4)]
-            avg_conf = sum(box[4] for box in group) / len(group)
-            cls = group[0][5]  # Use the class from the first box
-            final_boxes.append(avg_box + [avg_conf, cls])
-    return final_boxes
+
+def unrotate_boxes(boxes, k, orig_w, orig_h):
+    """
+    Map [x1, y1, x2, y2, conf, cls] boxes predicted on an image rotated
+    k * 90° counter-clockwise back to the coordinates of the original image
+    """
+    boxes = as_box_array(boxes)
+    out = boxes.copy()
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    if k == 1:
+        # 90° CCW: (x, y) -> (y, w - x)
+        out[:, 0], out[:, 1], out[:, 2], out[:, 3] = orig_w - y2, x1, orig_w - y1, x2
+    elif k == 2:
+        # 180°: (x, y) -> (w - x, h - y)
+        out[:, 0], out[:, 1], out[:, 2], out[:, 3] = orig_w - x2, orig_h - y2, orig_w - x1, orig_h - y1
+    elif k == 3:
+        # 270° CCW (90° CW): (x, y) -> (h - y, x)
+        out[:, 0], out[:, 1], out[:, 2], out[:, 3] = y1, orig_h - x2, y2, orig_h - x1
+    return out
 
 
 class YOLOv11Ensemble:
-    def __init__(self, model_path, conf_thres=0.4, iou_thres=0.45, device=None, imgsz=600):
-        """Initialize the YOLOv11 ensemble detector"""
+    def __init__(self, model_path, conf_thres=0.4, iou_thres=0.45, device=None, imgsz=600, backend='torch',
+                 export_dir=None, calibration_dir=None, tensor_views=False):
+        """
+        Initialize the YOLOv11 ensemble detector
+
+        Args:
+            backend: 'torch' runs the weights eagerly; 'onnx' or 'openvino' export
+                them once at `imgsz` (cached in `export_dir`) and run the export;
+                'onnx-int8' additionally quantizes it using images from `calibration_dir`
+            tensor_views: Letterbox each image once into a square tensor and make the
+                rotated views with torch.rot90 on the device, instead of letting
+                ultralytics preprocess every rotated array again. Square padding
+                instead of minimal padding shifts some boxes slightly.
+        """
         # 自动检测设备
         if device is None:
             self.device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
         else:
             self.device = device
             
-        print(f"Using device: {self.device}")
+        logger.info(f"Using device: {self.device}")
         
-        # 载入模型并发送到指定设备
-        self.model = YOLO(model_path)
+        # 载入模型并发送到指定设备；onnx/openvino后端首次使用时导出并缓存
+        self.backend = backend
+        self.model = YOLO(export_model(model_path, backend, imgsz, export_dir, calibration_dir), task='detect')
         
         # 确保模型在正确的设备上
-        if 'cuda' in self.device and torch.cuda.is_available():
+        if backend == 'torch' and 'cuda' in self.device and torch.cuda.is_available():
             self.model.to(self.device)
         
         self.conf_thres = conf_thres
         self.iou_thres = iou_thres
         self.imgsz = imgsz
+        self.tensor_views = tensor_views
+        self.letterbox_size = letterbox_size(imgsz)
+        
+        # ultralytics的predictor不是线程安全的，共享实例时串行化前向推理
+        self._infer_lock = threading.Lock()
+        
+        # 前向推理次数（每个视角一次）及级联模式省去的次数
+        self._stats_lock = threading.Lock()
+        self._forward_passes = 0
+        self._forward_passes_saved = 0
+        
+    def warmup(self):
+        """Run one dummy inference so the first real request does not pay for lazy setup"""
+        blank = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self._run_views(self._prepare_views([blank], 1)[0], self.conf_thres, self.iou_thres)
         
-    def predict(self, image_path, vote_threshold=3, orientation_count=4):
+    def _forward(self, source, conf_thres, iou_thres):
+        """Call the underlying YOLO model with the detector's device and imgsz"""
+        # verbose=False：ultralytics默认每个视角打印一行结果和一行耗时，耗时已记录在result.speed中
+        with self._infer_lock:
+            return self.model(source, conf=conf_thres, iou=iou_thres, device=self.device, imgsz=self.imgsz,
+                              verbose=False)
+        
+    def _forward_views(self, views, conf_thres, iou_thres, batched=True):
+        """
+        Run the model over a list of image arrays, returning one result per view
+
+        Views of the same shape are sent through the model in a single batched call.
+        Mixed shapes are split per shape so ultralytics keeps its minimal (rect)
+        letterbox padding and the boxes match what one call per view would give.
+        """
+        if not batched:
+            return [self._forward(view, conf_thres, iou_thres)[0] for view in views]
+        
+        groups = {}
+        for i, view in enumerate(views):
+            groups.setdefault(view.shape, []).append(i)
+        
+        results = [None] * len(views)
+        for indices in groups.values():
+            batch_results = self._forward([views[i] for i in indices], conf_thres, iou_thres)
+            for i, result in zip(indices, batch_results):
+                results[i] = result
+        return results
+        
+    def _prepare_views(self, images, orientation_count):
+        """Orientation views of each image: rotated arrays, or rotated letterboxed tensors with tensor_views"""
+        if self.tensor_views:
+            return [letterboxed_views(image, self.letterbox_size, orientation_count, self.device) for image in images]
+        return [rotated_views(image, orientation_count) for image in images]
+        
+    def _run_views(self, views, conf_thres, iou_thres, batched=True):
+        """Run the model over views made by _prepare_views, one result per view"""
+        if not self.tensor_views:
+            return self._forward_views(views, conf_thres, iou_thres, batched=batched)
+        # ultralytics把张量输入视为已预处理：RGB、BCHW、0-1，边长为32的倍数，不再缩放
+        if not batched:
+            return [self._forward(view[None].float().div_(255), conf_thres, iou_thres)[0] for view in views]
+        return list(self._forward(torch.stack(views).float().div_(255), conf_thres, iou_thres))
+        
+    def _view_boxes(self, image, k, result):
+        """Boxes of the view rotated k * 90° counter-clockwise, in original image coordinates"""
+        boxes = self._get_boxes_from_results(result)
+        if not self.tensor_views:
+            return unrotate_boxes(boxes, k, image.shape[1], image.shape[0])
+        # 在正方形letterbox空间内（W=H=S）旋转回去，再去掉letterbox的缩放和填充
+        size = self.letterbox_size
+        boxes = unrotate_boxes(boxes, k, size, size)
+        boxes[:, :4] = scale_boxes((size, size), boxes[:, :4], image.shape[:2])
+        return boxes
+        
+    def forward_stats(self):
+        """Forward passes run so far (one per orientation view) and passes skipped by cascade mode"""
+        with self._stats_lock:
+            return {'forward_passes': self._forward_passes, 'forward_passes_saved': self._forward_passes_saved}
+        
+    def predict(self, source, vote_threshold=3, orientation_count=4, conf_thres=None, iou_thres=None,
+                batched=True, class_aware=False, timer=None, trace=None, cascade=False):
         """
         Run predictions with multi-orientation voting
         
         Args:
-            image_path: Path to the image
+            source: Path to the image, raw encoded image bytes, or a decoded BGR ndarray
             vote_threshold: Minimum votes required to keep a detection
             orientation_count: Number of orientations to use (1, 2, or 4)
                 - 1: Only use original orientation
                 - 2: Use original and 90° counter-clockwise
                 - 4: Use all four orientations (0°, 90°, 180°, 270°)
+            conf_thres: Per-call confidence threshold (defaults to the instance value)
+            iou_thres: Per-call IoU threshold for NMS and box grouping (defaults to the instance value)
+            batched: Send all orientations through the model in one batch (False runs them one by one)
+            class_aware: Only group boxes of the same class when voting
+            timer: Optional metrics.StageTimer that receives the time spent in each stage
+                (decode, rotate, forward and forward_<angle> per orientation, transform, fusion, result)
+            trace: Optional debug_trace.Trace that receives the boxes of every orientation,
+                the voting groups and the final boxes
+            cascade: Skip the last orientation of images whose other views found nothing,
+                only where NMS guarantees that leaves the vote unchanged (class_aware,
+                vote_threshold >= 2, no tensor_views; see _cascade_exact for the argument
+                and its one gap). Otherwise all views run as usual
         """
+        return self.predict_batch([source], vote_threshold=vote_threshold, orientation_count=orientation_count,
+                                  conf_thres=conf_thres, iou_thres=iou_thres, batched=batched,
+                                  class_aware=class_aware, timer=timer, trace=trace, cascade=cascade)[0]
+    
+    def predict_batch(self, sources, vote_threshold=3, orientation_count=4, conf_thres=None, iou_thres=None,
+                      batched=True, class_aware=False, batch_size=None, timer=None, trace=None, cascade=False):
+        """
+        Run predict over several images, one result per source in the same order
+        
+        The views of up to `batch_size` images (all of them when None) go through
+        the model together; the other arguments are the same as for predict.
+        `trace` is either one trace shared by all sources (events carry the source
+        index) or a list with a trace, or None, per source.
+        """
+        conf_thres = self.conf_thres if conf_thres is None else conf_thres
+        iou_thres = self.iou_thres if iou_thres is None else iou_thres
+        timer = timer or NULL_TIMER
+        
         # Validate orientation_count
         if orientation_count not in [1, 2, 4]:
             raise ValueError("orientation_count must be 1, 2, or 4")
             
         # If orientation_count is 2, adjust vote_threshold to at least 1
         if orientation_count == 2 and vote_threshold > 2:
-            print(f"Warning: orientation_count=2 but vote_threshold={vote_threshold}. "
-                  f"Adjusting vote_threshold to 1.")
+            logger.warning(f"orientation_count=2 but vote_threshold={vote_threshold}. "
+                           f"Adjusting vote_threshold to 1.")
             vote_threshold = 1
         
-        # Load the original image
-        original_image = Image.open(image_path)
-        orig_img = np.array(original_image)
-        orig_size = original_image.size  # (width, height)
-        
-        # Get original prediction (使用设备参数和imgsz参数)
-        original_results = self.model(image_path, conf=self.conf_thres, iou=self.iou_thres, device=self.device, imgsz=self.imgsz)
-        original_result = original_results[0]  # Store for later use
-        
-        # If orientation_count is 1, we still want to show prediction details
-        if orientation_count == 1:
-            print("Using only original orientation (no ensemble)")
-            # Get and print boxes from original result
-            pred0 = self._get_boxes_from_results(original_results[0])
-            print("--- Original Orientation (0°) Predictions ---")
-            for box in pred0:
-                print(f"Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
+        sources = list(sources)
+        if isinstance(trace, (list, tuple)):
+            traces = [t or NULL_TRACE for t in trace]
+        else:
+            traces = [trace or NULL_TRACE] * len(sources)
+        batch_size = batch_size or max(len(sources), 1)
+        results = []
+        for start in range(0, len(sources), batch_size):
+            # Decode each image once; every view below is derived from these arrays
+            with timer.stage('decode'):
+                images = [load_image(source) for source in sources[start:start + batch_size]]
             
-            # Print final result info
-            print("\n--- Final Boxes (Single Orientation) ---")
-            for box in pred0:
-                print(f"Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
-                
-            return original_result
+            if cascade and self._cascade_exact(orientation_count, vote_threshold, class_aware):
+                per_image = self._forward_cascade(images, orientation_count, conf_thres, iou_thres, batched,
+                                                  timer)
+            else:
+                # Build every view up front so they can go through the model as one batch
+                with timer.stage('rotate'):
+                    views = [view for image_views in self._prepare_views(images, orientation_count)
+                             for view in image_views]
+                with timer.stage('forward'):
+                    view_results = self._run_views(views, conf_thres, iou_thres, batched=batched)
+                per_image = [view_results[i * orientation_count:(i + 1) * orientation_count]
+                             for i in range(len(images))]
+            
+            forward_passes = sum(len(image_results) for image_results in per_image)
+            with self._stats_lock:
+                self._forward_passes += forward_passes
+                self._forward_passes_saved += len(images) * orientation_count - forward_passes
+            if timer.enabled:
+                # 批量推理时各视角同批执行，按ultralytics记录的单图耗时拆分到每个视角
+                for image_results in per_image:
+                    for (_, angle), result in zip(ORIENTATIONS, image_results):
+                        timer.add(f'forward_{angle}', sum(v or 0 for v in getattr(result, 'speed', {}).values()))
             
-        # Get predictions for all orientations
+            for i, (image, image_results) in enumerate(zip(images, per_image)):
+                trace_i = traces[start + i]
+                if trace_i.enabled and len(image_results) < orientation_count:
+                    trace_i.record('cascade_exit', source=start + i, views_run=len(image_results),
+                                   forward_passes_saved=orientation_count - len(image_results))
+                results.append(self._vote(image, image_results, vote_threshold, iou_thres, class_aware, timer,
+                                          trace_i, start + i))
+        return results
+    
+    def _cascade_exact(self, orientation_count, vote_threshold, class_aware):
+        """
+        Whether skipping the last view of an image whose other views found nothing keeps the vote exact
+
+        The boxes are then all from the last view. With class_aware grouping a
+        group holds boxes of one class whose IoU with its first box, a box of
+        the same view, is above iou_thres, and ultralytics NMS (class-aware, at
+        the same iou_thres) has already removed every such box from the view,
+        so each group has one box, no group reaches vote_threshold >= 2, and
+        exhaustive voting returns the 0° result: no boxes, as the cascade does.
+        The 90° rotations used to map the boxes back do not change IoU. The one
+        gap is ultralytics mapping the NMS output from the letterbox to the
+        image: it scales x and y by gains that differ by rounding and clips the
+        boxes to the image, so two boxes of one class cut off by the image
+        border could end up overlapping by more than iou_thres;
+        benchmarks/parity_cascade.py counts any such difference as a mismatch.
+        tensor_views unrotates and clips in letterbox space, so it is left out.
+
+        Nothing else is skipped: with two views left, two boxes of one view can
+        each overlap a box of the other view without overlapping each other, and
+        without class_aware a view can hold overlapping boxes of different
+        classes, so a group could reach vote_threshold from the skipped views.
+        """
+        return orientation_count > 1 and vote_threshold >= 2 and class_aware and not self.tensor_views
+    
+    def _forward_cascade(self, images, orientation_count, conf_thres, iou_thres, batched, timer):
+        """
+        Run every orientation but the last, then the last one only for images with a box so far
+
+        Returns the results of the views run per image. The first views of all
+        images go through the model together, as without cascade; see
+        _cascade_exact for why the last view can be skipped.
+        """
+        with timer.stage('rotate'):
+            views = self._prepare_views(images, orientation_count)
+        first = orientation_count - 1
+        with timer.stage('forward'):
+            view_results = self._run_views([view for image_views in views for view in image_views[:first]],
+                                           conf_thres, iou_thres, batched=batched)
+        per_image = [view_results[i * first:(i + 1) * first] for i in range(len(images))]
+        with timer.stage('fusion'):
+            pending = [i for i, image_results in enumerate(per_image)
+                       if any(self._get_boxes_from_results(result).shape[0] for result in image_results)]
+        if pending:
+            with timer.stage('forward'):
+                last_results = self._run_views([views[i][first] for i in pending], conf_thres, iou_thres,
+                                               batched=batched)
+            for i, result in zip(pending, last_results):
+                per_image[i].append(result)
+        return per_image
+    
+    def _vote(self, image, view_results, vote_threshold, iou_thres, class_aware, timer=NULL_TIMER,
+              trace=NULL_TRACE, source_index=0):
+        """Fuse the per-orientation results of one image into a single voted result"""
+        # With a single orientation there is nothing to vote on
+        if len(view_results) == 1:
+            original_boxes = self._view_boxes(image, 0, view_results[0])
+            if trace.enabled:
+                trace.record('orientation', source=source_index, label=ORIENTATION_LABELS[0], boxes=original_boxes)
+                trace.record('final', source=source_index, vote_threshold=vote_threshold, boxes=original_boxes)
+            return self._make_result(image, original_boxes)
+        
+        # Get predictions for all orientations, transformed back to the original orientation
         all_predictions = []
+        for (k, angle), result in zip(ORIENTATIONS, view_results):
+            with timer.stage('transform'):
+                boxes = self._view_boxes(image, k, result)
+            if trace.enabled:
+                trace.record('orientation', source=source_index, label=ORIENTATION_LABELS[k], boxes=boxes)
+            all_predictions.append(boxes)
+        original_boxes = all_predictions[0]
+        all_predictions = np.concatenate(all_predictions)
         
-        # 1. Original orientation (0 degrees)
-        pred0 = self._get_boxes_from_results(original_results[0])
-        print("--- Original Orientation (0°) Predictions ---")
-        for box in pred0:
-            print(f"Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
-        all_predictions.extend(pred0)
+        # Aggregate and vote
+        with timer.stage('fusion'):
+            groups = group_indices(all_predictions, iou_threshold=iou_thres, class_aware=class_aware)
+            final_boxes = vote_groups(all_predictions, groups, vote_threshold=vote_threshold)
         
-        # 2. Rotate 90 degrees counter-clockwise
-        rotated90 = original_image.rotate(90, expand=True)
-        with io.BytesIO() as buffer:
-            rotated90.save(buffer, format='JPEG')
-            buffer.seek(0)
-            # 使用设备参数和imgsz参数
-            results90 = self.model(np.array(rotated90), conf=self.conf_thres, iou=self.iou_thres, device=self.device, imgsz=self.imgsz)
+        if trace.enabled:
+            # 各组的框依次排列，sizes给出每组的框数
+            order = np.concatenate(groups) if groups else np.zeros(0, dtype=int)
+            trace.record('groups', source=source_index, sizes=[len(members) for members in groups],
+                         boxes=all_predictions[order])
+            trace.record('final', source=source_index, vote_threshold=vote_threshold, boxes=final_boxes)
         
-        # Transform coordinates back to original orientation
-        w, h = orig_size[1], orig_size[0]  # swapped for 90 degrees
-        pred90 = self._get_boxes_from_results(results90[0])
-        transformed90 = []
-        for box in pred90:
-            # Transform coordinates back to original orientation
-            transformed90.append([h-box[3], box[0], h-box[1], box[2], box[4], box[5]])
-        print("--- 90° Counter-Clockwise Rotation Predictions (transformed to original) ---")
-        for box in transformed90:
-            print(f"Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
-        all_predictions.extend(transformed90)
+        with timer.stage('result'):
+            # 投票结果为空时返回0°视角的框（与原先deepcopy 0°结果、不替换框的行为一致）
+            if not len(final_boxes):
+                final_boxes = original_boxes
+            return self._make_result(image, final_boxes)
+    
+    def predict_tiled(self, source, tile_size=1280, overlap=0.2, tile_batch_size=4, vote_threshold=3,
+                      orientation_count=4, conf_thres=None, iou_thres=None, batched=True, class_aware=False,
+                      timer=None, trace=None, cascade=False):
+        """
+        Run predict on overlapping tiles of a large panel image
         
-        # If orientation_count is 2, skip the remaining orientations
-        if orientation_count == 2:
-            print("Using only original and 90° counter-clockwise orientations")
-        else:
-            # 3. Rotate 180 degrees
-            rotated180 = original_image.rotate(180, expand=True)
-            with io.BytesIO() as buffer:
-                rotated180.save(buffer, format='JPEG')
-                buffer.seek(0)
-                # 使用设备参数和imgsz参数
-                results180 = self.model(np.array(rotated180), conf=self.conf_thres, iou=self.iou_thres, device=self.device, imgsz=self.imgsz)
-                
-            # Transform coordinates back to original orientation
-            w, h = orig_size[0], orig_size[1]  # same as original for 180 degrees
-            pred180 = self._get_boxes_from_results(results180[0])
-            transformed180 = []
-            for box in pred180:
-                # Transform coordinates: (w-x2, h-y2, w-x1, h-y1)
-                transformed180.append([w-box[2], h-box[3], w-box[0], h-box[1], box[4], box[5]])
-            print("--- 180° Rotation Predictions (transformed to original) ---")
-            for box in transformed180:
-                print(f"Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
-            all_predictions.extend(transformed180)
-            
-            # 4. Rotate 270 degrees (90 degrees clockwise)
-            rotated270 = original_image.rotate(-90, expand=True)
-            with io.BytesIO() as buffer:
-                rotated270.save(buffer, format='JPEG')
-                buffer.seek(0)
-                # 使用设备参数和imgsz参数
-                results270 = self.model(np.array(rotated270), conf=self.conf_thres, iou=self.iou_thres, device=self.device, imgsz=self.imgsz)
-                
-            # Transform coordinates back to original orientation
-            w, h = orig_size[1], orig_size[0]  # swapped for 270 degrees
-            pred270 = self._get_boxes_from_results(results270[0])
-            transformed270 = []
-            for box in pred270:
-                # Transform coordinates: (h-y2, x1, h-y1, x2)
-                transformed270.append([box[1], h-box[2], box[3], h-box[0], box[4], box[5]])
-            print("--- 270° Rotation (90° Clockwise) Predictions (transformed to original) ---")
-            for box in transformed270:
-                print(f"Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
-            all_predictions.extend(transformed270)
+        Each tile is detected at full resolution with the usual multi-orientation
+        voting, `tile_batch_size` tiles per model call. Tile boxes are shifted to
+        panel coordinates and boxes found twice in overlapping regions are merged
+        with the same IoU grouping used for voting.
         
-        # Aggregate and vote
-        aggregated_boxes = aggregate_boxes(all_predictions, iou_threshold=self.iou_thres)
+        Args:
+            source: Path to the image, raw encoded image bytes, or a decoded BGR ndarray
+            tile_size: Side length of the square tiles in pixels (usually the model imgsz)
+            overlap: Fraction of a tile shared with its neighbour, in [0, 1)
+            tile_batch_size: Number of tiles whose views go through the model together
+            Other arguments are the same as for predict.
+        """
+        iou_thres = self.iou_thres if iou_thres is None else iou_thres
+        timer = timer or NULL_TIMER
+        with timer.stage('decode'):
+            image = load_image(source)
+        height, width = image.shape[:2]
+        windows = tile_windows(width, height, tile_size=tile_size, overlap=overlap)
+        if len(windows) == 1:
+            return self.predict(image, vote_threshold=vote_threshold, orientation_count=orientation_count,
+                                conf_thres=conf_thres, iou_thres=iou_thres, batched=batched,
+                                class_aware=class_aware, timer=timer, trace=trace, cascade=cascade)
         
-        # Print aggregated boxes
-        print("\n--- Aggregated Box Groups ---")
-        for i, group in enumerate(aggregated_boxes):
-            print(f"Group {i+1}: {len(group)} boxes")
-            for box in group:
-                print(f"  Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
+        tiles = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+        tile_results = self.predict_batch(tiles, vote_threshold=vote_threshold, orientation_count=orientation_count,
+                                          conf_thres=conf_thres, iou_thres=iou_thres, batched=batched,
+                                          class_aware=class_aware, batch_size=tile_batch_size, timer=timer,
+                                          trace=trace, cascade=cascade)
         
-        final_boxes = voting_mechanism(aggregated_boxes, vote_threshold=vote_threshold)
+        with timer.stage('tile_merge'):
+            # Shift tile boxes to panel coordinates
+            panel_boxes = []
+            for (x1, y1, _, _), result in zip(windows, tile_results):
+                boxes = self._get_boxes_from_results(result)
+                boxes[:, [0, 2]] += x1
+                boxes[:, [1, 3]] += y1
+                panel_boxes.append(boxes)
+            panel_boxes = np.concatenate(panel_boxes)
+            
+            # Merge duplicates from overlapping tiles (every group is kept, vote_threshold=1)
+            groups = group_indices(panel_boxes, iou_threshold=iou_thres, class_aware=True)
+            merged = vote_groups(panel_boxes, groups, vote_threshold=1)
+            if trace is not None and trace.enabled:
+                trace.record('tile_merge', tiles=[list(window) for window in windows], boxes=merged)
+            return self._make_result(image, merged)
+    
+    def predict_regions(self, source, regions, region_batch_size=4, vote_threshold=3, orientation_count=4,
+                        conf_thres=None, iou_thres=None, batched=True, class_aware=False, timer=None, trace=None,
+                        cascade=False):
+        """
+        Run predict only on given regions of an image, e.g. where a board differs from its golden image
         
-        # Print final voted boxes
-        print("\n--- Final Voted Boxes ---")
-        for box in final_boxes:
-            print(f"Class: {int(box[5])}, Coords: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}], Conf: {box[4]:.3f}")
+        Each (x1, y1, x2, y2) region is cropped and detected with the usual
+        multi-orientation voting, `region_batch_size` regions per model call.
+        Boxes are shifted back to full-image coordinates and boxes found twice
+        in overlapping regions are merged as in predict_tiled. With no regions
+        the result has no boxes.
         
-        # Create a new result with the same structure as the original
-        final_result = deepcopy(original_result)
+        Args:
+            source: Path to the image, raw encoded image bytes, or a decoded BGR ndarray
+            regions: (x1, y1, x2, y2) windows in image pixels
+            region_batch_size: Number of regions whose views go through the model together
+            Other arguments are the same as for predict.
+        """
+        iou_thres = self.iou_thres if iou_thres is None else iou_thres
+        timer = timer or NULL_TIMER
+        with timer.stage('decode'):
+            image = load_image(source)
+        regions = [tuple(int(v) for v in region) for region in regions]
+        if not regions:
+            return self._make_result(image, [])
         
-        # Update the boxes properly to maintain compatibility with app.py
-        if final_boxes and hasattr(final_result, 'boxes'):
-            # Get the device from the original boxes
-            device = final_result.boxes.data.device if hasattr(final_result.boxes, 'data') else self.device
-            
-            # Create tensor data for new boxes
-            boxes_data = torch.zeros((len(final_boxes), 6), device=device)
-            for i, box in enumerate(final_boxes):
-                boxes_data[i, 0] = box[0]  # x1
-                boxes_data[i, 1] = box[1]  # y1
-                boxes_data[i, 2] = box[2]  # x2
-                boxes_data[i, 3] = box[3]  # y2
-                boxes_data[i, 4] = box[4]  # conf
-                boxes_data[i, 5] = box[5]  # cls
-            
-            # Replace the boxes with compatible objects
-            from ultralytics.engine.results import Boxes
-            final_result.boxes = Boxes(boxes_data, final_result.orig_shape)
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+        region_results = self.predict_batch(crops, vote_threshold=vote_threshold,
+                                            orientation_count=orientation_count, conf_thres=conf_thres,
+                                            iou_thres=iou_thres, batched=batched, class_aware=class_aware,
+                                            batch_size=region_batch_size, timer=timer, trace=trace, cascade=cascade)
         
-        return final_result
+        with timer.stage('region_merge'):
+            boxes = []
+            for (x1, y1, _, _), result in zip(regions, region_results):
+                region_boxes = self._get_boxes_from_results(result)
+                region_boxes[:, [0, 2]] += x1
+                region_boxes[:, [1, 3]] += y1
+                boxes.append(region_boxes)
+            boxes = np.concatenate(boxes)
+            groups = group_indices(boxes, iou_threshold=iou_thres, class_aware=True)
+            merged = vote_groups(boxes, groups, vote_threshold=1)
+            if trace is not None and trace.enabled:
+                trace.record('region_merge', regions=[list(region) for region in regions], boxes=merged)
+            return self._make_result(image, merged)
+    
+    def _make_result(self, image, boxes):
+        """Wrap (N,6) boxes for a BGR image in a DetectionResult"""
+        return DetectionResult(boxes, self.model.names, image.shape[:2])
     
     def _get_boxes_from_results(self, result):
-        """Extract bounding boxes from YOLOv11 result object"""
-        boxes = []
+        """Extract bounding boxes from YOLOv11 result object as an (N,6) array of [x1, y1, x2, y2, conf, cls]"""
+        if isinstance(result, DetectionResult):
+            return as_box_array(result.data)
         if hasattr(result, 'boxes') and len(result.boxes) > 0:
-            # Get the tensor data
-            boxes_data = result.boxes.data
-            
-            # Convert to list of [x1, y1, x2, y2, conf, cls]
-            for box in boxes_data:
-                boxes.append([
-                    box[0].item(),  # x1
-                    box[1].item(),  # y1
-                    box[2].item(),  # x2
-                    box[3].item(),  # y2
-                    box[4].item(),  # conf
-                    box[5].item()   # cls
-                ])
-        
-        return boxes
+            return as_box_array(result.boxes.data)
+        return as_box_array([])
 
 
 # Example usage
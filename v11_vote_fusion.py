@@ -6,66 +6,7 @@ from ultralytics import YOLO
 import torch
 from copy import deepcopy
 
-def iou(box1, box2):
-    """Calculate IoU between two boxes"""
-    x1_min, y1_min, x1_max, y1_max = box1[:4]
-    x2_min, y2_min, x2_max, y2_max = box2[:4]
-
-    inter_xmin = max(x1_min, x2_min)
-    inter_ymin = max(y1_min, y2_min)
-    inter_xmax = min(x1_max, x2_max)
-    inter_ymax = min(y1_max, y2_max)
-
-    inter_width = max(0, inter_xmax - inter_xmin)
-    inter_height = max(0, inter_ymax - inter_ymin)
-    inter_area = inter_width * inter_height
-
-    box1_area = (x1_max - x1_min) * (y1_max - y1_min)
-    box2_area = (x2_max - x2_min) * (y2_max - y2_min)
-
-    union_area = box1_area + box2_area - inter_area
-
-    if union_area == 0:
-        return 0
-
-    return inter_area / union_area
-
-
-def aggregate_boxes(predictions, iou_threshold=0.5):
-    """Group similar boxes together"""
-    # Create a deep copy to avoid modifying the original list
-    predictions_copy = deepcopy(predictions)
-    aggregated_boxes = []
-    
-    while predictions_copy:
-        base_box = predictions_copy.pop(0)
-        similar_boxes = [base_box]
-
-        i = 0
-        while i < len(predictions_copy):
-            if iou(base_box, predictions_copy[i]) > iou_threshold:
-                similar_boxes.append(predictions_copy[i])
-                predictions_copy.pop(i)
-            else:
-                i += 1
-
-        aggregated_boxes.append(similar_boxes)
-
-    return aggregated_boxes
-
-
-def voting_mechanism(aggregated_boxes, vote_threshold=3):
-    """Apply voting to grouped boxes"""
-    final_boxes = []
-    for group in aggregated_boxes:
-        if len(group) >= vote_threshold:
-            # Average the box coordinates and confidence
-            avg_box = [sum(box[i] for box in group) / len(group) for i in range(4)]
-            avg_conf = sum(box[4] for box in group) / len(group)
-            cls = group[0][5]  # Use the class from the first box
-            final_boxes.append(avg_box + [avg_conf, cls])
-    return final_boxes
-
+from box_fusion import aggregate_boxes, voting_mechanism
 
 class YOLOv11Ensemble:
     def __init__(self, model_path, conf_thres=0.4, iou_thres=0.45, device=''):
@@ -174,7 +115,7 @@ class YOLOv11Ensemble:
         final_result = deepcopy(original_result)
         
         # Update the boxes in the final_result
-        if final_boxes and hasattr(final_result, 'boxes') and hasattr(final_result.boxes, 'data'):
+        if len(final_boxes) and hasattr(final_result, 'boxes') and hasattr(final_result.boxes, 'data'):
             # Clear existing boxes
             if len(final_result.boxes) > 0:
                 # Create a new tensor with the voted boxes
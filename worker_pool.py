@@ -0,0 +1,230 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from model_export import export_model
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('predict', 'predict_batch', 'predict_tiled', 'predict_regions')
+
+
+class WorkerCrashedError(RuntimeError):
+    """The worker process handling a request died before answering"""
+
+
+def _worker_main(index, model_args, num_threads, requests, responses):
+    """Entry point of a worker process: load a resident model and serve requests until told to stop"""
+    torch.set_num_threads(num_threads)
+    from v11 import YOLOv11Ensemble
+
+    model = YOLOv11Ensemble(**model_args)
+    model.warmup()
+    responses.put((index, None, True, 'ready'))
+
+    while True:
+        task = requests.get()
+        if task is None:
+            return
+        task_id, method, args, kwargs = task
+        try:
+            # DetectionResult只含框数组、类别名和图像尺寸，直接序列化返回
+            responses.put((index, task_id, True, getattr(model, method)(*args, **kwargs)))
+        except Exception as e:
+            responses.put((index, task_id, False, f'{type(e).__name__}: {e}'))
+
+
+class _Worker:
+    def __init__(self, index, process, requests):
+        self.index = index
+        self.process = process
+        self.requests = requests
+        self.in_flight = {}  # task_id -> (future, method)
+        self.ready = threading.Event()
+        self.restarts = 0
+        self.startup_failures = 0  # 连续启动失败次数，用于重启退避
+        self.restart_at = None
+
+
+class InferenceWorkerPool:
+    """
+    Process pool of resident YOLOv11Ensemble models for many-core CPU servers
+
+    Every worker process loads its own model and limits torch to `num_threads`
+    intra-op threads, so the workers split the cores instead of competing for
+    them under one GIL. Requests go to the worker with the fewest requests in
+    flight. A monitor thread restarts dead workers and fails the requests they
+    were handling with WorkerCrashedError; a worker that keeps dying before its
+    model is loaded is restarted with exponential backoff.
+    """
+
+    def __init__(self, model_path, num_workers=None, num_threads=None, device='cpu', imgsz=600,
+                 conf_thres=0.4, iou_thres=0.45, backend='torch', export_dir=None,
+                 calibration_dir=None, tensor_views=False, monitor_interval=1.0):
+        cpu_count = os.cpu_count() or 1
+        self.num_threads = num_threads or max(1, cpu_count // (num_workers or 1))
+        self.num_workers = num_workers or max(1, cpu_count // self.num_threads)
+        self.model_args = {'model_path': model_path, 'device': device, 'imgsz': imgsz,
+                           'conf_thres': conf_thres, 'iou_thres': iou_thres,
+                           'backend': backend, 'export_dir': export_dir, 'calibration_dir': calibration_dir,
+                           'tensor_views': tensor_views}
+        self.monitor_interval = monitor_interval
+        # 先在主进程完成导出，避免每个工作进程各自导出一遍
+        export_model(model_path, backend, imgsz, export_dir, calibration_dir)
+        # spawn而不是fork：fork会继承父进程中已初始化的OpenMP线程池，容易死锁
+        self._ctx = multiprocessing.get_context('spawn')
+        self._responses = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._closed = threading.Event()
+        self._workers = [self._start_worker(i) for i in range(self.num_workers)]
+        self._collector = threading.Thread(target=self._collect, name='worker-pool-collector', daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name='worker-pool-monitor', daemon=True)
+        self._monitor.start()
+
+    def submit(self, method, *args, **kwargs):
+        """Run a YOLOv11Ensemble method (one of METHODS) on the least loaded worker"""
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}")
+        if self._closed.is_set():
+            raise RuntimeError("worker pool is closed")
+        future = Future()
+        with self._lock:
+            alive = [w for w in self._workers if w.restart_at is None and w.process.is_alive()]
+            if not alive:
+                raise WorkerCrashedError("no inference worker is running")
+            worker = min(alive, key=lambda w: len(w.in_flight))
+            task_id = next(self._task_ids)
+            worker.in_flight[task_id] = (future, method)
+            worker.requests.put((task_id, method, args, kwargs))
+        return future
+
+    def predict(self, source, timeout=None, **kwargs):
+        return self.submit('predict', source, **kwargs).result(timeout=timeout)
+
+    def predict_batch(self, sources, timeout=None, **kwargs):
+        return self.submit('predict_batch', list(sources), **kwargs).result(timeout=timeout)
+
+    def predict_tiled(self, source, timeout=None, **kwargs):
+        return self.submit('predict_tiled', source, **kwargs).result(timeout=timeout)
+
+    def predict_regions(self, source, regions, timeout=None, **kwargs):
+        return self.submit('predict_regions', source, regions, **kwargs).result(timeout=timeout)
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has loaded and warmed up its model"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for index in range(self.num_workers):
+            while True:
+                worker = self._workers[index]
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # 等待期间进程可能被重启，换成新进程后继续等待
+                ready = worker.ready.wait(min(remaining or self.monitor_interval, self.monitor_interval))
+                if ready and worker.restart_at is None:
+                    break
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'num_workers': self.num_workers,
+                'threads_per_worker': self.num_threads,
+                'workers': [
+                    {
+                        'index': w.index,
+                        'pid': w.process.pid,
+                        'alive': w.process.is_alive(),
+                        'ready': w.ready.is_set(),
+                        'in_flight': len(w.in_flight),
+                        'restarts': w.restarts
+                    }
+                    for w in self._workers
+                ]
+            }
+
+    def close(self, timeout=10):
+        self._closed.set()
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.requests.put(None)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._fail_in_flight(workers, RuntimeError("worker pool is closed"))
+
+    def _start_worker(self, index):
+        requests = self._ctx.Queue()
+        process = self._ctx.Process(target=_worker_main, name=f'inference-worker-{index}', daemon=True,
+                                    args=(index, self.model_args, self.num_threads, requests, self._responses))
+        process.start()
+        logger.info(f"Started inference worker {index} (pid={process.pid}, threads={self.num_threads})")
+        return _Worker(index, process, requests)
+
+    def _collect(self):
+        while not self._closed.is_set():
+            try:
+                index, task_id, ok, payload = self._responses.get(timeout=self.monitor_interval)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                worker = self._workers[index]
+                if task_id is None:
+                    worker.startup_failures = 0
+                    worker.ready.set()
+                    continue
+                entry = worker.in_flight.pop(task_id, None)
+            if entry is None:
+                continue
+            future, method = entry
+            if not ok:
+                future.set_exception(RuntimeError(payload))
+            else:
+                future.set_result(payload)
+
+    def _watch(self):
+        while not self._closed.wait(self.monitor_interval):
+            now = time.monotonic()
+            with self._lock:
+                dead = [w for w in self._workers if w.restart_at is None and not w.process.is_alive()]
+                due = [w for w in self._workers if w.restart_at is not None and w.restart_at <= now]
+            for worker in dead:
+                if not worker.ready.is_set():
+                    worker.startup_failures += 1
+                delay = min(2 ** worker.startup_failures - 1, 60)
+                logger.error(f"Inference worker {worker.index} (pid={worker.process.pid}) died "
+                             f"with exit code {worker.process.exitcode}, restarting in {delay}s")
+                worker.restart_at = now + delay
+                self._fail_in_flight([worker], WorkerCrashedError(
+                    f"inference worker {worker.index} crashed while handling the request"))
+            for worker in due:
+                if self._closed.is_set():
+                    return
+                replacement = self._start_worker(worker.index)
+                replacement.restarts = worker.restarts + 1
+                replacement.startup_failures = worker.startup_failures
+                with self._lock:
+                    self._workers[worker.index] = replacement
+
+    def _fail_in_flight(self, workers, error):
+        with self._lock:
+            entries = []
+            for worker in workers:
+                entries.extend(worker.in_flight.values())
+                worker.in_flight.clear()
+        for future, _ in entries:
+            if not future.done():
+                future.set_exception(error)